@@ -3,12 +3,22 @@ Flask backend for AI Personal Assistant with Free API integration.
 """
 import os
 import json
-import threading
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 from free_api_processor import FreeAPIProcessor
+from provider_router import ProviderRouter
+from http_pool import get_session_pool
+from circuit_breaker import get_circuit_breaker_stats
+from rate_limiter import get_rate_limit_stats
+from response_cache import get_response_cache
+from conversation_store import (ConversationStore, SESSION_COOKIE, SESSION_HEADER,
+                                new_session_id, valid_session_id)
+from local_intents import LocalIntentHandler
+from stream_utils import format_sse
+from batch_processing import parse_batch_request
+from audio_delivery import SpeechAudioSource, audio_url, get_tts_delivery
 from text_to_speech import TextToSpeech
 
 # Try to import speech recognition, but don't fail if it's not available
@@ -28,39 +38,114 @@ frontend_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__f
 
 # Initialize Flask app with static folder configuration (only once)
 app = Flask(__name__, static_folder=frontend_path, static_url_path='')
-CORS(app)
+CORS(app, expose_headers=[SESSION_HEADER])
 
 # Initialize components
 api_provider = os.getenv('API_PROVIDER', 'groq')  # Options: groq, huggingface, together
 api_key = os.getenv('FREE_API_KEY', '')
 
+# Comma-separated list (e.g. groq,together) routes across several providers
+api_providers = [p.strip() for p in os.getenv('API_PROVIDERS', '').split(',') if p.strip()]
+
 try:
-    api_processor = FreeAPIProcessor(api_key=api_key, api_provider=api_provider)
+    if len(api_providers) > 1:
+        api_processor = ProviderRouter.from_env(api_providers)
+    else:
+        api_processor = FreeAPIProcessor(api_key=api_key, api_provider=api_provider)
 except ValueError as e:
     print(f"Warning: API not configured: {e}")
     api_processor = None
 
 tts = TextToSpeech()
+audio_source = SpeechAudioSource.from_env(tts)  # Audio for /api/tts/audio
+tts_delivery = get_tts_delivery('local')  # 'url' returns audio URLs instead of speaking
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes read per step when relaying /api/transcribe uploads
 speech_recognizer = SpeechRecognitionModule() if SPEECH_RECOGNITION_AVAILABLE else None
 
-# Track conversation state
-conversation_history = []
+# Track conversation state per client session (history ring buffer + LLM context)
+conversations = ConversationStore()
+local_intents = LocalIntentHandler()  # Answers time/date/math/etc. without the LLM
 auto_speak_enabled = True  # Enable automatic voice response by default
-active_threads = []  # Track active speech threads
 
 
-def speak_response(text):
-    """Speak the response in a separate thread."""
+def current_session():
+    """
+    Get the requesting client's conversation session.
+
+    The id comes from the X-Session-ID header or the session cookie; a
+    client without one gets a new session, and the cookie is set on the
+    response.
+    """
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if not valid_session_id(session_id):
+        session_id = g.get('new_session_id') or new_session_id()
+        g.new_session_id = session_id
+    return conversations.get(session_id)
+
+
+@app.after_request
+def set_session_cookie(response):
+    """Hand a newly created session id back to the client."""
+    session_id = g.get('new_session_id')
+    if session_id:
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=int(conversations.idle_ttl),
+                            httponly=True, samesite='Lax')
+        response.headers[SESSION_HEADER] = session_id
+    return response
+
+
+def speak_response(text, cache=False):
+    """
+    Queue the response on the speech worker (returns immediately).
+
+    Repeated phrases (local answers, errors) pass cache=True so they are
+    played from the rendered-audio cache after the first time.
+    """
     try:
         if auto_speak_enabled:
             text_preview = text[:50].replace('\n', ' ')
             print(f"🎤 Speaking: {text_preview}...", flush=True)
-            tts.speak(text)
-            print(f"✓ Speech completed", flush=True)
+            # A newer response replaces one that is still waiting to be spoken
+            tts.speak(text, key='response', cache=cache)
     except Exception as e:
         print(f"❌ Error speaking response: {e}", flush=True)
 
 
+def deliver_response_audio(text, cache=False, delivery=None):
+    """
+    Voice a response: speak it locally, or return an audio URL.
+
+    Args:
+        text (str): Response text
+        cache (bool): Speak from the rendered-audio cache (see speak_response)
+        delivery (str): 'local' or 'url' (defaults to TTS_DELIVERY)
+
+    Returns:
+        str: /api/tts/audio URL for 'url' delivery, else None
+    """
+    if (delivery or tts_delivery) == 'url':
+        return audio_url(text)
+    speak_response(text, cache=cache)
+    return None
+
+
+def start_speech_stream(delivery=None):
+    """
+    Open a sentence-pipelined utterance for a streamed response.
+
+    Speech starts on the first complete sentence while the LLM is still
+    generating the rest. Returns None when auto speak is off or the
+    response is delivered as an audio URL.
+    """
+    if not auto_speak_enabled or (delivery or tts_delivery) == 'url':
+        return None
+    try:
+        return tts.speak_stream(key='response')
+    except Exception as e:
+        print(f"❌ Error starting speech stream: {e}", flush=True)
+        return None
+
+
 @app.route('/', methods=['GET'])
 def serve_index():
     """Serve the main index.html file."""
@@ -88,7 +173,15 @@ def health():
         'message': 'AI Assistant is running',
         'provider': api_provider,
         'auto_speak': auto_speak_enabled,
-        'available_models': models
+        'available_models': models,
+        'http_pool': get_session_pool().get_stats(),
+        'rate_limits': get_rate_limit_stats(),
+        'circuit_breakers': get_circuit_breaker_stats(),
+        'sessions': conversations.get_stats(),
+        'local_intents': local_intents.get_stats(),
+        'tts': tts.get_stats(),
+        'speech': speech_recognizer.get_stats() if speech_recognizer else None,
+        'processor': api_processor.get_stats() if api_processor else {}
     })
 
 
@@ -99,8 +192,13 @@ def process_text():
     
     Expected JSON:
     {
-        "text": "user input text"
+        "text": "user input text",
+        "cache": true,  # optional, false bypasses the response cache
+        "audio": "url"  # optional, 'local' or 'url' overrides TTS_DELIVERY
     }
+    
+    With 'url' delivery the response is not spoken on the server; the JSON
+    carries an audio_url the client can play instead.
     """
     try:
         if not api_processor:
@@ -118,34 +216,42 @@ def process_text():
                 'response': 'Please provide some text.'
             }), 400
         
-        # Process with Free API
-        result = api_processor.process(user_text)
+        session = current_session()
+        
+        # Simple commands are answered locally; the rest go to the Free API
+        # with recent conversation as context
+        result = local_intents.try_answer(user_text)
+        if result is None:
+            result = api_processor.process(
+                user_text,
+                use_cache=data.get('cache', True),
+                context=session.context.build(user_text)
+            )
+            result['served_by'] = 'llm'
         
         if result.get('error'):
             response_text = result['response']
         else:
             response_text = result['response']
+            session.context.add_turn(user_text, response_text)
         
         # Add to conversation history
-        conversation_history.append({
-            'user': user_text,
-            'assistant': response_text,
-            'timestamp': len(conversation_history)
-        })
+        session.append(user_text, response_text)
         
-        # Speak response in background thread (non-daemon so it completes)
-        speak_thread = threading.Thread(target=speak_response, args=(response_text,))
-        speak_thread.daemon = False
-        speak_thread.start()
-        active_threads.append(speak_thread)
-        
-        # Clean up finished threads
-        active_threads[:] = [t for t in active_threads if t.is_alive()]
+        # Queue the response on the speech worker (or hand back an audio URL)
+        url = deliver_response_audio(
+            response_text,
+            cache=result['served_by'] == 'local' or bool(result.get('error')),
+            delivery=data.get('audio')
+        )
         
         return jsonify({
             'response': response_text,
             'error': result.get('error', False),
-            'provider': api_provider
+            'cached': result.get('cached', False),
+            'provider': result.get('provider', api_provider),
+            'served_by': result['served_by'],
+            'audio_url': url
         })
     
     except Exception as e:
@@ -155,6 +261,130 @@ def process_text():
         }), 500
 
 
+@app.route('/api/process_text/stream', methods=['POST'])
+def process_text_stream():
+    """
+    Process text command and stream the response as Server-Sent Events.
+    
+    Expected JSON:
+    {
+        "text": "user input text",
+        "cache": true  # optional, false bypasses the response cache
+    }
+    
+    Emits one event per text delta, then a 'done' event with the full response.
+    """
+    if not api_processor:
+        return jsonify({
+            'error': 'API not configured',
+            'response': 'Please configure your FREE_API_KEY in .env file'
+        }), 503
+    
+    data = request.json or {}
+    user_text = data.get('text', '').strip()
+    
+    if not user_text:
+        return jsonify({
+            'error': 'No text provided',
+            'response': 'Please provide some text.'
+        }), 400
+    
+    session = current_session()
+    context = session.context.build(user_text)
+    
+    def generate():
+        speech = start_speech_stream(data.get('audio'))
+        chunks = api_processor.process_stream(user_text, use_cache=data.get('cache', True), context=context)
+        try:
+            for chunk in chunks:
+                if not chunk.get('done'):
+                    if speech is not None:
+                        speech.feed(chunk['delta'])
+                    yield format_sse({'delta': chunk['delta']})
+                    continue
+                
+                response_text = chunk['response']
+                if not chunk.get('error'):
+                    session.context.add_turn(user_text, response_text)
+                
+                # Add the full response to conversation history once the stream ends
+                session.append(user_text, response_text)
+                
+                # Errors arrive without deltas; speak them through the stream too
+                if speech is not None and not speech.text:
+                    speech.feed(response_text)
+                
+                yield format_sse({
+                    'response': response_text,
+                    'error': chunk.get('error', False),
+                    'cached': chunk.get('cached', False),
+                    'provider': chunk.get('provider', api_provider),
+                    'audio_url': audio_url(response_text) if (data.get('audio') or tts_delivery) == 'url' else None
+                }, event='done')
+        finally:
+            # Speak whatever was buffered, even if the client disconnected
+            if speech is not None:
+                speech.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/process_batch', methods=['POST'])
+def process_batch():
+    """
+    Process many prompts concurrently over a bounded worker pool.
+    
+    Batch items are not spoken and not added to conversation history.
+    
+    Expected JSON:
+    {
+        "inputs": ["first prompt", "second prompt"],
+        "max_concurrency": 4,  # optional
+        "stream": false,  # optional, true streams NDJSON lines in input order
+        "cache": true  # optional, false bypasses the response cache
+    }
+    """
+    if not api_processor:
+        return jsonify({
+            'error': 'API not configured',
+            'response': 'Please configure your FREE_API_KEY in .env file'
+        }), 503
+    
+    data = request.get_json(silent=True)
+    try:
+        inputs, max_concurrency = parse_batch_request(data)
+    except ValueError as e:
+        return jsonify({
+            'error': 'Invalid batch request',
+            'response': str(e)
+        }), 400
+    
+    results = api_processor.iter_many(
+        inputs,
+        max_concurrency=max_concurrency,
+        use_cache=data.get('cache', True)
+    )
+    
+    if data.get('stream'):
+        def generate():
+            for result in results:
+                yield json.dumps(result) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    results = list(results)
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'errors': sum(1 for r in results if r.get('error')),
+        'provider': api_provider
+    })
+
+
 @app.route('/api/process_speech', methods=['POST'])
 def process_speech():
     """
@@ -175,6 +405,9 @@ def process_speech():
         data = request.json or {}
         timeout = data.get('timeout', 10)
         
+        # Barge in: stop talking so the assistant does not hear itself
+        tts.stop()
+        
         # Listen to speech
         recognized_text = speech_recognizer.listen(timeout=timeout)
         
@@ -184,30 +417,27 @@ def process_speech():
                 'response': 'I did not hear anything. Please try again.'
             }), 400
         
-        # Process the recognized text
-        result = api_processor.process(recognized_text)
+        # Process the recognized text (locally when it is a simple command)
+        session = current_session()
+        result = local_intents.try_answer(recognized_text)
+        if result is None:
+            result = api_processor.process(recognized_text, context=session.context.build(recognized_text))
+            result['served_by'] = 'llm'
         response_text = result['response']
+        if not result.get('error'):
+            session.context.add_turn(recognized_text, response_text)
         
         # Add to conversation history
-        conversation_history.append({
-            'user': recognized_text,
-            'assistant': response_text,
-            'timestamp': len(conversation_history)
-        })
+        session.append(recognized_text, response_text)
         
-        # Speak response in background thread (non-daemon so it completes)
-        speak_thread = threading.Thread(target=speak_response, args=(response_text,))
-        speak_thread.daemon = False
-        speak_thread.start()
-        active_threads.append(speak_thread)
-        
-        # Clean up finished threads
-        active_threads[:] = [t for t in active_threads if t.is_alive()]
+        # Queue the response on the speech worker
+        speak_response(response_text, cache=result['served_by'] == 'local' or bool(result.get('error')))
         
         return jsonify({
             'user_input': recognized_text,
             'response': response_text,
-            'error': result.get('error', False)
+            'error': result.get('error', False),
+            'served_by': result['served_by']
         })
     
     except Exception as e:
@@ -217,6 +447,179 @@ def process_speech():
         }), 500
 
 
+@app.route('/api/transcribe', methods=['POST'])
+def transcribe():
+    """
+    Transcribe an uploaded recording and answer it.
+    
+    The raw request body (WAV, FLAC, Opus or WebM; chunked uploads welcome)
+    is streamed straight into Deepgram, so memory stays flat however long
+    the recording is. The format is detected from the audio itself.
+    
+    Query parameters:
+        process=false  # transcript only
+        audio=url      # return an audio_url instead of speaking
+    """
+    try:
+        if audio_source.deepgram is None:
+            return jsonify({
+                'error': 'Transcription not available',
+                'response': 'Set DEEPGRAM_API_KEY to enable audio uploads.'
+            }), 503
+        
+        body = iter(lambda: request.stream.read(UPLOAD_CHUNK_SIZE), b'')
+        stt = audio_source.deepgram.transcribe_stream(body, content_type=request.content_type)
+        if not stt['success']:
+            return jsonify({'error': stt['message'], 'response': 'Could not transcribe the audio.'}), 502
+        
+        transcript = stt['transcript'].strip()
+        payload = {
+            'user_input': transcript,
+            'content_type': stt['content_type'],
+            'bytes_received': stt['bytes_sent']
+        }
+        if not transcript:
+            return jsonify(dict(payload, error='No speech recognized',
+                                response='I did not hear anything. Please try again.')), 400
+        if request.args.get('process', 'true').lower() == 'false':
+            return jsonify(payload)
+        if not api_processor:
+            return jsonify(dict(payload, error='API not configured',
+                                response='Please configure your FREE_API_KEY in .env file')), 503
+        
+        session = current_session()
+        result = local_intents.try_answer(transcript)
+        if result is None:
+            result = api_processor.process(transcript, context=session.context.build(transcript))
+            result['served_by'] = 'llm'
+        response_text = result['response']
+        if not result.get('error'):
+            session.context.add_turn(transcript, response_text)
+        
+        session.append(transcript, response_text)
+        
+        audio = deliver_response_audio(response_text, cache=result['served_by'] == 'local' or bool(result.get('error')),
+                                       delivery=request.args.get('audio'))
+        
+        return jsonify(dict(payload,
+                            response=response_text,
+                            error=result.get('error', False),
+                            served_by=result['served_by'],
+                            audio_url=audio))
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'response': 'An error occurred processing your audio.'
+        }), 500
+
+
+def _speech_unavailable():
+    return jsonify({
+        'error': 'Speech recognition not available',
+        'response': 'Speech recognition is not configured. Please use text input instead.'
+    }), 503
+
+
+def _bad_listen_params():
+    return jsonify({
+        'error': 'Invalid query parameters',
+        'response': '"after" must be an integer and "timeout" a non-negative number of seconds.'
+    }), 400
+
+
+@app.route('/api/listen/start', methods=['POST'])
+def listen_start():
+    """
+    Start continuous listening; transcripts arrive on /api/listen/events.
+    
+    Expected JSON:
+    {
+        "phrase_time_limit": 15  # optional, longest utterance in seconds
+    }
+    """
+    if not speech_recognizer:
+        return _speech_unavailable()
+    data = request.get_json(silent=True) or {}
+    try:
+        # Ignore what the microphone hears while the assistant itself is talking
+        started = speech_recognizer.start_continuous(
+            phrase_time_limit=data.get('phrase_time_limit'),
+            suppress=tts.is_speaking
+        )
+    except ValueError as e:
+        return jsonify({'error': 'Invalid request', 'response': str(e)}), 400
+    if not started:
+        return jsonify({'error': 'Microphone not available'}), 503
+    return jsonify({'status': 'ok', 'listening': True, 'last_seq': speech_recognizer.transcripts.last_seq})
+
+
+@app.route('/api/listen/stop', methods=['POST'])
+def listen_stop():
+    """Stop continuous listening and release the microphone."""
+    if not speech_recognizer:
+        return _speech_unavailable()
+    speech_recognizer.stop_continuous()
+    return jsonify({'status': 'ok', 'listening': False})
+
+
+@app.route('/api/listen/transcripts', methods=['GET'])
+def listen_transcripts():
+    """
+    Long-poll for transcripts newer than ?after=<seq> (waits up to ?timeout=20 seconds).
+    """
+    if not speech_recognizer:
+        return _speech_unavailable()
+    try:
+        after = int(request.args.get('after', 0))
+        timeout = float(request.args.get('timeout', 20))
+        if not timeout >= 0:  # Also rejects nan
+            raise ValueError(timeout)
+    except ValueError:
+        return _bad_listen_params()
+    timeout = min(timeout, 60)
+    events = speech_recognizer.transcripts.after(after, timeout)
+    return jsonify({
+        'events': events,
+        'last_seq': events[-1]['seq'] if events else after,
+        'listening': speech_recognizer.continuous_active
+    })
+
+
+@app.route('/api/listen/events', methods=['GET'])
+def listen_events():
+    """
+    Stream transcripts as Server-Sent Events while continuous listening runs.
+    
+    Resume from ?after=<seq> to receive transcripts missed while disconnected.
+    """
+    if not speech_recognizer:
+        return _speech_unavailable()
+    try:
+        after = int(request.args.get('after', 0))
+    except ValueError:
+        return _bad_listen_params()
+    
+    def generate():
+        last_seq = after
+        while True:
+            events = speech_recognizer.transcripts.after(last_seq, 15)
+            if not events:
+                if not speech_recognizer.continuous_active:
+                    return
+                yield ': keep-alive\n\n'
+                continue
+            for event in events:
+                last_seq = event['seq']
+                yield format_sse(event, event='transcript')
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/speak_toggle', methods=['POST'])
 def speak_toggle():
     """Toggle automatic voice response."""
@@ -254,6 +657,46 @@ def tts_settings():
         return jsonify({'error': str(e)}), 500
 
 
+@app.route('/api/tts/audio', methods=['GET', 'POST'])
+def tts_audio():
+    """
+    Stream synthesized speech as a chunked HTTP response.
+    
+    Query string or JSON:
+    {
+        "text": "text to speak",
+        "voice": "aura-asteria-en",  # optional, Deepgram voice
+        "format": "wav"  # optional: wav, pcm or opus
+    }
+    
+    Long responses get an audio_url with a short-lived "id" token in place
+    of the text (see audio_delivery.audio_url).
+    """
+    data = request.args if request.method == 'GET' else (request.json or {})
+    result = audio_source.open_request(data)
+    if not result['success']:
+        return jsonify({'error': result['message']}), result.get('status', 502)
+    
+    return Response(
+        stream_with_context(result['chunks']),
+        mimetype=result['content_type'],
+        headers={'Cache-Control': 'no-cache', 'X-TTS-Engine': result['engine']}
+    )
+
+
+@app.route('/api/tts/stop', methods=['POST'])
+def tts_stop():
+    """Stop the current utterance and clear queued speech."""
+    tts.stop()
+    return jsonify({'status': 'ok', 'message': 'Speech stopped'})
+
+
+@app.route('/api/tts/stats', methods=['GET'])
+def tts_stats():
+    """Get speech queue depth and synthesis timings."""
+    return jsonify(tts.get_stats())
+
+
 @app.route('/api/tts/voices', methods=['GET'])
 def get_voices():
     """Get available TTS voices."""
@@ -269,22 +712,55 @@ def get_voices():
 
 @app.route('/api/history', methods=['GET'])
 def get_history():
-    """Get conversation history."""
-    limit = request.args.get('limit', 50, type=int)
-    return jsonify({
-        'history': conversation_history[-limit:],
-        'total': len(conversation_history)
-    })
+    """
+    Get this session's conversation history, oldest first.
+    
+    Query parameters:
+        limit=50     # entries per page
+        before=<seq> # older page (use next_cursor from the previous one)
+        after=<seq>  # entries newer than seq (use latest from a previous call)
+    """
+    page = current_session().page(
+        limit=request.args.get('limit', 50, type=int),
+        before=request.args.get('before', type=int),
+        after=request.args.get('after', type=int)
+    )
+    return jsonify(page)
+
+
+@app.route('/api/session', methods=['GET'])
+def get_session():
+    """Get this session's size (turns, history bytes, LLM context)."""
+    session = current_session()
+    return jsonify(dict(session.get_stats(), session_id=session.id))
 
 
 @app.route('/api/clear_history', methods=['POST'])
 def clear_history():
-    """Clear conversation history."""
-    global conversation_history
-    conversation_history = []
+    """Clear this session's conversation history."""
+    current_session().clear()
     return jsonify({'status': 'ok', 'message': 'History cleared'})
 
 
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Get response cache hit/miss/eviction counters."""
+    cache = get_response_cache()
+    return jsonify({
+        'enabled': cache is not None,
+        'stats': cache.get_stats() if cache else {}
+    })
+
+
+@app.route('/api/cache/clear', methods=['POST'])
+def cache_clear():
+    """Clear the response cache."""
+    cache = get_response_cache()
+    if cache:
+        cache.clear()
+    return jsonify({'status': 'ok', 'message': 'Cache cleared'})
+
+
 @app.route('/api/models', methods=['GET'])
 def get_models():
     """Get available models."""
@@ -294,7 +770,8 @@ def get_models():
         models = []
     return jsonify({
         'models': models,
-        'current_provider': api_provider
+        'current_provider': api_provider,
+        'circuit_breakers': get_circuit_breaker_stats()
     })
 
 
@@ -324,10 +801,7 @@ def test_speak():
         print(f"Testing voice {voice_idx}: {text}", flush=True)
         tts.set_voice(voice_idx)
         
-        # Speak in background thread
-        speak_thread = threading.Thread(target=tts.speak, args=(text,))
-        speak_thread.daemon = False
-        speak_thread.start()
+        tts.speak(text, interrupt=True)
         
         return jsonify({
             'status': 'speaking',
@@ -0,0 +1,713 @@
+"""
+ASGI backend for AI Personal Assistant.
+Async variant of app.py: LLM and Deepgram calls run on the event loop, so
+one process can hold many requests in flight while they wait on I/O.
+
+Run with:
+    uvicorn asgi_app:app --port 5000
+"""
+import os
+import json
+import asyncio
+from dotenv import load_dotenv
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route, Mount
+from starlette.staticfiles import StaticFiles
+
+from async_processors import AsyncFreeAPIProcessor, AsyncDeepgramProcessor
+from provider_router import ProviderRouter
+from http_pool import get_session_pool, get_async_client_pool
+from circuit_breaker import get_circuit_breaker_stats
+from rate_limiter import get_rate_limit_stats
+from conversation_store import (ConversationStore, SESSION_COOKIE, SESSION_HEADER,
+                                new_session_id, valid_session_id)
+from local_intents import LocalIntentHandler
+from response_cache import get_response_cache
+from stream_utils import format_sse
+from batch_processing import parse_batch_request
+from audio_delivery import SpeechAudioSource, audio_url, get_tts_delivery
+from text_to_speech import TextToSpeech
+
+# Try to import speech recognition, but don't fail if it's not available
+try:
+    from speech_recognition_module import SpeechRecognitionModule
+    SPEECH_RECOGNITION_AVAILABLE = True
+except (ImportError, ModuleNotFoundError) as e:
+    print(f"Warning: Speech recognition not available: {e}")
+    SPEECH_RECOGNITION_AVAILABLE = False
+    SpeechRecognitionModule = None
+
+# Load environment variables
+load_dotenv()
+
+# Get the path to frontend directory
+frontend_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'frontend')
+
+# Initialize components
+api_provider = os.getenv('API_PROVIDER', 'groq')
+api_key = os.getenv('FREE_API_KEY', '')
+
+# Comma-separated list (e.g. groq,together) routes across several providers
+api_providers = [p.strip() for p in os.getenv('API_PROVIDERS', '').split(',') if p.strip()]
+
+try:
+    if len(api_providers) > 1:
+        api_processor = ProviderRouter.from_env(api_providers, processor_class=AsyncFreeAPIProcessor)
+    else:
+        api_processor = AsyncFreeAPIProcessor(api_key=api_key, api_provider=api_provider)
+except ValueError as e:
+    print(f"Warning: API not configured: {e}")
+    api_processor = None
+
+tts = TextToSpeech()
+audio_source = SpeechAudioSource.from_env(tts)  # Audio for /api/tts/audio
+tts_delivery = get_tts_delivery('local')  # 'url' returns audio URLs instead of speaking
+
+try:
+    transcriber = AsyncDeepgramProcessor() if os.getenv('DEEPGRAM_API_KEY') else None  # /api/transcribe
+except ValueError as e:
+    print(f"Warning: Deepgram STT not available: {e}")
+    transcriber = None
+speech_recognizer = SpeechRecognitionModule() if SPEECH_RECOGNITION_AVAILABLE else None
+
+# Track conversation state
+conversations = ConversationStore()  # Per-session history ring buffer + LLM context
+local_intents = LocalIntentHandler()  # Answers time/date/math/etc. without the LLM
+auto_speak_enabled = True
+
+
+def speak_response(text, cache=False):
+    """
+    Queue the response on the speech worker (returns immediately).
+
+    Repeated phrases (local answers, errors) pass cache=True so they are
+    played from the rendered-audio cache after the first time.
+    """
+    try:
+        if auto_speak_enabled:
+            text_preview = text[:50].replace('\n', ' ')
+            print(f"🎤 Speaking: {text_preview}...", flush=True)
+            tts.speak(text, key='response', cache=cache)
+    except Exception as e:
+        print(f"❌ Error speaking response: {e}", flush=True)
+
+
+def start_speech_stream(delivery=None):
+    """
+    Open a sentence-pipelined utterance for a streamed response.
+
+    Speech starts on the first complete sentence while the LLM is still
+    generating the rest. Returns None when auto speak is off or the
+    response is delivered as an audio URL.
+    """
+    if not auto_speak_enabled or (delivery or tts_delivery) == 'url':
+        return None
+    try:
+        return tts.speak_stream(key='response')
+    except Exception as e:
+        print(f"❌ Error starting speech stream: {e}", flush=True)
+        return None
+
+
+def _record_and_speak(session, user_text, response_text, error=False, local=False, speech=None,
+                      delivery=None):
+    """
+    Add a turn to the session's history and start speaking it without awaiting playback.
+
+    A streamed response passes its SpeechStream, which has been speaking
+    the deltas already; only text that never arrived as deltas is fed to it.
+    With 'url' delivery nothing is spoken and the /api/tts/audio URL is
+    returned instead (None otherwise).
+    """
+    if not error:
+        session.context.add_turn(user_text, response_text)
+    session.append(user_text, response_text)
+    if (delivery or tts_delivery) == 'url':
+        return audio_url(response_text)
+    if speech is not None:
+        if not speech.text:
+            speech.feed(response_text)
+        speech.close()
+    else:
+        speak_response(response_text, cache=error or local)
+    return None
+
+
+def current_session(request):
+    """
+    Get the requesting client's conversation session.
+
+    The id comes from the X-Session-ID header or the session cookie; a
+    client without one gets a new session, and SessionCookieMiddleware
+    sets the cookie on the response.
+    """
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if not valid_session_id(session_id):
+        session_id = getattr(request.state, 'new_session_id', None) or new_session_id()
+        request.state.new_session_id = session_id
+    return conversations.get(session_id)
+
+
+class SessionCookieMiddleware:
+    """Adds the cookie (and X-Session-ID header) for sessions created while handling a request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        state = scope.setdefault('state', {})
+
+        async def send_with_cookie(message):
+            session_id = state.get('new_session_id')
+            if message['type'] == 'http.response.start' and session_id:
+                cookie = (f'{SESSION_COOKIE}={session_id}; Max-Age={int(conversations.idle_ttl)}; '
+                          f'Path=/; HttpOnly; SameSite=Lax')
+                message['headers'] = list(message.get('headers', [])) + [
+                    (b'set-cookie', cookie.encode('latin-1')),
+                    (SESSION_HEADER.lower().encode('latin-1'), session_id.encode('latin-1'))
+                ]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
+
+
+def _api_not_configured():
+    return JSONResponse({
+        'error': 'API not configured',
+        'response': 'Please configure your FREE_API_KEY in .env file'
+    }, status_code=503)
+
+
+async def _read_json(request):
+    try:
+        return await request.json()
+    except ValueError:
+        return {}
+
+
+async def health(request):
+    """Health check endpoint."""
+    if api_processor:
+        models = api_processor.get_available_models()
+        status = 'ok'
+    else:
+        models = []
+        status = 'error'
+
+    return JSONResponse({
+        'status': status,
+        'message': 'AI Assistant is running',
+        'provider': api_provider,
+        'auto_speak': auto_speak_enabled,
+        'available_models': models,
+        'http_pool': get_session_pool().get_stats(),
+        'rate_limits': get_rate_limit_stats(),
+        'circuit_breakers': get_circuit_breaker_stats(),
+        'sessions': conversations.get_stats(),
+        'local_intents': local_intents.get_stats(),
+        'tts': tts.get_stats(),
+        'speech': speech_recognizer.get_stats() if speech_recognizer else None,
+        'processor': api_processor.get_stats() if api_processor else {}
+    })
+
+
+async def process_text(request):
+    """Process text command using Free API."""
+    try:
+        if not api_processor:
+            return _api_not_configured()
+
+        data = await _read_json(request)
+        user_text = data.get('text', '').strip()
+
+        if not user_text:
+            return JSONResponse({
+                'error': 'No text provided',
+                'response': 'Please provide some text.'
+            }, status_code=400)
+
+        session = current_session(request)
+        result = local_intents.try_answer(user_text)
+        if result is None:
+            result = await api_processor.aprocess(
+                user_text,
+                use_cache=data.get('cache', True),
+                context=session.context.build(user_text)
+            )
+            result['served_by'] = 'llm'
+        response_text = result['response']
+        url = _record_and_speak(session, user_text, response_text, result.get('error', False),
+                                result['served_by'] == 'local', delivery=data.get('audio'))
+
+        return JSONResponse({
+            'response': response_text,
+            'error': result.get('error', False),
+            'cached': result.get('cached', False),
+            'provider': result.get('provider', api_provider),
+            'served_by': result['served_by'],
+            'audio_url': url
+        })
+
+    except Exception as e:
+        return JSONResponse({
+            'error': str(e),
+            'response': 'An error occurred processing your request.'
+        }, status_code=500)
+
+
+async def process_text_stream(request):
+    """Process text command and stream the response as Server-Sent Events."""
+    if not api_processor:
+        return _api_not_configured()
+
+    data = await _read_json(request)
+    user_text = data.get('text', '').strip()
+
+    if not user_text:
+        return JSONResponse({
+            'error': 'No text provided',
+            'response': 'Please provide some text.'
+        }, status_code=400)
+
+    session = current_session(request)
+    context = session.context.build(user_text)
+
+    async def generate():
+        speech = start_speech_stream(data.get('audio'))
+        chunks = api_processor.aprocess_stream(user_text, use_cache=data.get('cache', True), context=context)
+        try:
+            async for chunk in chunks:
+                if not chunk.get('done'):
+                    if speech is not None:
+                        speech.feed(chunk['delta'])
+                    yield format_sse({'delta': chunk['delta']})
+                    continue
+
+                response_text = chunk['response']
+                url = _record_and_speak(session, user_text, response_text, chunk.get('error', False),
+                                        speech=speech, delivery=data.get('audio'))
+                yield format_sse({
+                    'response': response_text,
+                    'error': chunk.get('error', False),
+                    'cached': chunk.get('cached', False),
+                    'provider': chunk.get('provider', api_provider),
+                    'audio_url': url
+                }, event='done')
+        finally:
+            if speech is not None:
+                speech.close()
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def process_batch(request):
+    """
+    Process many prompts concurrently (no speech, no history).
+
+    The batch runs on the pooled sync transport in Starlette's threadpool,
+    with the same bounded fan-out and ordering as app.py.
+    """
+    if not api_processor:
+        return _api_not_configured()
+
+    data = await _read_json(request)
+    try:
+        inputs, max_concurrency = parse_batch_request(data)
+    except ValueError as e:
+        return JSONResponse({
+            'error': 'Invalid batch request',
+            'response': str(e)
+        }, status_code=400)
+
+    results = api_processor.iter_many(
+        inputs,
+        max_concurrency=max_concurrency,
+        use_cache=data.get('cache', True)
+    )
+
+    if data.get('stream'):
+        def generate():
+            for result in results:
+                yield json.dumps(result) + '\n'
+
+        return StreamingResponse(generate(), media_type='application/x-ndjson')
+
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(None, list, results)
+    return JSONResponse({
+        'results': results,
+        'count': len(results),
+        'errors': sum(1 for r in results if r.get('error')),
+        'provider': api_provider
+    })
+
+
+async def process_speech(request):
+    """Process speech input using microphone."""
+    try:
+        if not SPEECH_RECOGNITION_AVAILABLE:
+            return JSONResponse({
+                'error': 'Speech recognition not available',
+                'response': 'Speech recognition is not configured. Please use text input instead.'
+            }, status_code=503)
+        if not api_processor:
+            return _api_not_configured()
+
+        data = await _read_json(request)
+        timeout = data.get('timeout', 10)
+
+        # Barge in: stop talking so the assistant does not hear itself
+        tts.stop()
+
+        # Microphone capture is blocking, keep it off the event loop
+        loop = asyncio.get_running_loop()
+        recognized_text = await loop.run_in_executor(None, speech_recognizer.listen, timeout)
+
+        if not recognized_text:
+            return JSONResponse({
+                'error': 'No speech recognized',
+                'response': 'I did not hear anything. Please try again.'
+            }, status_code=400)
+
+        session = current_session(request)
+        result = local_intents.try_answer(recognized_text)
+        if result is None:
+            result = await api_processor.aprocess(recognized_text, context=session.context.build(recognized_text))
+            result['served_by'] = 'llm'
+        response_text = result['response']
+        # The microphone is local, so the answer is spoken locally too
+        _record_and_speak(session, recognized_text, response_text, result.get('error', False),
+                          result['served_by'] == 'local', delivery='local')
+
+        return JSONResponse({
+            'user_input': recognized_text,
+            'response': response_text,
+            'error': result.get('error', False),
+            'served_by': result['served_by']
+        })
+
+    except Exception as e:
+        return JSONResponse({
+            'error': str(e),
+            'response': 'An error occurred processing your speech.'
+        }, status_code=500)
+
+
+async def transcribe(request):
+    """
+    Transcribe an uploaded recording and answer it.
+
+    The raw request body (WAV, FLAC, Opus or WebM; chunked uploads welcome)
+    is streamed straight into Deepgram, so memory stays flat however long
+    the recording is. ?process=false returns only the transcript and
+    ?audio=url returns an audio_url instead of speaking.
+    """
+    try:
+        if transcriber is None:
+            return JSONResponse({
+                'error': 'Transcription not available',
+                'response': 'Set DEEPGRAM_API_KEY to enable audio uploads.'
+            }, status_code=503)
+
+        stt = await transcriber.atranscribe_stream(request.stream(),
+                                                   content_type=request.headers.get('content-type'))
+        if not stt['success']:
+            return JSONResponse({'error': stt['message'], 'response': 'Could not transcribe the audio.'},
+                                status_code=502)
+
+        transcript = stt['transcript'].strip()
+        payload = {
+            'user_input': transcript,
+            'content_type': stt['content_type'],
+            'bytes_received': stt['bytes_sent']
+        }
+        if not transcript:
+            return JSONResponse(dict(payload, error='No speech recognized',
+                                     response='I did not hear anything. Please try again.'), status_code=400)
+        if request.query_params.get('process', 'true').lower() == 'false':
+            return JSONResponse(payload)
+        if not api_processor:
+            return _api_not_configured()
+
+        session = current_session(request)
+        result = local_intents.try_answer(transcript)
+        if result is None:
+            result = await api_processor.aprocess(transcript, context=session.context.build(transcript))
+            result['served_by'] = 'llm'
+        response_text = result['response']
+        url = _record_and_speak(session, transcript, response_text, result.get('error', False),
+                                result['served_by'] == 'local', delivery=request.query_params.get('audio'))
+
+        return JSONResponse(dict(payload,
+                                 response=response_text,
+                                 error=result.get('error', False),
+                                 served_by=result['served_by'],
+                                 audio_url=url))
+
+    except Exception as e:
+        return JSONResponse({
+            'error': str(e),
+            'response': 'An error occurred processing your audio.'
+        }, status_code=500)
+
+
+async def tts_audio(request):
+    """Stream synthesized speech (text/voice/format from the query or JSON body)."""
+    data = dict(request.query_params) if request.method == 'GET' else await _read_json(request)
+    # Starting synthesis is a blocking HTTP call or render, keep it off the event loop
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, audio_source.open_request, data)
+    if not result['success']:
+        return JSONResponse({'error': result['message']}, status_code=result.get('status', 502))
+
+    # A sync iterator is read on Starlette's threadpool, chunk by chunk
+    return StreamingResponse(
+        result['chunks'],
+        media_type=result['content_type'],
+        headers={'Cache-Control': 'no-cache', 'X-TTS-Engine': result['engine']}
+    )
+
+
+async def tts_stop(request):
+    """Stop the current utterance and clear queued speech."""
+    tts.stop()
+    return JSONResponse({'status': 'ok', 'message': 'Speech stopped'})
+
+
+async def tts_stats(request):
+    """Get speech queue depth and synthesis timings."""
+    return JSONResponse(tts.get_stats())
+
+
+def _speech_unavailable():
+    return JSONResponse({
+        'error': 'Speech recognition not available',
+        'response': 'Speech recognition is not configured. Please use text input instead.'
+    }, status_code=503)
+
+
+def _bad_listen_params():
+    return JSONResponse({
+        'error': 'Invalid query parameters',
+        'response': '"after" must be an integer and "timeout" a non-negative number of seconds.'
+    }, status_code=400)
+
+
+async def listen_start(request):
+    """Start continuous listening; transcripts arrive on /api/listen/events."""
+    if not speech_recognizer:
+        return _speech_unavailable()
+    data = await _read_json(request)
+    try:
+        # Ignore what the microphone hears while the assistant itself is talking
+        started = speech_recognizer.start_continuous(
+            phrase_time_limit=data.get('phrase_time_limit'),
+            suppress=tts.is_speaking
+        )
+    except ValueError as e:
+        return JSONResponse({'error': 'Invalid request', 'response': str(e)}, status_code=400)
+    if not started:
+        return JSONResponse({'error': 'Microphone not available'}, status_code=503)
+    return JSONResponse({'status': 'ok', 'listening': True, 'last_seq': speech_recognizer.transcripts.last_seq})
+
+
+async def listen_stop(request):
+    """Stop continuous listening and release the microphone."""
+    if not speech_recognizer:
+        return _speech_unavailable()
+    # Waits for the capture thread to let go of the microphone
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, speech_recognizer.stop_continuous)
+    return JSONResponse({'status': 'ok', 'listening': False})
+
+
+async def listen_transcripts(request):
+    """Long-poll for transcripts newer than ?after=<seq> (waits up to ?timeout=20 seconds)."""
+    if not speech_recognizer:
+        return _speech_unavailable()
+    try:
+        after = int(request.query_params.get('after', 0))
+        timeout = float(request.query_params.get('timeout', 20))
+        if not timeout >= 0:  # Also rejects nan
+            raise ValueError(timeout)
+    except ValueError:
+        return _bad_listen_params()
+    timeout = min(timeout, 60)
+    events = await speech_recognizer.transcripts.aafter(after, timeout)
+    return JSONResponse({
+        'events': events,
+        'last_seq': events[-1]['seq'] if events else after,
+        'listening': speech_recognizer.continuous_active
+    })
+
+
+async def listen_events(request):
+    """Stream transcripts as Server-Sent Events (resume with ?after=<seq>)."""
+    if not speech_recognizer:
+        return _speech_unavailable()
+    try:
+        after = int(request.query_params.get('after', 0))
+    except ValueError:
+        return _bad_listen_params()
+
+    async def generate():
+        last_seq = after
+        while True:
+            # Waits on the event loop: open streams do not hold executor threads
+            events = await speech_recognizer.transcripts.aafter(last_seq, 15)
+            if not events:
+                if not speech_recognizer.continuous_active:
+                    return
+                yield ': keep-alive\n\n'
+                continue
+            for event in events:
+                last_seq = event['seq']
+                yield format_sse(event, event='transcript')
+
+    return StreamingResponse(
+        generate(),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+async def speak_toggle(request):
+    """Toggle automatic voice response."""
+    global auto_speak_enabled
+    data = await _read_json(request)
+    auto_speak_enabled = data.get('enabled', not auto_speak_enabled)
+
+    return JSONResponse({
+        'auto_speak_enabled': auto_speak_enabled,
+        'message': 'Auto speak ' + ('enabled' if auto_speak_enabled else 'disabled')
+    })
+
+
+def _int_param(request, name, default=None):
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+
+async def get_history(request):
+    """Get this session's history, oldest first (limit, and before/after seq cursors)."""
+    page = current_session(request).page(
+        limit=_int_param(request, 'limit', 50),
+        before=_int_param(request, 'before'),
+        after=_int_param(request, 'after')
+    )
+    return JSONResponse(page)
+
+
+async def get_session(request):
+    """Get this session's size (turns, history bytes, LLM context)."""
+    session = current_session(request)
+    return JSONResponse(dict(session.get_stats(), session_id=session.id))
+
+
+async def clear_history(request):
+    """Clear this session's conversation history."""
+    current_session(request).clear()
+    return JSONResponse({'status': 'ok', 'message': 'History cleared'})
+
+
+async def cache_stats(request):
+    """Get response cache hit/miss/eviction counters."""
+    cache = get_response_cache()
+    return JSONResponse({
+        'enabled': cache is not None,
+        'stats': cache.get_stats() if cache else {}
+    })
+
+
+async def cache_clear(request):
+    """Clear the response cache."""
+    cache = get_response_cache()
+    if cache:
+        # The SQLite tier is cleared on disk, keep it off the event loop
+        await asyncio.get_running_loop().run_in_executor(None, cache.clear)
+    return JSONResponse({'status': 'ok', 'message': 'Cache cleared'})
+
+
+async def get_models(request):
+    """Get available models."""
+    models = api_processor.get_available_models() if api_processor else []
+    return JSONResponse({
+        'models': models,
+        'current_provider': api_provider,
+        'circuit_breakers': get_circuit_breaker_stats()
+    })
+
+
+async def set_model(request):
+    """Set the model to use."""
+    data = await _read_json(request)
+    model = data.get('model', '')
+
+    if api_processor and model:
+        api_processor.set_model(model)
+
+    return JSONResponse({
+        'current_provider': api_provider,
+        'message': f'Using {api_provider} provider'
+    })
+
+
+async def shutdown():
+    """Close pooled async connections, stop the speech worker and release the microphone."""
+    await get_async_client_pool().aclose()
+    tts.shutdown()
+    if speech_recognizer:
+        speech_recognizer.close()
+
+
+app = Starlette(
+    routes=[
+        Route('/api/health', health, methods=['GET']),
+        Route('/api/process_text', process_text, methods=['POST']),
+        Route('/api/process_text/stream', process_text_stream, methods=['POST']),
+        Route('/api/process_batch', process_batch, methods=['POST']),
+        Route('/api/process_speech', process_speech, methods=['POST']),
+        Route('/api/transcribe', transcribe, methods=['POST']),
+        Route('/api/listen/start', listen_start, methods=['POST']),
+        Route('/api/listen/stop', listen_stop, methods=['POST']),
+        Route('/api/listen/transcripts', listen_transcripts, methods=['GET']),
+        Route('/api/listen/events', listen_events, methods=['GET']),
+        Route('/api/speak_toggle', speak_toggle, methods=['POST']),
+        Route('/api/tts/audio', tts_audio, methods=['GET', 'POST']),
+        Route('/api/tts/stop', tts_stop, methods=['POST']),
+        Route('/api/tts/stats', tts_stats, methods=['GET']),
+        Route('/api/history', get_history, methods=['GET']),
+        Route('/api/session', get_session, methods=['GET']),
+        Route('/api/clear_history', clear_history, methods=['POST']),
+        Route('/api/cache/stats', cache_stats, methods=['GET']),
+        Route('/api/cache/clear', cache_clear, methods=['POST']),
+        Route('/api/models', get_models, methods=['GET']),
+        Route('/api/model/set', set_model, methods=['POST']),
+        Mount('/', StaticFiles(directory=frontend_path, html=True)),
+    ],
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*'],
+                   expose_headers=[SESSION_HEADER]),
+        Middleware(SessionCookieMiddleware)
+    ],
+    on_shutdown=[shutdown]
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    print("Starting AI Personal Assistant ASGI Backend...")
+    print(f"Using API Provider: {api_provider}")
+    print("Server running on http://localhost:5000")
+    uvicorn.run(app, port=5000)
@@ -0,0 +1,556 @@
+"""
+Asyncio-native twins of the provider processors.
+Built on httpx so one event loop can keep hundreds of LLM and Deepgram
+calls in flight instead of parking a worker thread on each one.
+"""
+import time
+import asyncio
+from typing import Dict, Any, AsyncIterator, List
+
+from free_api_processor import FreeAPIProcessor, DEFAULT_SYSTEM_PROMPT
+from llm_processor import LLMProcessor
+from deepgram_processor import (DeepgramProcessor, DEEPGRAM_STT_PARAMS, SNIFF_BYTES,
+                                choose_content_type, parse_transcript, sniff_audio_content_type)
+from audio_cache import AUDIO_CHUNK_SIZE
+from http_pool import AsyncHTTPClientPool, get_async_client_pool
+from stream_utils import parse_sse_line
+from single_flight import AsyncSingleFlight
+from circuit_breaker import get_circuit_breaker
+
+
+async def _aiter_sse_deltas(response) -> AsyncIterator[str]:
+    """Yield text deltas from a streamed httpx response until [DONE]."""
+    async for line in response.aiter_lines():
+        done, delta = parse_sse_line(line)
+        if done:
+            return
+        if delta:
+            yield delta
+
+
+class AsyncFreeAPIProcessor(FreeAPIProcessor):
+    """Async version of FreeAPIProcessor (aprocess, aprocess_stream)."""
+
+    def __init__(self, api_key: str = None, api_provider: str = "groq",
+                 client_pool: AsyncHTTPClientPool = None):
+        """
+        Initialize async free API processor.
+
+        Args:
+            api_key (str): API key for the chosen provider
+            api_provider (str): API provider (groq, huggingface, together)
+            client_pool (AsyncHTTPClientPool): Shared async transport (optional)
+        """
+        super().__init__(api_key=api_key, api_provider=api_provider)
+        self.client_pool = client_pool or get_async_client_pool()
+        self.async_single_flight = AsyncSingleFlight()
+
+    async def aprocess(self, user_input: str, system_prompt: str = None, use_cache: bool = True,
+                       context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Process user input without blocking the event loop.
+
+        Args:
+            user_input (str): User's input text
+            system_prompt (str): System prompt for context (optional)
+            use_cache (bool): Serve and store repeated prompts from the response cache
+            context (list): Earlier conversation messages to send (optional)
+
+        Returns:
+            Dict with response, tokens, and metadata
+        """
+        if not system_prompt:
+            system_prompt = DEFAULT_SYSTEM_PROMPT
+
+        cache_key = self.cache_key(user_input, system_prompt, context)
+        coalesce = use_cache  # A caller opting out of the cache also opts out of shared responses
+        use_cache = use_cache and self.response_cache is not None
+        if use_cache:
+            cached = await self.response_cache.aget(cache_key)
+            if cached is not None:
+                cached['cached'] = True
+                return cached
+
+        if get_circuit_breaker(self.api_provider).is_open():
+            return self._circuit_open_response()
+
+        # Identical concurrent requests share one upstream call
+        if coalesce:
+            response, shared = await self.async_single_flight.do(
+                cache_key,
+                lambda: self._adispatch(user_input, system_prompt, context)
+            )
+        else:
+            response, shared = await self._adispatch(user_input, system_prompt, context), False
+        response = dict(response)
+
+        if shared:
+            response['coalesced'] = True
+        elif use_cache and not response.get('error'):
+            await self.response_cache.aset(cache_key, response)
+
+        return response
+
+    async def _adispatch(self, user_input: str, system_prompt: str,
+                         context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Send the request to the configured provider."""
+        try:
+            if self.api_provider in ("groq", "together"):
+                payload = self._chat_payload(user_input, system_prompt, context=context)
+            elif self.api_provider == "huggingface":
+                payload = self._huggingface_payload(user_input, system_prompt, context)
+            else:
+                return {
+                    'response': 'Unknown API provider',
+                    'error': True,
+                    'tokens': 0
+                }
+
+            response = await self.client_pool.post(
+                self.api_provider,
+                self.api_url,
+                headers=self.headers,
+                json=payload
+            )
+
+            if response.status_code != 200:
+                return {
+                    'response': f'API Error: {response.status_code}',
+                    'error': True,
+                    'tokens': 0
+                }
+
+            data = response.json()
+            if self.api_provider == "huggingface":
+                if isinstance(data, list) and len(data) > 0:
+                    text = data[0].get('generated_text', '')
+                    return {
+                        'response': text,
+                        'error': False,
+                        'tokens': len(text.split())
+                    }
+                return {
+                    'response': str(data),
+                    'error': False,
+                    'tokens': 0
+                }
+
+            return {
+                'response': data['choices'][0]['message']['content'],
+                'error': False,
+                'tokens': data.get('usage', {}).get('total_tokens', 0)
+            }
+        except Exception as e:
+            return {
+                'response': f'Error: {str(e)}',
+                'error': True,
+                'tokens': 0
+            }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get processor counters for health reporting.
+
+        Returns:
+            dict: Request coalescing stats for the threaded and async paths
+        """
+        stats = super().get_stats()
+        stats['coalescing_async'] = self.async_single_flight.get_stats()
+        return stats
+
+    async def aprocess_stream(self, user_input: str, system_prompt: str = None, use_cache: bool = True,
+                              context: List[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the response as it is generated (async process_stream).
+
+        Args:
+            user_input (str): User's input text
+            system_prompt (str): System prompt for context (optional)
+            use_cache (bool): Serve and store repeated prompts from the response cache
+            context (list): Earlier conversation messages to send (optional)
+
+        Yields:
+            Dict with a text 'delta', then a final dict with 'done': True
+        """
+        if not system_prompt:
+            system_prompt = DEFAULT_SYSTEM_PROMPT
+
+        if self.api_provider not in ("groq", "together"):
+            # No token stream: aprocess() handles the cache, coalescing and breaker
+            result = await self.aprocess(user_input, system_prompt, use_cache=use_cache, context=context)
+            if not result.get('error'):
+                yield {'delta': result['response']}
+            yield dict(result, done=True)
+            return
+
+        cache_key = None
+        if use_cache and self.response_cache is not None:
+            cache_key = self.cache_key(user_input, system_prompt, context)
+            cached = await self.response_cache.aget(cache_key)
+            if cached is not None:
+                yield {'delta': cached['response']}
+                yield dict(cached, done=True, cached=True)
+                return
+
+        if get_circuit_breaker(self.api_provider).is_open():
+            yield dict(self._circuit_open_response(), done=True)
+            return
+
+        parts = []
+        try:
+            payload = self._chat_payload(user_input, system_prompt, stream=True, context=context)
+
+            async with self.client_pool.stream(
+                self.api_provider,
+                'POST',
+                self.api_url,
+                headers=self.headers,
+                json=payload
+            ) as response:
+                if response.status_code != 200:
+                    yield {
+                        'done': True,
+                        'response': f'API Error: {response.status_code}',
+                        'error': True,
+                        'tokens': 0
+                    }
+                    return
+
+                async for delta in _aiter_sse_deltas(response):
+                    parts.append(delta)
+                    yield {'delta': delta}
+
+            text = ''.join(parts)
+            result = {
+                'response': text,
+                'error': False,
+                'tokens': len(text.split())
+            }
+            if cache_key is not None:
+                await self.response_cache.aset(cache_key, result)
+            yield dict(result, done=True)
+        except Exception as e:
+            yield {
+                'done': True,
+                'response': ''.join(parts) or f'Streaming Error: {str(e)}',
+                'error': True,
+                'tokens': 0
+            }
+
+
+class AsyncLLMProcessor(LLMProcessor):
+    """Async version of LLMProcessor (aprocess, aprocess_stream)."""
+
+    def __init__(self, api_key: str = None, provider: str = "groq",
+                 client_pool: AsyncHTTPClientPool = None):
+        """
+        Initialize async LLM processor.
+
+        Args:
+            api_key (str): API key for the provider
+            provider (str): Provider name (groq, huggingface, together, deepgram)
+            client_pool (AsyncHTTPClientPool): Shared async transport (optional)
+        """
+        super().__init__(api_key=api_key, provider=provider)
+        self.client_pool = client_pool or get_async_client_pool()
+
+    async def aprocess(self, user_input: str, system_prompt: str = None,
+                       context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Process user input without blocking the event loop.
+
+        Args:
+            user_input (str): User's input text
+            system_prompt (str): System prompt for context
+            context (list): Earlier conversation messages to send (optional)
+
+        Returns:
+            Dict with response and metadata
+        """
+        if not system_prompt:
+            system_prompt = DEFAULT_SYSTEM_PROMPT
+
+        if self.provider == "deepgram":
+            return self._call_deepgram(user_input, system_prompt)
+        if self.provider not in ("groq", "together", "huggingface"):
+            return {
+                'response': f'Provider {self.provider} not supported',
+                'error': True,
+                'tokens': 0
+            }
+
+        try:
+            if self.provider == "huggingface":
+                payload = self._huggingface_payload(user_input, system_prompt, context)
+            else:
+                payload = self._chat_payload(user_input, system_prompt, context=context)
+
+            response = await self.client_pool.post(
+                self.provider,
+                self.api_url,
+                headers=self.headers,
+                json=payload
+            )
+
+            if response.status_code == 401:
+                return {
+                    'response': 'Invalid API key. Please check your credentials.',
+                    'error': True,
+                    'tokens': 0
+                }
+            if response.status_code != 200:
+                return {
+                    'response': f'API Error {response.status_code}: {response.text[:200]}',
+                    'error': True,
+                    'tokens': 0
+                }
+
+            data = response.json()
+            if self.provider == "huggingface":
+                if isinstance(data, list) and len(data) > 0:
+                    text = data[0].get('generated_text', '')
+                    if 'Assistant:' in text:
+                        text = text.split('Assistant:')[-1].strip()
+                    return {
+                        'response': text,
+                        'error': False,
+                        'tokens': len(text.split()),
+                        'provider': self.provider
+                    }
+                return {
+                    'response': str(data),
+                    'error': False,
+                    'tokens': 0
+                }
+
+            return {
+                'response': data['choices'][0]['message']['content'],
+                'error': False,
+                'tokens': data.get('usage', {}).get('total_tokens', 0),
+                'provider': self.provider
+            }
+        except Exception as e:
+            return {
+                'response': f'{self.provider.title()} API Error: {str(e)}',
+                'error': True,
+                'tokens': 0
+            }
+
+    async def aprocess_stream(self, user_input: str, system_prompt: str = None,
+                              context: List[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the response as it is generated.
+
+        Args:
+            user_input (str): User's input text
+            system_prompt (str): System prompt for context
+            context (list): Earlier conversation messages to send (optional)
+
+        Yields:
+            Dict with a text 'delta', then a final dict with 'done': True
+        """
+        if not system_prompt:
+            system_prompt = DEFAULT_SYSTEM_PROMPT
+
+        if self.provider not in ("groq", "together"):
+            result = await self.aprocess(user_input, system_prompt, context)
+            if not result.get('error'):
+                yield {'delta': result['response']}
+            yield dict(result, done=True)
+            return
+
+        parts = []
+        try:
+            payload = self._chat_payload(user_input, system_prompt, stream=True, context=context)
+
+            async with self.client_pool.stream(
+                self.provider,
+                'POST',
+                self.api_url,
+                headers=self.headers,
+                json=payload
+            ) as response:
+                if response.status_code != 200:
+                    yield {
+                        'done': True,
+                        'response': f'API Error {response.status_code}',
+                        'error': True,
+                        'tokens': 0
+                    }
+                    return
+
+                async for delta in _aiter_sse_deltas(response):
+                    parts.append(delta)
+                    yield {'delta': delta}
+
+            text = ''.join(parts)
+            yield {
+                'done': True,
+                'response': text,
+                'error': False,
+                'tokens': len(text.split()),
+                'provider': self.provider
+            }
+        except Exception as e:
+            yield {
+                'done': True,
+                'response': ''.join(parts) or f'{self.provider.title()} API Error: {str(e)}',
+                'error': True,
+                'tokens': 0
+            }
+
+
+class AsyncDeepgramProcessor(DeepgramProcessor):
+    """Async version of DeepgramProcessor (atext_to_speech, aspeech_to_text)."""
+
+    def __init__(self, api_key: str = None, client_pool: AsyncHTTPClientPool = None):
+        """
+        Initialize async Deepgram processor.
+
+        Args:
+            api_key (str): Deepgram API key
+            client_pool (AsyncHTTPClientPool): Shared async transport (optional)
+        """
+        super().__init__(api_key=api_key)
+        self.client_pool = client_pool or get_async_client_pool()
+
+    async def atext_to_speech(self, text: str, voice: str = "aura-asteria-en") -> Dict[str, Any]:
+        """
+        Convert text to speech using Deepgram without blocking the event loop.
+
+        Args:
+            text (str): Text to convert
+            voice (str): Voice model to use
+
+        Returns:
+            Dict with raw audio bytes or error
+        """
+        try:
+            response = await self.client_pool.post(
+                'deepgram',
+                self.tts_url,
+                headers=self.headers,
+                json={"text": text},
+                params={"model": voice, "encoding": "linear16"}
+            )
+
+            if response.status_code == 200:
+                return {
+                    'success': True,
+                    'audio': response.content,
+                    'error': False
+                }
+            return {
+                'success': False,
+                'error': True,
+                'message': f'TTS Error: {response.status_code}'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': True,
+                'message': f'Deepgram TTS Error: {str(e)}'
+            }
+
+    async def atranscribe_stream(self, chunks: AsyncIterator[bytes], content_type: str = None,
+                                 params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Transcribe audio from an async byte stream (e.g. a request body).
+
+        The chunks are forwarded to Deepgram as they arrive, so memory use
+        does not grow with the recording's length.
+
+        Args:
+            chunks (AsyncIterator): Audio bytes
+            content_type (str): Declared type, used when sniffing fails
+            params (dict): Deepgram listen options (default nova-2, en)
+
+        Returns:
+            Dict with transcript, content type and bytes sent, or error
+        """
+        try:
+            head = b''
+            async for chunk in chunks:
+                head += chunk
+                if len(head) >= SNIFF_BYTES:
+                    break
+            content_type = choose_content_type(sniff_audio_content_type(head), content_type)
+            sent = [0]
+
+            async def body():
+                if head:
+                    sent[0] += len(head)
+                    yield head
+                async for chunk in chunks:
+                    sent[0] += len(chunk)
+                    yield chunk
+
+            headers = self.headers.copy()
+            headers["Content-Type"] = content_type
+
+            response = await self.client_pool.post(
+                'deepgram',
+                self.stt_url,
+                headers=headers,
+                content=body(),
+                params=dict(DEEPGRAM_STT_PARAMS, **(params or {}))
+            )
+
+            if response.status_code == 200:
+                return {
+                    'success': True,
+                    'transcript': parse_transcript(response.json()),
+                    'content_type': content_type,
+                    'bytes_sent': sent[0],
+                    'error': False
+                }
+            return {
+                'success': False,
+                'error': True,
+                'message': f'STT Error: {response.status_code}'
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'error': True,
+                'message': f'Deepgram STT Error: {str(e)}'
+            }
+
+    async def aspeech_to_text(self, audio_file_path: str) -> Dict[str, Any]:
+        """
+        Convert speech to text using Deepgram without blocking the event loop.
+
+        Args:
+            audio_file_path (str): Path to audio file
+
+        Returns:
+            Dict with transcribed text (and 'preprocess' savings when applied)
+        """
+        prepared = None
+        if self.preprocessor:
+            loop = asyncio.get_running_loop()
+            prepared = await loop.run_in_executor(None, self.preprocessor.process_file, audio_file_path)
+        if not prepared or not prepared['success']:
+            return await self.atranscribe_stream(_aiter_file(audio_file_path))
+
+        start = time.perf_counter()
+        result = await self.atranscribe_stream(_aiter_bytes(prepared['data']), content_type=prepared['content_type'])
+        if result['success']:
+            self.preprocessor.record_upload(result['bytes_sent'], (time.perf_counter() - start) * 1000)
+            result['preprocess'] = {k: v for k, v in prepared.items() if k not in ('data', 'success', 'error')}
+        return result
+
+
+async def _aiter_bytes(data: bytes) -> AsyncIterator[bytes]:
+    yield data
+
+
+async def _aiter_file(path: str, chunk_size: int = AUDIO_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Read a file in chunks, each read run in an executor thread."""
+    loop = asyncio.get_running_loop()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = await loop.run_in_executor(None, f.read, chunk_size)
+            if not chunk:
+                break
+            yield chunk
@@ -0,0 +1,325 @@
+"""
+Rendered-audio cache for text-to-speech.
+Synthesized audio is stored on disk under a content address built from the
+text and the voice settings that produced it, so a repeated phrase costs a
+file read instead of a synthesis. The total size is bounded by LRU eviction.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import subprocess
+import sys
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+# winsound ships with CPython on Windows only
+try:
+    import winsound
+    WINSOUND_AVAILABLE = True
+except ImportError:
+    winsound = None
+    WINSOUND_AVAILABLE = False
+
+DEFAULT_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'ai_assistant_audio_cache')
+
+# Read/stream size for audio bodies
+AUDIO_CHUNK_SIZE = 16 * 1024
+
+# Unfinished renders untouched for this long were abandoned by a crash; younger
+# ones may belong to another worker sharing the directory
+STALE_PART_SECONDS = 3600
+
+
+class AudioCache:
+    """Content-addressed on-disk cache of rendered audio with size-based LRU eviction."""
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None, extension: str = '.wav'):
+        """
+        Initialize the audio cache and index files left by earlier runs.
+
+        Args:
+            cache_dir (str): Directory for cached audio (AUDIO_CACHE_DIR)
+            max_bytes (int): Total size limit (AUDIO_CACHE_MAX_MB, default 100 MB)
+            extension (str): File extension for cached audio
+        """
+        self.cache_dir = cache_dir or os.getenv('AUDIO_CACHE_DIR') or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes or int(float(os.getenv('AUDIO_CACHE_MAX_MB', '100')) * 1024 * 1024)
+        self.extension = extension
+
+        self._entries = OrderedDict()  # key -> size in bytes, least recently used first
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        existing = []
+        stale_before = time.time() - STALE_PART_SECONDS
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            is_part = '.part' in name
+            if not is_part and not name.endswith(self.extension):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if is_part:
+                # A render interrupted by a crash or restart; one still being
+                # written by another worker keeps a fresh mtime
+                if stat.st_mtime < stale_before:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                continue
+            existing.append((stat.st_mtime, name[:-len(self.extension)], stat.st_size))
+        # mtime is refreshed on every hit, so it orders entries by last use
+        for _, key, size in sorted(existing):
+            self._entries[key] = size
+            self.total_bytes += size
+        with self._lock:
+            self._evict()
+
+    @staticmethod
+    def make_key(text: str, voice: str, rate: float, volume: float, engine: str) -> str:
+        """
+        Build the content address for rendered speech.
+
+        Returns:
+            str: Hex digest identifying the audio
+        """
+        raw = json.dumps([engine, voice, rate, volume, text])
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        """Get the file path a key is (or would be) stored at."""
+        return os.path.join(self.cache_dir, key + self.extension)
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Look up rendered audio.
+
+        Args:
+            key (str): Key from make_key
+
+        Returns:
+            str: Path of the cached file, or None on a miss
+        """
+        path = self.path_for(key)
+        with self._lock:
+            if key in self._entries:
+                if os.path.exists(path):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    try:
+                        os.utime(path)
+                    except OSError:
+                        pass
+                    return path
+                # Removed behind our back
+                self.total_bytes -= self._entries.pop(key)
+            self.misses += 1
+            return None
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """Like get, but return the cached audio itself."""
+        path = self.get(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key: str, data: bytes) -> str:
+        """
+        Store rendered audio.
+
+        Args:
+            key (str): Key from make_key
+            data (bytes): Audio file contents
+
+        Returns:
+            str: Path of the cached file
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        return self.put_file(key, tmp_path)
+
+    def put_file(self, key: str, src_path: str) -> str:
+        """
+        Move an already rendered file into the cache.
+
+        Args:
+            key (str): Key from make_key
+            src_path (str): Rendered file; it is moved, not copied
+
+        Returns:
+            str: Path of the cached file
+        """
+        path = self.path_for(key)
+        size = os.path.getsize(src_path)
+        # Atomic on one filesystem, so readers never see a partial file
+        os.replace(src_path, path)
+        with self._lock:
+            self.total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self.total_bytes += size
+            self._evict()
+        return path
+
+    def temp_path(self) -> str:
+        """Get a fresh path inside the cache directory to render into."""
+        fd, path = tempfile.mkstemp(dir=self.cache_dir, suffix='.part' + self.extension)
+        os.close(fd)
+        return path
+
+    def _evict(self):
+        """Drop least recently used files until under the size limit (lock held)."""
+        while self.total_bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self.path_for(key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Delete every cached file."""
+        with self._lock:
+            for key in self._entries:
+                try:
+                    os.remove(self.path_for(key))
+                except OSError:
+                    pass
+            self._entries.clear()
+            self.total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Size, hit/miss/eviction counts and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'cache_dir': self.cache_dir,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+def iter_file(path: str, chunk_size: int = AUDIO_CHUNK_SIZE, remove: bool = False):
+    """
+    Stream a file in chunks.
+
+    Args:
+        path (str): File to read
+        chunk_size (int): Bytes per chunk
+        remove (bool): Delete the file afterwards (for uncached renders)
+
+    Yields:
+        bytes: Successive chunks
+    """
+    try:
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        if remove:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _wav_player_command(path: str):
+    """Find a command-line WAV player for this platform (None if there is none)."""
+    if sys.platform == 'darwin' and shutil.which('afplay'):
+        return ['afplay', path]
+    for player in ('paplay', 'aplay'):
+        if shutil.which(player):
+            return [player, path] if player == 'paplay' else [player, '-q', path]
+    return None
+
+
+def play_wav(path: str, stop_event: threading.Event = None) -> bool:
+    """
+    Play a WAV file and block until it finishes.
+
+    Args:
+        path (str): WAV file
+        stop_event (threading.Event): Set to cut playback short (optional)
+
+    Returns:
+        bool: True if a player was available and ran, False to fall back to synthesis
+    """
+    if WINSOUND_AVAILABLE:
+        # Interrupted via stop_wav(), which purges the playing sound
+        winsound.PlaySound(path, winsound.SND_FILENAME | winsound.SND_NODEFAULT)
+        return True
+
+    command = _wav_player_command(path)
+    if command is None:
+        return False
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if stop_event is None:
+        process.wait()
+        return True
+    while process.poll() is None:
+        if stop_event.wait(0.05):
+            process.terminate()
+            process.wait()
+            break
+    return True
+
+
+def stop_wav():
+    """Stop a WAV started by play_wav on Windows (players elsewhere stop via stop_event)."""
+    if WINSOUND_AVAILABLE:
+        winsound.PlaySound(None, winsound.SND_PURGE)
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_audio_cache() -> Optional[AudioCache]:
+    """
+    Get the process-wide audio cache.
+
+    Returns:
+        AudioCache: Shared cache, or None if AUDIO_CACHE_ENABLED is false
+            or the cache directory cannot be created
+    """
+    global _shared_cache
+    if os.getenv('AUDIO_CACHE_ENABLED', 'true').lower() not in ('true', '1', 'yes'):
+        return None
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                try:
+                    _shared_cache = AudioCache()
+                except OSError as e:
+                    print(f"Warning: Audio cache disabled: {e}")
+                    return None
+    return _shared_cache
@@ -0,0 +1,233 @@
+"""
+Server-side speech delivery.
+Responses are synthesized into audio that is streamed to the client over
+HTTP, for deployments without speakers (e.g. Vercel). Audio comes from
+Deepgram when it is configured, otherwise from a pyttsx3 render.
+"""
+import os
+import time
+import secrets
+import threading
+from collections import OrderedDict
+from urllib.parse import urlencode
+from typing import Dict, Any, Mapping, Optional
+
+from audio_cache import iter_file
+
+AUDIO_URL_PATH = '/api/tts/audio'
+DEFAULT_DEEPGRAM_VOICE = 'aura-asteria-en'
+
+# Longest URL that carries its text in the query string; common proxies and
+# servers cap the request line at around 8 KB
+AUDIO_URL_MAX_LENGTH = int(os.getenv('TTS_AUDIO_URL_MAX_LENGTH', '2000'))
+
+
+def get_tts_delivery(default: str = 'local') -> str:
+    """
+    Get how responses are voiced (TTS_DELIVERY).
+
+    Returns:
+        str: 'local' to speak on the server's speakers, 'url' to return an
+            audio URL the client fetches from /api/tts/audio
+    """
+    delivery = os.getenv('TTS_DELIVERY', default).lower()
+    return delivery if delivery in ('local', 'url') else default
+
+
+class AudioTextTokens:
+    """Short-lived tokens standing in for text too long to put in a URL."""
+
+    def __init__(self, ttl: float = None, max_entries: int = 1000):
+        """
+        Initialize the token store.
+
+        Args:
+            ttl (float): Seconds a token stays valid (TTS_AUDIO_TOKEN_TTL, default 300)
+            max_entries (int): Tokens kept; the oldest are dropped beyond this
+        """
+        self.ttl = ttl or float(os.getenv('TTS_AUDIO_TOKEN_TTL', '300'))
+        self.max_entries = max_entries
+        self._tokens = OrderedDict()  # token -> (expires_at, params)
+        self._lock = threading.Lock()
+
+    def put(self, params: Dict[str, str]) -> str:
+        """Store request parameters and return their token."""
+        token = secrets.token_urlsafe(16)
+        now = time.monotonic()
+        with self._lock:
+            self._tokens[token] = (now + self.ttl, params)
+            while self._tokens:
+                oldest_expiry, _ = next(iter(self._tokens.values()))
+                if oldest_expiry > now and len(self._tokens) <= self.max_entries:
+                    break
+                self._tokens.popitem(last=False)
+        return token
+
+    def get(self, token: str) -> Optional[Dict[str, str]]:
+        """Get the parameters behind a token, or None if it is unknown or expired."""
+        with self._lock:
+            entry = self._tokens.get(token)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
+
+
+_text_tokens = AudioTextTokens()
+
+
+def audio_url(text: str, voice: str = None, audio_format: str = None) -> str:
+    """
+    Build the /api/tts/audio URL for text.
+
+    Short text travels in the query string, so any instance can serve the
+    URL without shared state. When that would make the URL longer than
+    TTS_AUDIO_URL_MAX_LENGTH, the text is held for TTS_AUDIO_TOKEN_TTL
+    seconds on this instance and the URL carries a token instead; clients
+    behind a multi-instance deployment should POST long text instead.
+
+    Args:
+        text (str): Text to synthesize
+        voice (str): Voice override (optional)
+        audio_format (str): 'wav', 'pcm' or 'opus' (optional)
+
+    Returns:
+        str: Relative URL
+    """
+    params = {'text': text}
+    if voice:
+        params['voice'] = voice
+    if audio_format:
+        params['format'] = audio_format
+    url = f'{AUDIO_URL_PATH}?{urlencode(params)}'
+    if len(url) <= AUDIO_URL_MAX_LENGTH:
+        return url
+    return f'{AUDIO_URL_PATH}?{urlencode({"id": _text_tokens.put(params)})}'
+
+
+class SpeechAudioSource:
+    """Synthesizes text into a streamed audio body."""
+
+    def __init__(self, tts=None, deepgram=None, engine: str = None, max_chars: int = None,
+                 render_timeout: float = None):
+        """
+        Initialize the audio source.
+
+        Args:
+            tts (TextToSpeech): pyttsx3 worker used for renders (optional)
+            deepgram (DeepgramProcessor): Deepgram client (optional)
+            engine (str): 'deepgram', 'pyttsx3' or 'auto' (TTS_AUDIO_ENGINE);
+                auto prefers Deepgram when it is configured
+            max_chars (int): Longest text accepted (TTS_AUDIO_MAX_CHARS, default 5000)
+            render_timeout (float): Seconds to wait for a pyttsx3 render, which
+                queues behind local playback (TTS_AUDIO_RENDER_TIMEOUT, default 30)
+        """
+        self.tts = tts
+        self.deepgram = deepgram
+        self.engine = (engine or os.getenv('TTS_AUDIO_ENGINE', 'auto')).lower()
+        self.max_chars = max_chars or int(os.getenv('TTS_AUDIO_MAX_CHARS', '5000'))
+        self.render_timeout = render_timeout or float(os.getenv('TTS_AUDIO_RENDER_TIMEOUT', '30'))
+        self.default_voice = os.getenv('DEEPGRAM_VOICE', DEFAULT_DEEPGRAM_VOICE)
+
+    @classmethod
+    def from_env(cls, tts=None) -> "SpeechAudioSource":
+        """Create a source using Deepgram if DEEPGRAM_API_KEY is set."""
+        deepgram = None
+        if os.getenv('DEEPGRAM_API_KEY'):
+            try:
+                from deepgram_processor import DeepgramProcessor
+                deepgram = DeepgramProcessor()
+            except (ImportError, ValueError) as e:
+                print(f"Warning: Deepgram TTS not available: {e}")
+        return cls(tts=tts, deepgram=deepgram)
+
+    def _pick_engine(self) -> str:
+        if self.engine in ('deepgram', 'auto') and self.deepgram is not None:
+            return 'deepgram'
+        if self.engine in ('pyttsx3', 'auto') and self.tts is not None:
+            return 'pyttsx3'
+        return None
+
+    def open_request(self, data: Mapping[str, Any]) -> Dict[str, Any]:
+        """
+        Start synthesizing an /api/tts/audio request.
+
+        Args:
+            data (Mapping): Query parameters or JSON body: 'text', 'voice'
+                and 'format', or the 'id' token from a long audio_url
+
+        Returns:
+            Dict as from open(); an unknown or expired token is a 410
+        """
+        if data.get('id'):
+            data = _text_tokens.get(data['id'])
+            if data is None:
+                return {
+                    'success': False,
+                    'error': True,
+                    'status': 410,
+                    'message': f'Audio link expired; POST the text to {AUDIO_URL_PATH} instead'
+                }
+        return self.open(data.get('text', ''), voice=data.get('voice'), audio_format=data.get('format', 'wav'))
+
+    def open(self, text: str, voice: str = None, audio_format: str = 'wav') -> Dict[str, Any]:
+        """
+        Start synthesizing text.
+
+        Args:
+            text (str): Text to synthesize
+            voice (str): Deepgram voice model (pyttsx3 uses its configured voice)
+            audio_format (str): 'wav', 'pcm' or 'opus' (Deepgram only for the last two)
+
+        Returns:
+            Dict with 'chunks' iterator, 'content_type', 'engine' and
+            'cached', or an error with a suggested HTTP 'status'
+        """
+        text = (text or '').strip()
+        if not text:
+            return {'success': False, 'error': True, 'status': 400, 'message': 'No text provided'}
+        if len(text) > self.max_chars:
+            return {
+                'success': False,
+                'error': True,
+                'status': 413,
+                'message': f'Text longer than {self.max_chars} characters'
+            }
+
+        engine = self._pick_engine()
+        if engine == 'deepgram':
+            # Multi-sentence text starts playing after its first sentence is synthesized
+            result = self.deepgram.open_sentence_stream(text, voice or self.default_voice, audio_format)
+            if not result['success']:
+                result.setdefault('status', 400 if 'format' in result['message'] else 502)
+            result['engine'] = engine
+            return result
+
+        if engine == 'pyttsx3':
+            if audio_format != 'wav':
+                return {
+                    'success': False,
+                    'error': True,
+                    'status': 400,
+                    'message': f'Unsupported audio format for pyttsx3: {audio_format}'
+                }
+            item = self.tts.render(text, wait=False)
+            if item is not None and not item.wait(self.render_timeout) and self.tts.cancel(item):
+                return {
+                    'success': False,
+                    'error': True,
+                    'status': 503,
+                    'message': 'Speech engine busy, try again later'
+                }
+            if item is None or item.path is None:
+                return {'success': False, 'error': True, 'status': 503, 'message': 'Speech render failed'}
+            return {
+                'success': True,
+                # Renders outside the audio cache are temporary files
+                'chunks': iter_file(item.path, remove=self.tts.audio_cache is None),
+                'content_type': 'audio/wav',
+                'engine': engine,
+                'cached': item.cached,
+                'error': False
+            }
+
+        return {'success': False, 'error': True, 'status': 503, 'message': 'No speech engine available'}
@@ -0,0 +1,350 @@
+"""
+Audio preprocessing for speech-to-text uploads.
+Recordings are often 44.1/48 kHz stereo, several times more data than a
+recognizer uses. This stage downmixes to mono, trims leading and trailing
+silence by frame energy, resamples to 16 kHz and optionally encodes FLAC,
+all as whole-array NumPy operations, and keeps count of the bytes saved.
+"""
+import io
+import os
+import time
+import wave
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+# NumPy is optional; without it audio is uploaded as recorded
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+DEFAULT_TARGET_RATE = 16000
+FRAME_MS = 20
+PAD_MS = 150  # Kept around the voiced span so word onsets and tails survive trimming
+
+
+def _decode(pcm: bytes, sample_width: int, channels: int) -> "np.ndarray":
+    """Little-endian PCM -> float32 mono in [-1, 1)."""
+    if sample_width == 1:
+        ints, offset = np.frombuffer(pcm, dtype=np.uint8), 128.0
+    elif sample_width == 2:
+        ints, offset = np.frombuffer(pcm[:len(pcm) - len(pcm) % 2], dtype='<i2'), 0.0
+    elif sample_width == 3:
+        raw = np.frombuffer(pcm[:len(pcm) - len(pcm) % 3], dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        ints = (raw[:, 0] << 8 | raw[:, 1] << 16 | raw[:, 2] << 24) >> 8  # Sign-extend via the top byte
+        offset = 0.0
+    elif sample_width == 4:
+        ints, offset = np.frombuffer(pcm[:len(pcm) - len(pcm) % 4], dtype='<i4'), 0.0
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    scale = 1.0 / (2 ** (8 * sample_width - 1) * channels)
+    # Summing the channels in the float conversion downmixes without an extra pass
+    frames = ints[:len(ints) - len(ints) % channels].reshape(-1, channels)
+    mono = frames.sum(axis=1, dtype=np.float32) if channels > 1 else frames[:, 0].astype(np.float32)
+    if offset:
+        mono -= offset * channels
+    mono *= scale
+    return mono
+
+
+def trim_silence(samples: "np.ndarray", sample_rate: int, threshold_db: float = -40.0,
+                 pad_ms: int = PAD_MS) -> "np.ndarray":
+    """
+    Cut leading and trailing silence.
+
+    Frames whose RMS is threshold_db below the loudest frame count as
+    silence. Audio with no frame above the threshold is returned as is.
+
+    Args:
+        samples (np.ndarray): Mono float samples
+        sample_rate (int): Samples per second
+        threshold_db (float): Silence level relative to the loudest frame
+        pad_ms (int): Audio kept on each side of the voiced span
+
+    Returns:
+        np.ndarray: Trimmed samples (a view)
+    """
+    frame = max(1, sample_rate * FRAME_MS // 1000)
+    count = len(samples) // frame
+    if count == 0:
+        return samples
+    rms = np.sqrt(np.mean(np.square(samples[:count * frame].reshape(count, frame)), axis=1))
+    peak = rms.max()
+    if peak <= 0:
+        return samples
+    voiced = np.flatnonzero(rms >= peak * 10 ** (threshold_db / 20))
+    pad = sample_rate * pad_ms // 1000
+    start = max(0, voiced[0] * frame - pad)
+    end = min(len(samples), (voiced[-1] + 1) * frame + pad)
+    return samples[start:end]
+
+
+def resample(samples: "np.ndarray", sample_rate: int, target_rate: int) -> "np.ndarray":
+    """
+    Resample by truncating (or zero-padding) the spectrum.
+
+    Dropping the bins above the new Nyquist frequency is the anti-alias
+    filter, so no separate low-pass pass is needed.
+
+    Args:
+        samples (np.ndarray): Mono float samples
+        sample_rate (int): Current rate
+        target_rate (int): Wanted rate
+
+    Returns:
+        np.ndarray: Resampled samples
+    """
+    if sample_rate == target_rate or len(samples) == 0:
+        return samples
+    out_len = max(1, int(round(len(samples) * target_rate / sample_rate)))
+    spectrum = np.fft.rfft(samples)
+    return np.fft.irfft(spectrum, out_len)[:out_len].astype(np.float32) * (out_len / len(samples))
+
+
+def preprocess_pcm(pcm: bytes, sample_rate: int, sample_width: int, channels: int = 1,
+                   target_rate: int = DEFAULT_TARGET_RATE, threshold_db: Optional[float] = -40.0) -> Tuple[bytes, int]:
+    """
+    Convert PCM into compact 16-bit mono speech audio.
+
+    Args:
+        pcm (bytes): Interleaved little-endian PCM
+        sample_rate (int): Samples per second
+        sample_width (int): Bytes per sample (1-4)
+        channels (int): Interleaved channels (mixed down to one)
+        target_rate (int): Output rate (never upsampled)
+        threshold_db (float): Trim level (see trim_silence); None keeps silence
+
+    Returns:
+        tuple: (16-bit mono PCM bytes, sample rate)
+    """
+    samples = _decode(pcm, sample_width, channels)
+    if threshold_db is not None:
+        samples = trim_silence(samples, sample_rate, threshold_db)
+    rate = min(sample_rate, target_rate)
+    samples = resample(samples, sample_rate, rate)
+    return (np.clip(samples, -1.0, 32767 / 32768) * 32768).astype('<i2').tobytes(), rate
+
+
+def encode_wav(pcm: bytes, sample_rate: int) -> bytes:
+    """Wrap 16-bit mono PCM in a WAV container."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(sample_rate)
+        w.writeframes(pcm)
+    return buffer.getvalue()
+
+
+def encode_flac(pcm: bytes, sample_rate: int) -> bytes:
+    """
+    Encode 16-bit mono PCM as FLAC.
+
+    Uses the FLAC encoder bundled with SpeechRecognition.
+
+    Raises:
+        ImportError: SpeechRecognition is not installed
+        OSError: No FLAC encoder is available on this platform
+    """
+    import speech_recognition as sr
+    return sr.AudioData(pcm, sample_rate, 2).get_flac_data()
+
+
+class AudioPreprocessor:
+    """Shrinks speech audio before it is sent to a recognizer."""
+
+    def __init__(self, target_rate: int = None, threshold_db: float = None, flac: bool = None,
+                 max_bytes: int = None):
+        """
+        Initialize the preprocessor.
+
+        Args:
+            target_rate (int): Output sample rate (STT_TARGET_RATE, default 16000)
+            threshold_db (float): Silence trim level relative to the loudest
+                frame (STT_TRIM_DB, default -40; 'off' disables trimming)
+            flac (bool): Encode uploads as FLAC instead of WAV (STT_FLAC, default false)
+            max_bytes (int): Larger files are streamed unprocessed so memory
+                stays bounded (STT_PREPROCESS_MAX_MB, default 50)
+        """
+        self.target_rate = target_rate or int(os.getenv('STT_TARGET_RATE', str(DEFAULT_TARGET_RATE)))
+        if threshold_db is None:
+            trim = os.getenv('STT_TRIM_DB', '-40').lower()
+            threshold_db = None if trim in ('off', 'none', '') else float(trim)
+        self.threshold_db = threshold_db
+        if flac is None:
+            flac = os.getenv('STT_FLAC', 'false').lower() in ('true', '1', 'yes')
+        self.flac = flac
+        self.max_bytes = max_bytes or int(float(os.getenv('STT_PREPROCESS_MAX_MB', '50')) * 1024 * 1024)
+
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.audio_s_in = 0.0
+        self.audio_s_out = 0.0
+        self.preprocess_ms = 0.0
+        self.upload_bytes = 0
+        self.upload_ms = 0.0
+
+    def _record(self, bytes_in, bytes_out, seconds_in, seconds_out, elapsed_ms):
+        with self._lock:
+            self.processed += 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+            self.audio_s_in += seconds_in
+            self.audio_s_out += seconds_out
+            self.preprocess_ms += elapsed_ms
+
+    def _saved_ms(self, bytes_saved: int, elapsed_ms: float) -> Optional[float]:
+        """Upload time saved at the measured upload rate, less the preprocessing time."""
+        if not self.upload_bytes:
+            return None
+        return round(bytes_saved * self.upload_ms / self.upload_bytes - elapsed_ms, 1)
+
+    def record_upload(self, bytes_sent: int, elapsed_ms: float):
+        """Record a finished recognition request (gives the rate used to estimate time saved)."""
+        with self._lock:
+            self.upload_bytes += bytes_sent
+            self.upload_ms += elapsed_ms
+
+    def process_file(self, path: str) -> Dict[str, Any]:
+        """
+        Preprocess a WAV file for upload.
+
+        Args:
+            path (str): Audio file
+
+        Returns:
+            Dict with the encoded 'data', its 'content_type' and the
+            per-request savings, or success False when the file should be
+            sent as is (not WAV, too large, or undecodable)
+        """
+        try:
+            size = os.path.getsize(path)
+            if size > self.max_bytes:
+                raise ValueError(f'larger than {self.max_bytes} bytes')
+            start = time.perf_counter()
+            with wave.open(path, 'rb') as w:
+                rate, width, channels = w.getframerate(), w.getsampwidth(), w.getnchannels()
+                pcm = w.readframes(w.getnframes())
+            seconds_in = len(pcm) / (rate * width * channels)
+            out, out_rate = preprocess_pcm(pcm, rate, width, channels, self.target_rate, self.threshold_db)
+            if self.flac:
+                data, content_type = encode_flac(out, out_rate), 'audio/flac'
+            else:
+                data, content_type = encode_wav(out, out_rate), 'audio/wav'
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        except (OSError, EOFError, ValueError, wave.Error) as e:
+            with self._lock:
+                self.skipped += 1
+            return {'success': False, 'error': True, 'message': f'Not preprocessed: {e}'}
+
+        seconds_out = len(out) / (out_rate * 2)
+        self._record(size, len(data), seconds_in, seconds_out, elapsed_ms)
+        return {
+            'success': True,
+            'data': data,
+            'content_type': content_type,
+            'bytes_in': size,
+            'bytes_out': len(data),
+            'trimmed_s': round(seconds_in - seconds_out, 2),
+            'preprocess_ms': round(elapsed_ms, 1),
+            'est_saved_ms': self._saved_ms(size - len(data), elapsed_ms),
+            'error': False
+        }
+
+    def process_audio_data(self, audio):
+        """
+        Preprocess captured speech_recognition audio.
+
+        Args:
+            audio (sr.AudioData): Captured audio
+
+        Returns:
+            sr.AudioData: Compact audio (the original if it cannot be processed)
+        """
+        return self.prepare_audio_data(audio)['audio']
+
+    def prepare_audio_data(self, audio) -> Dict[str, Any]:
+        """
+        Preprocess captured speech_recognition audio and report the savings.
+
+        Args:
+            audio (sr.AudioData): Captured audio
+
+        Returns:
+            Dict with the compact 'audio' (the original, with success
+            False, if it cannot be processed) and the per-request savings
+        """
+        try:
+            import speech_recognition as sr
+            start = time.perf_counter()
+            out, out_rate = preprocess_pcm(audio.frame_data, audio.sample_rate, audio.sample_width, 1,
+                                           self.target_rate, self.threshold_db)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        except (ImportError, ValueError) as e:
+            print(f"Warning: Audio preprocessing skipped: {e}")
+            with self._lock:
+                self.skipped += 1
+            return {'success': False, 'error': True, 'audio': audio, 'message': f'Not preprocessed: {e}'}
+        seconds_in = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+        seconds_out = len(out) / (out_rate * 2)
+        self._record(len(audio.frame_data), len(out), seconds_in, seconds_out, elapsed_ms)
+        return {
+            'success': True,
+            'audio': sr.AudioData(out, out_rate, 2),
+            'bytes_in': len(audio.frame_data),
+            'bytes_out': len(out),
+            'trimmed_s': round(seconds_in - seconds_out, 2),
+            'preprocess_ms': round(elapsed_ms, 1),
+            'est_saved_ms': self._saved_ms(len(audio.frame_data) - len(out), elapsed_ms),
+            'error': False
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get preprocessing totals.
+
+        Returns:
+            dict: Requests processed, bytes and audio seconds before/after,
+                average preprocessing cost and estimated upload time saved
+        """
+        with self._lock:
+            saved = self.bytes_in - self.bytes_out
+            return {
+                'target_rate': self.target_rate,
+                'flac': self.flac,
+                'processed': self.processed,
+                'skipped': self.skipped,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'bytes_saved_pct': round(100 * saved / self.bytes_in, 1) if self.bytes_in else None,
+                'audio_s_trimmed': round(self.audio_s_in - self.audio_s_out, 2),
+                'avg_preprocess_ms': round(self.preprocess_ms / self.processed, 1) if self.processed else None,
+                'est_saved_ms': self._saved_ms(saved, self.preprocess_ms)
+            }
+
+
+_preprocessor = None
+_preprocessor_lock = threading.Lock()
+
+
+def get_audio_preprocessor() -> Optional[AudioPreprocessor]:
+    """
+    Get the shared preprocessor.
+
+    Returns:
+        AudioPreprocessor: Shared instance, or None when STT_PREPROCESS is
+            false or NumPy is not installed
+    """
+    global _preprocessor
+    if not NUMPY_AVAILABLE or os.getenv('STT_PREPROCESS', 'true').lower() not in ('true', '1', 'yes'):
+        return None
+    if _preprocessor is None:
+        with _preprocessor_lock:
+            if _preprocessor is None:
+                _preprocessor = AudioPreprocessor()
+    return _preprocessor
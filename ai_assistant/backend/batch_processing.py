@@ -0,0 +1,80 @@
+"""
+Bounded concurrent fan-out for batch prompt processing.
+Results come back in input order while only a fixed number of requests
+(and buffered results) are in flight at any time.
+"""
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+# Upper bound on workers a single batch may ask for
+MAX_BATCH_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '8'))
+
+
+def parse_batch_request(data: Any, default_concurrency: int = 4) -> Tuple[List[str], int]:
+    """
+    Validate a /api/process_batch body.
+
+    Args:
+        data (dict): Decoded JSON body
+        default_concurrency (int): Used when max_concurrency is absent
+
+    Returns:
+        tuple: (stripped inputs, max_concurrency capped at MAX_BATCH_CONCURRENCY)
+
+    Raises:
+        ValueError: With a message for the client, if inputs is not a
+            non-empty list of non-blank strings or max_concurrency is not
+            a positive integer
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Please send a JSON object with "inputs".')
+    inputs = data.get('inputs')
+    if not isinstance(inputs, list) or not inputs or not all(isinstance(i, str) and i.strip() for i in inputs):
+        raise ValueError('Please provide "inputs" as a non-empty list of non-empty strings.')
+
+    max_concurrency = data.get('max_concurrency')
+    if max_concurrency is None:
+        max_concurrency = default_concurrency
+    if isinstance(max_concurrency, str) and max_concurrency.strip().isdigit():
+        max_concurrency = int(max_concurrency)
+    if isinstance(max_concurrency, bool) or not isinstance(max_concurrency, int) or max_concurrency < 1:
+        raise ValueError('"max_concurrency" must be a positive integer.')
+    return [i.strip() for i in inputs], min(max_concurrency, MAX_BATCH_CONCURRENCY)
+
+
+def iter_ordered(fn: Callable[[Any], Any], items: Iterable, max_concurrency: int = 4) -> Iterator[Tuple[int, Any]]:
+    """
+    Apply fn to items over a bounded worker pool, yielding in input order.
+
+    At most 2 * max_concurrency items are submitted ahead of the one being
+    yielded, so memory stays flat for arbitrarily long inputs.
+
+    Args:
+        fn (callable): Function applied to each item
+        items (Iterable): Inputs (may be a generator)
+        max_concurrency (int): Worker threads
+
+    Yields:
+        tuple: (index, result) in input order
+    """
+    max_concurrency = max(1, min(int(max_concurrency), MAX_BATCH_CONCURRENCY))
+    window = 2 * max_concurrency
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='batch') as executor:
+        try:
+            for index, item in enumerate(items):
+                pending.append((index, executor.submit(fn, item)))
+                if len(pending) >= window:
+                    done_index, future = pending.popleft()
+                    yield done_index, future.result()
+
+            while pending:
+                done_index, future = pending.popleft()
+                yield done_index, future.result()
+        finally:
+            # Consumer went away (e.g. client disconnected): drop queued work
+            for _, future in pending:
+                future.cancel()
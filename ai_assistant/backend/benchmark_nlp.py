@@ -0,0 +1,70 @@
+"""
+Micro-benchmark for NLPProcessor entity extraction and command parsing.
+Compares the precompiled single-scan extractor with the previous three
+findall() passes, and parse_commands() with a parse_command() loop.
+
+Usage:
+    python benchmark_nlp.py [--repeat 5] [--texts 2000]
+"""
+import re
+import argparse
+import timeit
+
+from nlp_processor import NLPProcessor
+
+SAMPLE_TEXTS = [
+    "remind me tomorrow at 10:30am to call the dentist",
+    "what is 12 times 7",
+    "set a reminder for Friday evening",
+    "what time is it",
+    "search for flights on 12/25/2024 leaving in the morning",
+    "calculate 45.5 plus 17 minus 3",
+    "hello there",
+    "what's the weather like today",
+]
+
+
+def legacy_extract_entities(text):
+    """The original three-pass extractor, kept for comparison."""
+    numbers = re.findall(r'\b\d+(?:\.\d+)?\b', text)
+    time_patterns = r'\b(\d{1,2}:\d{2}(?:am|pm)?|\b(?:morning|afternoon|evening|night)\b)'
+    date_patterns = r'\b(\d{1,2}/\d{1,2}/\d{2,4}|(?:Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday)|tomorrow|today)\b'
+    return {
+        'numbers': [float(n) if '.' in n else int(n) for n in numbers],
+        'time_expressions': re.findall(time_patterns, text, re.IGNORECASE),
+        'dates': re.findall(date_patterns, text, re.IGNORECASE)
+    }
+
+
+def run(label, fn, repeat, count):
+    """Time fn and print the best per-item cost in microseconds."""
+    best = min(timeit.repeat(fn, number=1, repeat=repeat))
+    print(f"{label:<38} {best * 1e6 / count:8.2f} us/text  ({best * 1000:.1f} ms total)")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark NLPProcessor parsing")
+    parser.add_argument('--repeat', type=int, default=5, help="timing repetitions (best is reported)")
+    parser.add_argument('--texts', type=int, default=2000, help="texts per repetition")
+    args = parser.parse_args()
+
+    texts = (SAMPLE_TEXTS * (args.texts // len(SAMPLE_TEXTS) + 1))[:args.texts]
+    nlp = NLPProcessor()
+    print(f"{len(texts)} texts, intent mode: {nlp.mode}\n")
+
+    legacy = run("extract_entities (3x findall, legacy)",
+                 lambda: [legacy_extract_entities(t) for t in texts], args.repeat, len(texts))
+    current = run("extract_entities (single scan, typed)",
+                  lambda: [nlp.extract_entities(t) for t in texts], args.repeat, len(texts))
+    print(f"  speedup: {legacy / current:.2f}x\n")
+
+    loop = run("parse_command loop",
+               lambda: [nlp.parse_command(t) for t in texts], args.repeat, len(texts))
+    batch = run("parse_commands (batched)",
+                lambda: nlp.parse_commands(texts), args.repeat, len(texts))
+    print(f"  speedup: {loop / batch:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,319 @@
+"""
+Bulk transcription of audio archives.
+Walks a directory and transcribes every audio file concurrently: network
+engines (Deepgram, Google) share a bounded thread pool, local decoders
+(Sphinx, Vosk) run in a process pool so decoding is not serialized by the
+GIL, each process keeping its model loaded for every file it handles.
+Each result is appended to a JSONL manifest as it completes, so an
+interrupted run resumes where it stopped.
+
+Usage:
+    python bulk_transcribe.py recordings/ --engine deepgram --workers 8
+    python bulk_transcribe.py recordings/ --engine sphinx --manifest notes.jsonl --retry-errors
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterable, Iterator, List
+
+from audio_preprocess import get_audio_preprocessor
+from recognizer_backends import create_local_backend
+
+# Engines that wait on the network (threads) vs. decode on the CPU (processes)
+NETWORK_ENGINES = ('deepgram', 'google')
+LOCAL_ENGINES = ('sphinx', 'vosk')
+
+# What speech_recognition.AudioFile can read; Deepgram detects any container it supports
+SR_EXTENSIONS = ('.wav', '.flac', '.aif', '.aiff')
+DEEPGRAM_EXTENSIONS = SR_EXTENSIONS + ('.mp3', '.ogg', '.opus', '.webm', '.m4a')
+
+DEFAULT_MANIFEST = 'transcripts.jsonl'
+
+_local = threading.local()
+
+
+def iter_audio_files(root: str, extensions: Iterable[str]) -> Iterator[str]:
+    """
+    Walk root for audio files, in a stable (sorted) order.
+
+    Args:
+        root (str): Directory to scan (a single file is yielded as is)
+        extensions (Iterable): Lower-case extensions to include
+
+    Yields:
+        str: File paths
+    """
+    if os.path.isfile(root):
+        yield root
+        return
+    extensions = tuple(extensions)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(extensions):
+                yield os.path.join(dirpath, name)
+
+
+def load_manifest(path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Read a manifest, keeping the last record per file.
+
+    A truncated final line (from a crash mid-write) is ignored.
+
+    Args:
+        path (str): JSONL manifest
+
+    Returns:
+        dict: File path -> record
+    """
+    records = {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict) and 'path' in record:
+                    records[record['path']] = record
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def _open_manifest(path: str):
+    """Open a manifest for appending, terminating any line cut short by a crash."""
+    manifest = open(path, 'a+b')
+    if manifest.tell() > 0:
+        manifest.seek(-1, os.SEEK_END)
+        if manifest.read(1) != b'\n':
+            manifest.write(b'\n')
+    manifest.close()
+    return open(path, 'a', encoding='utf-8')
+
+
+def _recognizer():
+    """One speech_recognition Recognizer per thread/process."""
+    if getattr(_local, 'recognizer', None) is None:
+        import speech_recognition as sr
+        _local.recognizer = sr.Recognizer()
+    return _local.recognizer
+
+
+_local_backends = {}
+
+
+def _local_backend(engine: str):
+    """The worker process's resident local model (loaded on its first file)."""
+    if engine not in _local_backends:
+        _local_backends[engine] = create_local_backend(engine, decoders=1)
+    return _local_backends[engine]
+
+
+def _sr_transcribe(path: str, engine: str) -> Dict[str, Any]:
+    """Transcribe a file with speech_recognition (runs in a worker thread or process)."""
+    import speech_recognition as sr
+    start = time.perf_counter()
+    try:
+        recognizer = _recognizer()
+        with sr.AudioFile(path) as source:
+            audio = recognizer.record(source)
+        preprocessor = get_audio_preprocessor()
+        if preprocessor is not None:
+            audio = preprocessor.process_audio_data(audio)
+        if engine in LOCAL_ENGINES:
+            transcript = _local_backend(engine).recognize(audio)
+        else:
+            transcript = recognizer.recognize_google(audio)
+        result = {'success': True, 'transcript': transcript, 'error': False}
+    except sr.UnknownValueError:
+        # Audio decoded fine but held no recognizable speech
+        result = {'success': True, 'transcript': '', 'error': False}
+    except Exception as e:
+        result = {'success': False, 'error': True, 'message': f'{type(e).__name__}: {e}'}
+    result['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+class BulkTranscriber:
+    """Transcribes many files concurrently with a resumable manifest."""
+
+    def __init__(self, engine: str = 'deepgram', workers: int = None, manifest_path: str = DEFAULT_MANIFEST,
+                 retry_errors: bool = False, deepgram=None):
+        """
+        Initialize the bulk transcriber.
+
+        Args:
+            engine (str): 'deepgram', 'google', 'sphinx' or 'vosk' (VOSK_MODEL_PATH)
+            workers (int): Concurrent transcriptions (default 8 for network
+                engines, the CPU count for local ones)
+            manifest_path (str): JSONL file results are appended to
+            retry_errors (bool): Redo files whose last attempt failed
+            deepgram (DeepgramProcessor): Client to use (created from DEEPGRAM_API_KEY if None)
+        """
+        if engine not in NETWORK_ENGINES + LOCAL_ENGINES:
+            raise ValueError(f"Unknown engine: {engine}")
+        self.engine = engine
+        self.local = engine in LOCAL_ENGINES
+        self.workers = max(1, workers or ((os.cpu_count() or 2) if self.local else 8))
+        self.manifest_path = manifest_path
+        self.retry_errors = retry_errors
+        self.deepgram = deepgram
+        if engine == 'deepgram' and self.deepgram is None:
+            from deepgram_processor import DeepgramProcessor
+            self.deepgram = DeepgramProcessor()
+
+    @property
+    def extensions(self) -> tuple:
+        """File extensions the engine can read."""
+        return DEEPGRAM_EXTENSIONS if self.engine == 'deepgram' else SR_EXTENSIONS
+
+    def _deepgram_transcribe(self, path: str) -> Dict[str, Any]:
+        start = time.perf_counter()
+        result = self.deepgram.speech_to_text(path)
+        result['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    def _submit(self, executor, path: str):
+        if self.engine == 'deepgram':
+            return executor.submit(self._deepgram_transcribe, path)
+        return executor.submit(_sr_transcribe, path, self.engine)
+
+    def run(self, root: str, progress: bool = False) -> Dict[str, Any]:
+        """
+        Transcribe every pending file under root.
+
+        Results are appended (and flushed) to the manifest as each file
+        finishes. Files already recorded as transcribed are skipped, as are
+        failures unless retry_errors is set.
+
+        Args:
+            root (str): Directory (or single file) to transcribe
+            progress (bool): Print one line per finished file
+
+        Returns:
+            dict: Counts, wall time, throughput and latency percentiles
+        """
+        previous = load_manifest(self.manifest_path)
+        done = {path for path, record in previous.items()
+                if record.get('success') or not self.retry_errors}
+
+        executor_class = ProcessPoolExecutor if self.local else ThreadPoolExecutor
+        window = 2 * self.workers
+        in_flight = {}
+        latencies = []
+        succeeded = failed = skipped = 0
+        total_bytes = 0
+        start = time.perf_counter()
+
+        with _open_manifest(self.manifest_path) as manifest, \
+                executor_class(max_workers=self.workers) as executor:
+
+            def collect(finished):
+                nonlocal succeeded, failed, total_bytes
+                for future in finished:
+                    path, size = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        # Worker died (e.g. a process crash): record it and keep going
+                        result = {'success': False, 'error': True, 'message': f'{type(e).__name__}: {e}'}
+                    record = {
+                        'path': path,
+                        'engine': self.engine,
+                        'success': bool(result.get('success')),
+                        'transcript': result.get('transcript'),
+                        'message': result.get('message'),
+                        'latency_ms': result.get('latency_ms'),
+                        'bytes': size,
+                        'finished_at': time.time()
+                    }
+                    manifest.write(json.dumps(record) + '\n')
+                    manifest.flush()
+                    if record['success']:
+                        succeeded += 1
+                        total_bytes += size
+                        latencies.append(record['latency_ms'])
+                    else:
+                        failed += 1
+                    if progress:
+                        status = 'ok ' if record['success'] else 'ERR'
+                        detail = record['transcript'] if record['success'] else record['message']
+                        print(f"{status} {record['latency_ms'] or 0:8.1f} ms  {path}  {(detail or '')[:60]}")
+
+            for path in iter_audio_files(root, self.extensions):
+                path = os.path.abspath(path)
+                if path in done:
+                    skipped += 1
+                    continue
+                in_flight[self._submit(executor, path)] = (path, os.path.getsize(path))
+                if len(in_flight) >= window:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+
+        elapsed = time.perf_counter() - start
+        processed = succeeded + failed
+        return {
+            'engine': self.engine,
+            'workers': self.workers,
+            'processed': processed,
+            'succeeded': succeeded,
+            'failed': failed,
+            'skipped': skipped,
+            'elapsed_s': round(elapsed, 2),
+            'files_per_s': round(processed / elapsed, 2) if elapsed else None,
+            'mb_per_s': round(total_bytes / 1e6 / elapsed, 2) if elapsed else None,
+            'latency_ms': {
+                'p50': _percentile(latencies, 50),
+                'p95': _percentile(latencies, 95),
+                'max': max(latencies) if latencies else None
+            },
+            'manifest': self.manifest_path
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcribe a directory of audio files")
+    parser.add_argument('root', help="directory (or file) to transcribe")
+    parser.add_argument('--engine', choices=NETWORK_ENGINES + LOCAL_ENGINES, default='deepgram')
+    parser.add_argument('--workers', type=int, default=None,
+                        help="concurrent files (default 8 for network engines, CPU count for local ones)")
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST, help="JSONL results file (resumed if present)")
+    parser.add_argument('--retry-errors', action='store_true', help="retry files that failed in a previous run")
+    parser.add_argument('--quiet', action='store_true', help="only print the summary")
+    args = parser.parse_args()
+
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except ImportError:
+        pass
+
+    transcriber = BulkTranscriber(engine=args.engine, workers=args.workers, manifest_path=args.manifest,
+                                  retry_errors=args.retry_errors)
+    summary = transcriber.run(args.root, progress=not args.quiet)
+
+    latency = summary['latency_ms']
+    print(f"\n{summary['processed']} files ({summary['succeeded']} ok, {summary['failed']} failed, "
+          f"{summary['skipped']} already done) in {summary['elapsed_s']} s "
+          f"with {summary['workers']} {summary['engine']} workers")
+    print(f"throughput: {summary['files_per_s']} files/s, {summary['mb_per_s']} MB/s")
+    print(f"latency: p50 {latency['p50']} ms, p95 {latency['p95']} ms, max {latency['max']} ms")
+    print(f"manifest: {summary['manifest']}")
+
+
+if __name__ == '__main__':
+    main()
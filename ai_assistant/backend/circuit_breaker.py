@@ -0,0 +1,180 @@
+"""
+Per-provider circuit breakers.
+After repeated failures or timeouts a provider's breaker opens and calls
+fail fast; after a cool-down a few probe calls decide whether it closes.
+"""
+import os
+import time
+import threading
+from typing import Dict, Any
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the provider's breaker is open."""
+
+    def __init__(self, provider: str, retry_in: float):
+        self.provider = provider
+        self.retry_in = retry_in
+        super().__init__(f"{provider} is temporarily unavailable (circuit open, retry in {retry_in:.0f}s)")
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker driven by consecutive failures."""
+
+    def __init__(self, name: str, failure_threshold: int = None, recovery_timeout: float = None,
+                 half_open_max_calls: int = None):
+        """
+        Initialize a closed breaker.
+
+        Args:
+            name (str): Provider name
+            failure_threshold (int): Consecutive failures that open the breaker
+            recovery_timeout (float): Seconds to stay open before probing
+            half_open_max_calls (int): Concurrent probe calls allowed while half-open
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold or int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+        self.recovery_timeout = recovery_timeout or float(os.getenv('CIRCUIT_RECOVERY_TIMEOUT', '30'))
+        self.half_open_max_calls = half_open_max_calls or int(os.getenv('CIRCUIT_HALF_OPEN_MAX_CALLS', '1'))
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.rejected = 0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def _retry_in(self, now: float) -> float:
+        return max(0.0, self.opened_at + self.recovery_timeout - now)
+
+    def is_open(self) -> bool:
+        """Check, without side effects, whether calls would currently be rejected."""
+        with self._lock:
+            if self.state == OPEN:
+                return self._retry_in(time.monotonic()) > 0
+            if self.state == HALF_OPEN:
+                return self.probes_in_flight >= self.half_open_max_calls
+            return False
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker lets a probe through."""
+        with self._lock:
+            return self._retry_in(time.monotonic()) if self.state == OPEN else 0.0
+
+    def allow_request(self) -> bool:
+        """
+        Ask to make a call.
+
+        Moves an open breaker to half-open once the cool-down has passed
+        and admits up to half_open_max_calls probes.
+
+        Returns:
+            bool: True if the call may go ahead
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == OPEN and self._retry_in(now) <= 0:
+                self.state = HALF_OPEN
+                self.probes_in_flight = 0
+
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self.probes_in_flight < self.half_open_max_calls:
+                self.probes_in_flight += 1
+                return True
+
+            self.rejected += 1
+            return False
+
+    def check(self):
+        """
+        Like allow_request, but raise when the call is rejected.
+
+        Raises:
+            CircuitOpenError: If the breaker is open
+        """
+        if not self.allow_request():
+            raise CircuitOpenError(self.name, self.retry_in())
+
+    def record_success(self):
+        """Record a successful call (closes a half-open breaker)."""
+        with self._lock:
+            self.consecutive_failures = 0
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                self.state = CLOSED
+
+    def record_failure(self):
+        """Record a failed call (error status, timeout or connection failure)."""
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+                self._open()
+            elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self._open()
+
+    def release_probe(self):
+        """
+        Give back a call slot without judging the provider.
+
+        For calls that ended without an outcome (e.g. a cancelled request),
+        so a half-open probe that never finished does not hold the slot
+        forever.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self.probes_in_flight = max(0, self.probes_in_flight - 1)
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get breaker state for reporting.
+
+        Returns:
+            dict: State, failure count, seconds until retry and counters
+        """
+        with self._lock:
+            now = time.monotonic()
+            state = self.state
+            if state == OPEN and self._retry_in(now) <= 0:
+                state = HALF_OPEN
+            return {
+                'state': state,
+                'consecutive_failures': self.consecutive_failures,
+                'retry_in_seconds': round(self._retry_in(now), 1) if self.state == OPEN else 0.0,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected
+            }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider: str) -> CircuitBreaker:
+    """Get the process-wide breaker for a provider."""
+    breaker = _breakers.get(provider)
+    if breaker is not None:
+        return breaker
+
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = CircuitBreaker(provider)
+            _breakers[provider] = breaker
+        return breaker
+
+
+def get_circuit_breaker_stats() -> Dict[str, Any]:
+    """Get breaker state for every provider seen so far."""
+    return {provider: breaker.snapshot() for provider, breaker in list(_breakers.items())}
@@ -0,0 +1,208 @@
+"""
+Token-budgeted conversation context for LLM requests.
+Recent turns are packed into the chat messages newest-first under a token
+budget; turns that fall out of the window are folded one at a time into a
+rolling summary, so prompt size stays bounded however long a session runs.
+"""
+import os
+import re
+import threading
+from collections import deque
+from typing import Dict, Any, List
+
+# Per-message framing tokens added by chat templates (role markers etc.)
+MESSAGE_OVERHEAD = 4
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the tokens in a piece of text without running a tokenizer.
+
+    Uses ~4 characters per token, but never fewer than one token per
+    word, which keeps short-word and punctuation-heavy text from being
+    underestimated.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    if not text:
+        return 0
+    return max((len(text) + 3) // 4, len(text.split()))
+
+
+def _first_sentence(text: str, max_chars: int) -> str:
+    """Get the first sentence of text, cut to max_chars."""
+    text = ' '.join(text.split())
+    sentence = _SENTENCE_END.split(text, 1)[0]
+    if len(sentence) > max_chars:
+        sentence = sentence[:max_chars].rsplit(' ', 1)[0] + '...'
+    return sentence
+
+
+def summarize_turn(user_text: str, assistant_text: str, max_chars: int = 160) -> str:
+    """
+    Condense one exchange into a single summary line.
+
+    Args:
+        user_text (str): What the user said
+        assistant_text (str): What the assistant answered
+        max_chars (int): Max characters kept from each side
+
+    Returns:
+        str: Summary line
+    """
+    return (
+        f"User: {_first_sentence(user_text, max_chars)} "
+        f"Assistant: {_first_sentence(assistant_text, max_chars)}"
+    )
+
+
+class ConversationContext:
+    """Recent turns plus a rolling summary, kept under a token budget."""
+
+    def __init__(self, max_tokens: int = None, summary_tokens: int = None):
+        """
+        Initialize an empty context.
+
+        Args:
+            max_tokens (int): Token budget for summary, history and the new
+                user turn (the system prompt is not counted)
+            summary_tokens (int): Part of the budget reserved for the summary
+        """
+        self.max_tokens = max_tokens or int(os.getenv('CONTEXT_MAX_TOKENS', '2000'))
+        self.summary_tokens = summary_tokens or int(os.getenv('CONTEXT_SUMMARY_TOKENS', '300'))
+
+        self.turns = deque()  # (messages, tokens), oldest first
+        self.turn_tokens = 0
+        self.summary = deque()  # (line, tokens), oldest first
+        self.summary_total = 0
+        self.summarized_turns = 0
+        self.dropped_turns = 0
+        self._lock = threading.Lock()
+
+    def add_turn(self, user_text: str, assistant_text: str):
+        """
+        Record a finished exchange.
+
+        Turns beyond the recent-history budget are folded into the summary
+        one at a time; summary lines beyond the summary budget are dropped
+        oldest first. Each call does work proportional to the new turn only.
+
+        Args:
+            user_text (str): What the user said
+            assistant_text (str): What the assistant answered
+        """
+        messages = [
+            {"role": "user", "content": user_text},
+            {"role": "assistant", "content": assistant_text}
+        ]
+        tokens = sum(estimate_tokens(m['content']) + MESSAGE_OVERHEAD for m in messages)
+
+        with self._lock:
+            self.turns.append((messages, tokens))
+            self.turn_tokens += tokens
+
+            while self.turns and self.turn_tokens > self.max_tokens - self.summary_tokens:
+                old_messages, old_tokens = self.turns.popleft()
+                self.turn_tokens -= old_tokens
+                self._fold(old_messages)
+
+    def _fold(self, messages: List[Dict[str, str]]):
+        """Add an evicted turn to the rolling summary."""
+        line = summarize_turn(messages[0]['content'], messages[1]['content'])
+        tokens = estimate_tokens(line)
+        self.summary.append((line, tokens))
+        self.summary_total += tokens
+        self.summarized_turns += 1
+
+        while self.summary and self.summary_total > self.summary_tokens:
+            _, old_tokens = self.summary.popleft()
+            self.summary_total -= old_tokens
+            self.dropped_turns += 1
+
+    def build(self, user_input: str) -> List[Dict[str, str]]:
+        """
+        Get the context messages to send ahead of a new user turn.
+
+        Args:
+            user_input (str): The new user turn (its size is taken from the budget)
+
+        Returns:
+            list: Chat messages (summary as a system message, then recent
+                turns oldest first); empty when there is no history
+        """
+        budget = self.max_tokens - estimate_tokens(user_input) - MESSAGE_OVERHEAD
+
+        with self._lock:
+            summary_lines = [line for line, _ in self.summary]
+            if summary_lines and self.summary_total + MESSAGE_OVERHEAD <= budget:
+                budget -= self.summary_total + MESSAGE_OVERHEAD
+            else:
+                summary_lines = []
+
+            recent = []
+            for messages, tokens in reversed(self.turns):
+                if tokens > budget:
+                    break
+                recent.append(messages)
+                budget -= tokens
+
+        context = []
+        if summary_lines:
+            context.append({
+                "role": "system",
+                "content": "Summary of the earlier conversation:\n" + '\n'.join(summary_lines)
+            })
+        for messages in reversed(recent):
+            context.extend(messages)
+        return context
+
+    def clear(self):
+        """Forget all turns and the summary."""
+        with self._lock:
+            self.turns.clear()
+            self.turn_tokens = 0
+            self.summary.clear()
+            self.summary_total = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get context size counters.
+
+        Returns:
+            dict: Budget, recent turns and tokens, summary tokens, turns
+                summarized and turns dropped from the summary
+        """
+        with self._lock:
+            return {
+                'max_tokens': self.max_tokens,
+                'recent_turns': len(self.turns),
+                'recent_tokens': self.turn_tokens,
+                'summary_tokens': self.summary_total,
+                'summarized_turns': self.summarized_turns,
+                'dropped_turns': self.dropped_turns
+            }
+
+
+def format_context_prompt(context: List[Dict[str, str]]) -> str:
+    """
+    Flatten context messages into a plain-text prompt (Hugging Face).
+
+    Args:
+        context (list): Messages from ConversationContext.build
+
+    Returns:
+        str: Prompt text, empty when there is no context
+    """
+    parts = []
+    for message in context or []:
+        if message['role'] == 'system':
+            parts.append(message['content'])
+        else:
+            parts.append(f"{message['role'].title()}: {message['content']}")
+    return '\n\n'.join(parts)
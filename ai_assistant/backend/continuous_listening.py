@@ -0,0 +1,174 @@
+"""
+Building blocks for continuous speech capture.
+A fixed-size ring buffer keeps the most recent PCM frames, an energy gate
+drops utterances that are mostly noise, and a bounded transcript queue lets
+any number of clients wait for transcripts as they complete.
+"""
+import math
+import time
+import asyncio
+import threading
+from array import array
+from collections import deque
+from typing import Dict, Any, List
+
+
+class AudioRingBuffer:
+    """Fixed-size buffer of the most recent PCM frames."""
+
+    def __init__(self, seconds: float, sample_rate: int, sample_width: int, frame_samples: int):
+        """
+        Initialize the ring buffer.
+
+        Args:
+            seconds (float): Audio retained
+            sample_rate (int): Samples per second
+            sample_width (int): Bytes per sample
+            frame_samples (int): Samples per captured frame (the source CHUNK)
+        """
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.frame_samples = frame_samples
+        self._frames = deque(maxlen=max(1, int(math.ceil(seconds * sample_rate / frame_samples))))
+        self._lock = threading.Lock()
+        self.frames_seen = 0
+
+    def append(self, frame: bytes):
+        """Add a captured frame, overwriting the oldest when full."""
+        with self._lock:
+            self._frames.append(frame)
+            self.frames_seen += 1
+
+    def recent(self, seconds: float = None) -> bytes:
+        """
+        Get the most recent audio.
+
+        Args:
+            seconds (float): How much to return (everything buffered if None)
+
+        Returns:
+            bytes: Raw PCM, oldest first
+        """
+        with self._lock:
+            frames = list(self._frames)
+        if seconds is not None:
+            count = int(math.ceil(seconds * self.sample_rate / self.frame_samples))
+            frames = frames[-count:] if count > 0 else []
+        return b''.join(frames)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Buffered and capacity seconds, and the number of frames captured."""
+        with self._lock:
+            buffered = len(self._frames)
+        seconds_per_frame = self.frame_samples / self.sample_rate
+        return {
+            'buffered_s': round(buffered * seconds_per_frame, 2),
+            'capacity_s': round(self._frames.maxlen * seconds_per_frame, 2),
+            'frames_seen': self.frames_seen
+        }
+
+
+def voiced_ms(pcm: bytes, sample_rate: int, sample_width: int, threshold: float,
+              window_ms: int = 30) -> float:
+    """
+    Measure how much of an utterance is above the energy threshold.
+
+    Args:
+        pcm (bytes): Raw 16-bit PCM
+        sample_rate (int): Samples per second
+        sample_width (int): Bytes per sample (only 2 is analysed)
+        threshold (float): RMS energy counted as speech (the recognizer's energy_threshold)
+        window_ms (int): Analysis window
+
+    Returns:
+        float: Milliseconds of windows whose RMS exceeds threshold
+    """
+    if sample_width != 2:
+        # Not 16-bit: let the recognizer decide
+        return len(pcm) / (sample_rate * sample_width) * 1000
+    samples = array('h')
+    samples.frombytes(pcm[:len(pcm) - len(pcm) % 2])
+    window = max(1, sample_rate * window_ms // 1000)
+    limit = threshold * threshold * window
+    voiced = 0
+    for start in range(0, len(samples) - window + 1, window):
+        if sum(s * s for s in samples[start:start + window]) > limit:
+            voiced += 1
+    return voiced * window_ms
+
+
+class TranscriptQueue:
+    """Bounded log of transcript events that clients can wait on."""
+
+    def __init__(self, max_events: int = 100):
+        """
+        Initialize the queue.
+
+        Args:
+            max_events (int): Events kept for late readers
+        """
+        self._events = deque(maxlen=max_events)
+        self._cond = threading.Condition()
+        self._async_waiters = set()
+        self.last_seq = 0
+
+    def publish(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """Append an event (its 'seq' is assigned here) and wake waiting readers."""
+        with self._cond:
+            self.last_seq += 1
+            event = dict(event, seq=self.last_seq, published_at=time.time())
+            self._events.append(event)
+            self._cond.notify_all()
+            for wake in self._async_waiters:
+                wake()
+        return event
+
+    def after(self, seq: int = 0, timeout: float = None) -> List[Dict[str, Any]]:
+        """
+        Get events newer than seq, waiting up to timeout for one to arrive.
+
+        Args:
+            seq (int): Last sequence number the reader has seen
+            timeout (float): Seconds to wait when nothing is new (None waits forever, 0 polls)
+
+        Returns:
+            list: Events in publish order (empty on timeout)
+        """
+        with self._cond:
+            if timeout != 0:
+                self._cond.wait_for(lambda: self.last_seq > seq, timeout)
+            return [event for event in self._events if event['seq'] > seq]
+
+    async def aafter(self, seq: int = 0, timeout: float = None) -> List[Dict[str, Any]]:
+        """
+        Async after(): waits on the event loop instead of holding a thread.
+
+        Args:
+            seq (int): Last sequence number the reader has seen
+            timeout (float): Seconds to wait when nothing is new (None waits forever, 0 polls)
+
+        Returns:
+            list: Events in publish order (empty on timeout)
+        """
+        loop = asyncio.get_running_loop()
+        arrived = asyncio.Event()
+
+        def wake():
+            # Called by publish() from a recognition thread
+            try:
+                loop.call_soon_threadsafe(arrived.set)
+            except RuntimeError:
+                pass  # Loop already closed
+
+        with self._cond:
+            if self.last_seq > seq or timeout == 0:
+                return [event for event in self._events if event['seq'] > seq]
+            self._async_waiters.add(wake)
+        try:
+            await asyncio.wait_for(arrived.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard(wake)
+        return self.after(seq, 0)
@@ -0,0 +1,245 @@
+"""
+Session-keyed conversation storage.
+Each client session gets its own bounded history (a deque ring buffer with
+sequence-number cursors for paging) and its own LLM context. Sessions idle
+past a TTL are evicted, as are the least recently used ones beyond a cap,
+so memory stays bounded however many clients come and go.
+"""
+import os
+import re
+import sys
+import time
+import secrets
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Dict, Any, Optional
+
+from context_builder import ConversationContext
+
+SESSION_COOKIE = 'assistant_session'
+SESSION_HEADER = 'X-Session-ID'
+_SESSION_ID = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def new_session_id() -> str:
+    """Generate an unguessable session id."""
+    return secrets.token_urlsafe(16)
+
+
+def valid_session_id(session_id: Optional[str]) -> bool:
+    """True if a client-supplied id is safe to use as a key."""
+    return bool(session_id) and bool(_SESSION_ID.match(session_id))
+
+
+def _entry_bytes(entry: Dict[str, Any]) -> int:
+    """Approximate memory held by a history entry (the dict and its values)."""
+    return sys.getsizeof(entry) + sum(sys.getsizeof(v) for v in entry.values())
+
+
+class ConversationSession:
+    """One client's bounded history and LLM context."""
+
+    def __init__(self, session_id: str, max_turns: int):
+        """
+        Initialize an empty session.
+
+        Args:
+            session_id (str): Session key
+            max_turns (int): History entries kept (oldest dropped first)
+        """
+        self.id = session_id
+        self.history = deque(maxlen=max_turns)
+        self.context = ConversationContext()  # Token-budgeted history sent to the LLM
+        self.created_at = time.time()
+        self.last_active = time.monotonic()
+        self.next_seq = 1
+        self.history_bytes = sys.getsizeof(self.history)
+        self._lock = threading.Lock()
+
+    def append(self, user_text: str, assistant_text: str) -> Dict[str, Any]:
+        """
+        Record an exchange in O(1).
+
+        Args:
+            user_text (str): What the user said
+            assistant_text (str): What the assistant answered
+
+        Returns:
+            dict: The entry, with its 'seq' cursor
+        """
+        with self._lock:
+            entry = {
+                'seq': self.next_seq,
+                'user': user_text,
+                'assistant': assistant_text,
+                'timestamp': time.time()
+            }
+            self.next_seq += 1
+            if len(self.history) == self.history.maxlen:
+                self.history_bytes -= _entry_bytes(self.history[0])
+            self.history.append(entry)
+            self.history_bytes += _entry_bytes(entry)
+        return entry
+
+    def page(self, limit: int = 50, before: int = None, after: int = None) -> Dict[str, Any]:
+        """
+        Get a page of history, oldest first.
+
+        Sequence numbers are contiguous within the buffer, so a cursor maps
+        straight to a position without scanning.
+
+        Args:
+            limit (int): Entries per page
+            before (int): Return the newest entries with seq < before
+                (default: the newest entries overall)
+            after (int): Return the oldest entries with seq > after (used
+                to fetch what is new since a previous call)
+
+        Returns:
+            dict: 'history', 'total' retained, 'next_cursor' (pass as
+                before= for older entries; None when there are none) and
+                'latest' (pass as after= to poll for new ones)
+        """
+        limit = max(1, min(int(limit), self.history.maxlen))
+        with self._lock:
+            count = len(self.history)
+            first_seq = self.history[0]['seq'] if count else self.next_seq
+            if after is not None:
+                start = min(count, max(0, after + 1 - first_seq))
+                stop = min(count, start + limit)
+            else:
+                stop = count if before is None else min(count, max(0, before - first_seq))
+                start = max(0, stop - limit)
+            entries = list(islice(self.history, start, stop))
+        return {
+            'history': entries,
+            'total': count,
+            'next_cursor': entries[0]['seq'] if entries and start > 0 else None,
+            'latest': self.next_seq - 1
+        }
+
+    def clear(self):
+        """Forget the history and LLM context (sequence numbers keep counting)."""
+        with self._lock:
+            self.history.clear()
+            self.history_bytes = sys.getsizeof(self.history)
+        self.context.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get the session's size.
+
+        Returns:
+            dict: Turns retained and recorded, approximate history bytes,
+                LLM context stats and age
+        """
+        return {
+            'turns': len(self.history),
+            'max_turns': self.history.maxlen,
+            'total_turns': self.next_seq - 1,
+            'history_bytes': self.history_bytes,
+            'context': self.context.get_stats(),
+            'age_s': round(time.time() - self.created_at, 1),
+            'idle_s': round(time.monotonic() - self.last_active, 1)
+        }
+
+
+class ConversationStore:
+    """Sessions by id, least recently used first, with idle and size eviction."""
+
+    def __init__(self, max_turns: int = None, idle_ttl: float = None, max_sessions: int = None):
+        """
+        Initialize the store.
+
+        Args:
+            max_turns (int): History entries per session (SESSION_MAX_TURNS, default 200)
+            idle_ttl (float): Seconds of inactivity before a session is
+                evicted (SESSION_IDLE_TTL, default 3600)
+            max_sessions (int): Sessions kept; the least recently used is
+                evicted beyond this (SESSION_MAX_COUNT, default 1000)
+        """
+        self.max_turns = max_turns or int(os.getenv('SESSION_MAX_TURNS', '200'))
+        self.idle_ttl = idle_ttl or float(os.getenv('SESSION_IDLE_TTL', '3600'))
+        self.max_sessions = max_sessions or int(os.getenv('SESSION_MAX_COUNT', '1000'))
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweep_interval = min(self.idle_ttl, 60)
+        self._last_sweep = time.monotonic()
+        self.created = 0
+        self.evicted_idle = 0
+        self.evicted_lru = 0
+
+    def get(self, session_id: str) -> ConversationSession:
+        """
+        Get a session, creating it if needed, and mark it active.
+
+        Args:
+            session_id (str): Session key
+
+        Returns:
+            ConversationSession: The session
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= self._sweep_interval:
+                self._evict_idle(now)
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = ConversationSession(session_id, self.max_turns)
+                self._sessions[session_id] = session
+                self.created += 1
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+                    self.evicted_lru += 1
+            else:
+                self._sessions.move_to_end(session_id)
+            session.last_active = now
+        return session
+
+    def _evict_idle(self, now: float):
+        """Drop idle sessions from the LRU end (lock held); stops at the first active one."""
+        self._last_sweep = now
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_active < self.idle_ttl:
+                break
+            self._sessions.popitem(last=False)
+            self.evicted_idle += 1
+
+    def evict_idle(self) -> int:
+        """
+        Evict idle sessions now.
+
+        Returns:
+            int: Sessions evicted
+        """
+        with self._lock:
+            before = self.evicted_idle
+            self._evict_idle(time.monotonic())
+            return self.evicted_idle - before
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get store-wide counters.
+
+        Returns:
+            dict: Live sessions, limits, eviction counts and history memory
+                (total, and per session on average and at most)
+        """
+        with self._lock:
+            sizes = [s.history_bytes for s in self._sessions.values()]
+            turns = sum(len(s.history) for s in self._sessions.values())
+            return {
+                'sessions': len(sizes),
+                'max_sessions': self.max_sessions,
+                'max_turns': self.max_turns,
+                'idle_ttl_s': self.idle_ttl,
+                'turns': turns,
+                'history_bytes': sum(sizes),
+                'avg_session_bytes': sum(sizes) // len(sizes) if sizes else 0,
+                'max_session_bytes': max(sizes) if sizes else 0,
+                'created': self.created,
+                'evicted_idle': self.evicted_idle,
+                'evicted_lru': self.evicted_lru
+            }
@@ -3,20 +3,132 @@ Deepgram-based NLP processor for AI Personal Assistant.
 Uses Deepgram API for speech recognition and text processing.
 """
 import os
-import requests
-from typing import Dict, Any
+import time
+import queue
+import struct
+import itertools
+import contextlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http_pool import HTTPSessionPool, get_session_pool
+from audio_cache import AUDIO_CHUNK_SIZE, AudioCache, get_audio_cache, iter_file
+from audio_preprocess import AudioPreprocessor, get_audio_preprocessor
+from speech_pipeline import iter_sentences
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
+
+# Default /v1/listen options
+DEEPGRAM_STT_PARAMS = {"model": "nova-2", "language": "en"}
+
+# Bytes read before guessing an upload's container (Ogg's OpusHead sits at offset 28)
+SNIFF_BYTES = 64
+
+
+def sniff_audio_content_type(head: bytes) -> Optional[str]:
+    """
+    Detect an audio container from its first bytes.
+    
+    Args:
+        head (bytes): Start of the file (SNIFF_BYTES is enough)
+        
+    Returns:
+        str: MIME type, or None if the format is not recognized
+    """
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return 'audio/wav'
+    if head[:4] == b'fLaC':
+        return 'audio/flac'
+    if head[:4] == b'OggS':
+        return 'audio/ogg; codecs=opus' if b'OpusHead' in head[:SNIFF_BYTES] else 'audio/ogg'
+    if head[:4] == b'\x1a\x45\xdf\xa3':  # EBML header (WebM/Matroska)
+        return 'audio/webm'
+    if head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return 'audio/mpeg'
+    return None
+
+
+def choose_content_type(sniffed: Optional[str], declared: Optional[str]) -> str:
+    """Prefer the sniffed type, then a declared audio/* type; otherwise let Deepgram detect it."""
+    if sniffed:
+        return sniffed
+    if declared and declared.split(';')[0].strip().lower().startswith('audio/'):
+        return declared
+    return 'application/octet-stream'
+
+
+def peek_content_type(chunks: Iterable[bytes]) -> Tuple[Optional[str], Iterator[bytes]]:
+    """
+    Sniff the container of a chunk stream without consuming it.
+    
+    Args:
+        chunks (Iterable): Audio bytes
+        
+    Returns:
+        tuple: (sniffed MIME type or None, iterator over the complete stream)
+    """
+    chunks = iter(chunks)
+    head = []
+    size = 0
+    for chunk in chunks:
+        if chunk:
+            head.append(chunk)
+            size += len(chunk)
+            if size >= SNIFF_BYTES:
+                break
+    first = b''.join(head)
+    return sniff_audio_content_type(first), itertools.chain([first] if first else [], chunks)
+
+
+def parse_transcript(data: Dict[str, Any]) -> str:
+    """Pull the best transcript out of a /v1/listen response."""
+    return data.get('results', {}).get('channels', [{}])[0].get('alternatives', [{}])[0].get('transcript', '')
+
+
+class ByteCounter:
+    """Passes chunks through while counting the bytes."""
+    
+    def __init__(self, chunks: Iterable[bytes]):
+        self.chunks = chunks
+        self.bytes = 0
+    
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self.chunks:
+            self.bytes += len(chunk)
+            yield chunk
+
+
+# Output format -> (Deepgram speak params, HTTP content type)
+DEEPGRAM_AUDIO_FORMATS = {
+    'wav': ({"encoding": "linear16", "container": "wav"}, 'audio/wav'),
+    'pcm': ({"encoding": "linear16", "container": "none", "sample_rate": 24000}, 'audio/L16; rate=24000; channels=1'),
+    'opus': ({"encoding": "opus", "container": "ogg"}, 'audio/ogg; codecs=opus')
+}
+PCM_SAMPLE_RATE = 24000
+
+
+def streaming_wav_header(sample_rate: int = PCM_SAMPLE_RATE) -> bytes:
+    """WAV header for 16-bit mono PCM of unknown length (sizes set to the maximum)."""
+    return struct.pack('<4sI4s4sIHHIIHH4sI', b'RIFF', 0xFFFFFFFF, b'WAVE', b'fmt ', 16, 1, 1,
+                       sample_rate, sample_rate * 2, 2, 16, b'data', 0xFFFFFFFF)
 
 class DeepgramProcessor:
     """Handles NLP and speech processing using Deepgram API."""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, session_pool: HTTPSessionPool = None,
+                 audio_cache: AudioCache = None, preprocessor: AudioPreprocessor = None):
         """
         Initialize Deepgram processor.
         
         Args:
             api_key (str): Deepgram API key
+            session_pool (HTTPSessionPool): Shared keep-alive transport (optional)
+            audio_cache (AudioCache): Rendered-audio cache (defaults to the shared one)
+            preprocessor (AudioPreprocessor): Shrinks WAV files before
+                speech_to_text uploads them (defaults to the shared one)
         """
         self.api_key = api_key or os.getenv('DEEPGRAM_API_KEY', '')
+        self.session_pool = session_pool or get_session_pool()
+        self.audio_cache = audio_cache if audio_cache is not None else get_audio_cache()
+        self.preprocessor = preprocessor if preprocessor is not None else get_audio_preprocessor()
         
         if not self.api_key:
             raise ValueError("DEEPGRAM_API_KEY not provided. Please set it in environment variables.")
@@ -30,38 +142,68 @@ class DeepgramProcessor:
         self.tts_url = "https://api.deepgram.com/v1/speak"
         self.stt_url = "https://api.deepgram.com/v1/listen"
     
-    def text_to_speech(self, text: str, voice: str = "aura-asteria-en") -> Dict[str, Any]:
+    def open_speech_stream(self, text: str, voice: str = "aura-asteria-en",
+                           audio_format: str = "wav", use_cache: bool = True) -> Dict[str, Any]:
         """
-        Convert text to speech using Deepgram.
+        Start synthesis and hand back the audio as a chunk iterator.
+        
+        The request is sent (and its status checked) here; the body is read
+        with iter_content as the caller consumes 'chunks', so memory stays
+        flat however long the text is. WAV output is written through to the
+        audio cache while it streams, and a cached WAV is streamed from disk.
         
         Args:
             text (str): Text to convert
             voice (str): Voice model to use
+            audio_format (str): 'wav', 'pcm' (raw 16-bit, 24 kHz) or 'opus' (Ogg)
+            use_cache (bool): Serve and store WAV output in the audio cache
             
         Returns:
-            Dict with audio URL or error
+            Dict with 'chunks' iterator, 'content_type' and 'cached' flag, or error
         """
-        try:
-            params = {
-                "model": voice,
-                "encoding": "linear16"
+        if audio_format not in DEEPGRAM_AUDIO_FORMATS:
+            return {
+                'success': False,
+                'error': True,
+                'message': f'Unsupported audio format: {audio_format}'
             }
-            
-            response = requests.post(
+        params, content_type = DEEPGRAM_AUDIO_FORMATS[audio_format]
+        
+        key = None
+        if use_cache and audio_format == 'wav' and self.audio_cache is not None:
+            key = AudioCache.make_key(text, voice, None, None, 'deepgram')
+            path = self.audio_cache.get(key)
+            if path is not None:
+                return {
+                    'success': True,
+                    'chunks': iter_file(path),
+                    'content_type': content_type,
+                    'path': path,
+                    'cached': True,
+                    'error': False
+                }
+        
+        try:
+            response = self.session_pool.post(
+                'deepgram',
                 self.tts_url,
                 headers=self.headers,
                 json={"text": text},
-                params=params,
-                timeout=30
+                params=dict(params, model=voice),
+                stream=True
             )
             
             if response.status_code == 200:
                 return {
                     'success': True,
-                    'audio': response.content,  # Raw audio bytes
+                    'chunks': self._iter_audio(response, key),
+                    'content_type': content_type,
+                    'path': self.audio_cache.path_for(key) if key is not None else None,
+                    'cached': False,
                     'error': False
                 }
             else:
+                response.close()
                 return {
                     'success': False,
                     'error': True,
@@ -74,42 +216,234 @@ class DeepgramProcessor:
                 'message': f'Deepgram TTS Error: {str(e)}'
             }
     
-    def speech_to_text(self, audio_file_path: str) -> Dict[str, Any]:
+    def _iter_audio(self, response, key: str = None) -> Iterator[bytes]:
+        """Yield the response body, teeing it into the audio cache when key is given."""
+        tmp_path = self.audio_cache.temp_path() if key is not None else None
+        complete = False
+        try:
+            with open(tmp_path, 'wb') if tmp_path else contextlib.nullcontext() as f:
+                for chunk in response.iter_content(chunk_size=AUDIO_CHUNK_SIZE):
+                    if chunk:
+                        if f is not None:
+                            f.write(chunk)
+                        yield chunk
+            complete = True
+        finally:
+            response.close()
+            if tmp_path is not None:
+                if complete:
+                    self.audio_cache.put_file(key, tmp_path)
+                elif os.path.exists(tmp_path):
+                    # Consumer stopped early; never cache a truncated file
+                    os.remove(tmp_path)
+    
+    def text_to_speech(self, text: str, voice: str = "aura-asteria-en",
+                       use_cache: bool = True, audio_format: str = "wav") -> Dict[str, Any]:
         """
-        Convert speech to text using Deepgram.
+        Convert text to speech using Deepgram.
+        
+        Collects the whole WAV in memory; use open_speech_stream to pass
+        long audio on without buffering it.
         
         Args:
-            audio_file_path (str): Path to audio file
+            text (str): Text to convert
+            voice (str): Voice model to use
+            use_cache (bool): Serve and store the WAV in the audio cache
+            audio_format (str): 'wav', 'pcm' or 'opus' (see open_speech_stream)
             
         Returns:
-            Dict with transcribed text
+            Dict with audio bytes, cached WAV path and 'cached' flag, or error
         """
+        stream = self.open_speech_stream(text, voice, audio_format, use_cache=use_cache)
+        if not stream['success']:
+            return stream
         try:
-            with open(audio_file_path, 'rb') as f:
-                audio_data = f.read()
+            audio = b''.join(stream['chunks'])
+        except Exception as e:
+            return {
+                'success': False,
+                'error': True,
+                'message': f'Deepgram TTS Error: {str(e)}'
+            }
+        return {
+            'success': True,
+            'audio': audio,
+            'path': stream['path'],
+            'cached': stream['cached'],
+            'error': False
+        }
+    
+    def text_to_speech_stream(self, sentences: Iterable[str], voice: str = "aura-asteria-en",
+                              lookahead: int = 2, audio_format: str = "wav",
+                              use_cache: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Synthesize sentences as they arrive, a few requests ahead of playback.
+        
+        Sentences are pulled on a background thread (so a slow source such
+        as iter_sentences over an LLM stream never stalls delivery) and up to
+        lookahead of them are synthesized while the caller plays or sends the
+        current one.
+        
+        Args:
+            sentences (Iterable): Text chunks, e.g. speech_pipeline.iter_sentences(deltas)
+            voice (str): Voice model to use
+            lookahead (int): Sentences synthesized ahead of the consumer
+            audio_format (str): 'wav', 'pcm' or 'opus' for each sentence
+            use_cache (bool): Store each sentence in the audio cache (off by
+                default: one-off LLM sentences rarely repeat)
             
-            headers = self.headers.copy()
-            headers["Content-Type"] = "audio/wav"  # Adjust based on audio format
+        Yields:
+            Dict: text_to_speech result plus 'text' and 'index', in input order
+        """
+        lookahead = max(1, lookahead)
+        pending = queue.Queue(maxsize=lookahead)
+        stopped = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=lookahead, thread_name_prefix='deepgram-tts')
+        
+        def submit(item):
+            # Bounded put that gives up once the consumer has gone away
+            while not stopped.is_set():
+                try:
+                    pending.put(item, timeout=0.1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            try:
+                for text in sentences:
+                    if stopped.is_set() or not submit((text, executor.submit(self.text_to_speech, text, voice, use_cache, audio_format))):
+                        break
+            except Exception as e:
+                submit((None, e))
+            finally:
+                submit(None)
+        
+        threading.Thread(target=produce, name='deepgram-tts-feed', daemon=True).start()
+        try:
+            index = 0
+            while True:
+                item = pending.get()
+                if item is None:
+                    return
+                text, future = item
+                if text is None:
+                    raise future
+                result = future.result()
+                result['text'] = text
+                result['index'] = index
+                index += 1
+                yield result
+        finally:
+            stopped.set()
+            # Drop queued synthesis the consumer will never read
+            while True:
+                try:
+                    item = pending.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None and item[0] is not None:
+                    item[1].cancel()
+            executor.shutdown(wait=False)
+    
+    def open_sentence_stream(self, text: str, voice: str = "aura-asteria-en",
+                             audio_format: str = "wav", use_cache: bool = True,
+                             lookahead: int = 2) -> Dict[str, Any]:
+        """
+        Like open_speech_stream, but synthesize multi-sentence text sentence by sentence.
+        
+        The first audio goes out as soon as the first sentence is
+        synthesized instead of after the whole text, and the following
+        sentences are synthesized while it plays. Sentences are fetched as
+        raw PCM and sent as one continuous body (behind a single streaming
+        WAV header for 'wav'). Single sentences, Ogg/Opus output and texts
+        already in the audio cache go through open_speech_stream.
+        
+        Args:
+            text (str): Text to convert
+            voice (str): Voice model to use
+            audio_format (str): 'wav', 'pcm' or 'opus'
+            use_cache (bool): Serve a whole-text WAV from the audio cache
+            lookahead (int): Sentences synthesized ahead of the consumer
             
-            params = {
-                "model": "nova-2",
-                "language": "en"
-            }
+        Returns:
+            Dict with 'chunks' iterator, 'content_type' and 'cached' flag, or error
+        """
+        sentences = list(iter_sentences([text])) if audio_format in ('wav', 'pcm') else []
+        if len(sentences) < 2 or (use_cache and audio_format == 'wav' and self.audio_cache is not None
+                                  and self.audio_cache.get(AudioCache.make_key(text, voice, None, None, 'deepgram'))):
+            return self.open_speech_stream(text, voice, audio_format, use_cache=use_cache)
+        
+        results = self.text_to_speech_stream(sentences, voice, lookahead, audio_format='pcm')
+        first = next(results)
+        if not first['success']:
+            results.close()
+            return first
+        
+        def chunks():
+            try:
+                if audio_format == 'wav':
+                    yield streaming_wav_header()
+                yield first['audio']
+                for result in results:
+                    if not result['success']:
+                        # Headers are already sent; end the audio at the last good sentence
+                        print(f"Warning: Deepgram TTS stopped at sentence {result['index']}: {result['message']}")
+                        break
+                    yield result['audio']
+            finally:
+                results.close()
+        
+        return {
+            'success': True,
+            'chunks': chunks(),
+            'content_type': 'audio/wav' if audio_format == 'wav' else DEEPGRAM_AUDIO_FORMATS['pcm'][1],
+            'path': None,
+            'cached': False,
+            'sentences': len(sentences),
+            'error': False
+        }
+    
+    def transcribe_stream(self, chunks: Iterable[bytes], content_type: str = None,
+                          params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Transcribe audio streamed from any byte-chunk source.
+        
+        The chunks are forwarded to Deepgram as a chunked request body
+        while they are read, so an upload is never held in memory or on
+        disk. The container is detected from the first bytes.
+        
+        Args:
+            chunks (Iterable): Audio bytes, e.g. an upload body or iter_file()
+            content_type (str): Declared type, used when sniffing fails
+            params (dict): Deepgram listen options (default nova-2, en)
+            
+        Returns:
+            Dict with transcript, content type and bytes sent, or error
+        """
+        try:
+            sniffed, chunks = peek_content_type(chunks)
+            content_type = choose_content_type(sniffed, content_type)
+            counter = ByteCounter(chunks)
+            
+            headers = self.headers.copy()
+            headers["Content-Type"] = content_type
             
-            response = requests.post(
+            response = self.session_pool.post(
+                'deepgram',
                 self.stt_url,
                 headers=headers,
-                data=audio_data,
-                params=params,
-                timeout=30
+                data=iter(counter),
+                params=dict(DEEPGRAM_STT_PARAMS, **(params or {}))
             )
             
             if response.status_code == 200:
-                data = response.json()
-                transcript = data.get('results', {}).get('channels', [{}])[0].get('alternatives', [{}])[0].get('transcript', '')
                 return {
                     'success': True,
-                    'transcript': transcript,
+                    'transcript': parse_transcript(response.json()),
+                    'content_type': content_type,
+                    'bytes_sent': counter.bytes,
                     'error': False
                 }
             else:
@@ -125,6 +459,31 @@ class DeepgramProcessor:
                 'message': f'Deepgram STT Error: {str(e)}'
             }
     
+    def speech_to_text(self, audio_file_path: str) -> Dict[str, Any]:
+        """
+        Convert speech to text using Deepgram.
+        
+        WAV files are first downmixed, trimmed and resampled (see
+        audio_preprocess); other formats, and files too large to
+        preprocess in memory, are streamed as recorded.
+        
+        Args:
+            audio_file_path (str): Path to audio file
+            
+        Returns:
+            Dict with transcribed text (and 'preprocess' savings when applied)
+        """
+        prepared = self.preprocessor.process_file(audio_file_path) if self.preprocessor else None
+        if not prepared or not prepared['success']:
+            return self.transcribe_stream(iter_file(audio_file_path))
+        
+        start = time.perf_counter()
+        result = self.transcribe_stream([prepared['data']], content_type=prepared['content_type'])
+        if result['success']:
+            self.preprocessor.record_upload(result['bytes_sent'], (time.perf_counter() - start) * 1000)
+            result['preprocess'] = {k: v for k, v in prepared.items() if k not in ('data', 'success', 'error')}
+        return result
+    
     def get_available_voices(self) -> list:
         """Get list of available Deepgram voices."""
         return [
@@ -3,22 +3,41 @@ Free API-based NLP processor for AI Personal Assistant.
 Uses free APIs like Hugging Face, Groq, or Together AI.
 """
 import os
-import requests
-from typing import Dict, Any
+from http_pool import HTTPSessionPool, get_session_pool
+from circuit_breaker import get_circuit_breaker
+from response_cache import ResponseCache, get_response_cache
+from single_flight import SingleFlight
+from batch_processing import iter_ordered
+from stream_utils import iter_sse_deltas
+from context_builder import format_context_prompt
+from typing import Dict, Any, Iterable, Iterator, List
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a helpful AI personal assistant. Be concise, friendly, and helpful. "
+    "Answer questions accurately and perform the requested tasks."
+)
 
 class FreeAPIProcessor:
     """Handles NLP using free APIs."""
     
-    def __init__(self, api_key: str = None, api_provider: str = "groq"):
+    def __init__(self, api_key: str = None, api_provider: str = "groq",
+                 session_pool: HTTPSessionPool = None, response_cache: ResponseCache = None):
         """
         Initialize free API processor.
         
         Args:
             api_key (str): API key for the chosen provider
             api_provider (str): API provider (groq, huggingface, together)
+            session_pool (HTTPSessionPool): Shared keep-alive transport (optional)
+            response_cache (ResponseCache): Cache for repeated prompts (optional)
         """
         self.api_key = api_key or os.getenv('FREE_API_KEY', '')
         self.api_provider = api_provider or os.getenv('API_PROVIDER', 'groq')
+        self.session_pool = session_pool or get_session_pool()
+        self.response_cache = response_cache or get_response_cache()
+        self.single_flight = SingleFlight()
+        self.temperature = 0.7
+        self.max_tokens = 1024
         
         if not self.api_key:
             raise ValueError("API_KEY not provided. Please set FREE_API_KEY environment variable.")
@@ -36,6 +55,7 @@ class FreeAPIProcessor:
             }
         elif self.api_provider == "huggingface":
             self.api_url = "https://api-inference.huggingface.co/models/mistralai/Mistral-7B-Instruct-v0.1"
+            self.model = "mistralai/Mistral-7B-Instruct-v0.1"
             self.headers = {
                 "Authorization": f"Bearer {self.api_key}",
                 "Content-Type": "application/json"
@@ -50,37 +70,50 @@ class FreeAPIProcessor:
         else:
             raise ValueError(f"Unknown API provider: {self.api_provider}")
     
-    def process(self, user_input: str, system_prompt: str = None) -> Dict[str, Any]:
+    def process(self, user_input: str, system_prompt: str = None, use_cache: bool = True,
+                context: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """
         Process user input using free API and return response.
         
         Args:
             user_input (str): User's input text
             system_prompt (str): System prompt for context (optional)
+            use_cache (bool): Serve and store repeated prompts from the response cache
+            context (list): Earlier conversation messages to send (optional)
             
         Returns:
             Dict with response, tokens, and metadata
         """
         try:
             if not system_prompt:
-                system_prompt = (
-                    "You are a helpful AI personal assistant. Be concise, friendly, and helpful. "
-                    "Answer questions accurately and perform the requested tasks."
-                )
+                system_prompt = DEFAULT_SYSTEM_PROMPT
             
-            # Prepare the request based on provider
-            if self.api_provider == "groq":
-                response = self._call_groq(user_input, system_prompt)
-            elif self.api_provider == "huggingface":
-                response = self._call_huggingface(user_input, system_prompt)
-            elif self.api_provider == "together":
-                response = self._call_together(user_input, system_prompt)
+            cache_key = self.cache_key(user_input, system_prompt, context)
+            coalesce = use_cache  # A caller opting out of the cache also opts out of shared responses
+            use_cache = use_cache and self.response_cache is not None
+            if use_cache:
+                cached = self.response_cache.get(cache_key)
+                if cached is not None:
+                    cached['cached'] = True
+                    return cached
+            
+            if get_circuit_breaker(self.api_provider).is_open():
+                return self._circuit_open_response()
+            
+            # Identical concurrent requests share one upstream call
+            if coalesce:
+                response, shared = self.single_flight.do(
+                    cache_key,
+                    lambda: self._dispatch(user_input, system_prompt, context)
+                )
             else:
-                return {
-                    'response': 'Unknown API provider',
-                    'error': True,
-                    'tokens': 0
-                }
+                response, shared = self._dispatch(user_input, system_prompt, context), False
+            response = dict(response)
+            
+            if shared:
+                response['coalesced'] = True
+            elif use_cache and not response.get('error'):
+                self.response_cache.set(cache_key, response)
             
             return response
             
@@ -91,24 +124,220 @@ class FreeAPIProcessor:
                 'tokens': 0
             }
     
-    def _call_groq(self, user_input: str, system_prompt: str) -> Dict[str, Any]:
-        """Call Groq API (free tier available)."""
+    def _circuit_open_response(self) -> Dict[str, Any]:
+        """Fail-fast response used while the provider's circuit breaker is open."""
+        retry_in = get_circuit_breaker(self.api_provider).retry_in()
+        return {
+            'response': (
+                f'The {self.api_provider} service is temporarily unavailable. '
+                f'Please try again in {max(1, round(retry_in))} seconds.'
+            ),
+            'error': True,
+            'tokens': 0,
+            'circuit_open': True
+        }
+    
+    def _dispatch(self, user_input: str, system_prompt: str,
+                  context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Send the request to the configured provider."""
+        if self.api_provider == "groq":
+            return self._call_groq(user_input, system_prompt, context)
+        elif self.api_provider == "huggingface":
+            return self._call_huggingface(user_input, system_prompt, context)
+        elif self.api_provider == "together":
+            return self._call_together(user_input, system_prompt, context)
+        return {
+            'response': 'Unknown API provider',
+            'error': True,
+            'tokens': 0
+        }
+    
+    def iter_many(self, inputs: Iterable[str], max_concurrency: int = 4, system_prompt: str = None,
+                  use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Process many inputs concurrently, yielding results in input order.
+        
+        Calls go through the shared transport, so provider rate limits
+        still apply; a bounded window keeps memory flat for large batches.
+        
+        Args:
+            inputs (Iterable[str]): User inputs (may be a generator)
+            max_concurrency (int): Max requests in flight
+            system_prompt (str): System prompt for context (optional)
+            use_cache (bool): Serve and store repeated prompts from the response cache
+
+        Yields:
+            Dict with 'index', 'input' and the usual response fields
+        """
+        def run(user_input):
+            return user_input, self.process(user_input, system_prompt, use_cache=use_cache)
+        
+        for index, (user_input, result) in iter_ordered(run, inputs, max_concurrency):
+            yield dict(result, index=index, input=user_input)
+    
+    def process_many(self, inputs: Iterable[str], max_concurrency: int = 4, system_prompt: str = None,
+                     use_cache: bool = True) -> List[Dict[str, Any]]:
+        """
+        Process many inputs concurrently and return results in input order.
+        
+        Args:
+            inputs (Iterable[str]): User inputs
+            max_concurrency (int): Max requests in flight
+            system_prompt (str): System prompt for context (optional)
+            use_cache (bool): Serve and store repeated prompts from the response cache
+            
+        Returns:
+            List of response dicts, one per input
+        """
+        return list(self.iter_many(inputs, max_concurrency, system_prompt, use_cache))
+    
+    def cache_key(self, user_input: str, system_prompt: str = None,
+                  context: List[Dict[str, str]] = None) -> str:
+        """
+        Get the response-cache key for a request.
+        
+        Args:
+            user_input (str): User's input text
+            system_prompt (str): System prompt for context (optional)
+            context (list): Earlier conversation messages (optional)
+            
+        Returns:
+            str: Key covering provider, model, prompt, context and sampling settings
+        """
+        return ResponseCache.make_key(
+            self.api_provider,
+            self.model,
+            system_prompt or DEFAULT_SYSTEM_PROMPT,
+            user_input,
+            self.temperature,
+            self.max_tokens,
+            context
+        )
+    
+    def process_stream(self, user_input: str, system_prompt: str = None, use_cache: bool = True,
+                       context: List[Dict[str, str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Process user input and stream the response as it is generated.
+        
+        Groq and Together are called with stream: true and their SSE deltas
+        are yielded as they arrive. Hugging Face has no streaming endpoint
+        here, so its full response is yielded as a single delta.
+        
+        Args:
+            user_input (str): User's input text
+            system_prompt (str): System prompt for context (optional)
+            use_cache (bool): Serve and store repeated prompts from the response cache
+            context (list): Earlier conversation messages to send (optional)
+            
+        Yields:
+            Dict with a text 'delta', then a final dict with 'done': True,
+            the full 'response', 'error' and 'tokens'
+        """
+        if not system_prompt:
+            system_prompt = DEFAULT_SYSTEM_PROMPT
+        
+        if self.api_provider not in ("groq", "together"):
+            # No token stream: process() handles the cache, coalescing and breaker
+            result = self.process(user_input, system_prompt, use_cache=use_cache, context=context)
+            if not result.get('error'):
+                yield {'delta': result['response']}
+            yield dict(result, done=True)
+            return
+        
+        cache_key = None
+        if use_cache and self.response_cache is not None:
+            cache_key = self.cache_key(user_input, system_prompt, context)
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield {'delta': cached['response']}
+                yield dict(cached, done=True, cached=True)
+                return
+        
+        if get_circuit_breaker(self.api_provider).is_open():
+            yield dict(self._circuit_open_response(), done=True)
+            return
+        
+        parts = []
         try:
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 1024
-            }
+            payload = self._chat_payload(user_input, system_prompt, stream=True, context=context)
             
-            response = requests.post(
+            response = self.session_pool.post(
+                self.api_provider,
                 self.api_url,
                 headers=self.headers,
                 json=payload,
-                timeout=30
+                stream=True
+            )
+            
+            with response:
+                if response.status_code != 200:
+                    yield {
+                        'done': True,
+                        'response': f'API Error: {response.status_code}',
+                        'error': True,
+                        'tokens': 0
+                    }
+                    return
+                
+                for delta in iter_sse_deltas(response.iter_lines()):
+                    parts.append(delta)
+                    yield {'delta': delta}
+            
+            text = ''.join(parts)
+            result = {
+                'response': text,
+                'error': False,
+                'tokens': len(text.split())
+            }
+            if cache_key is not None:
+                self.response_cache.set(cache_key, result)
+            yield dict(result, done=True)
+        except Exception as e:
+            yield {
+                'done': True,
+                'response': ''.join(parts) or f'Streaming Error: {str(e)}',
+                'error': True,
+                'tokens': 0
+            }
+    
+    def _chat_payload(self, user_input: str, system_prompt: str, stream: bool = False,
+                      context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Build an OpenAI-compatible chat payload (Groq, Together)."""
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                *(context or []),
+                {"role": "user", "content": user_input}
+            ],
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+    
+    def _huggingface_payload(self, user_input: str, system_prompt: str,
+                             context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Build a Hugging Face text-generation payload."""
+        if context:
+            system_prompt = f"{system_prompt}\n\n{format_context_prompt(context)}"
+        return {
+            "inputs": f"{system_prompt}\n\nUser: {user_input}\n\nAssistant:",
+            "parameters": {"max_new_tokens": 512}
+        }
+    
+    def _call_groq(self, user_input: str, system_prompt: str,
+                   context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Call Groq API (free tier available)."""
+        try:
+            payload = self._chat_payload(user_input, system_prompt, context=context)
+            
+            response = self.session_pool.post(
+                self.api_provider,
+                self.api_url,
+                headers=self.headers,
+                json=payload
             )
             
             if response.status_code == 200:
@@ -131,19 +360,17 @@ class FreeAPIProcessor:
                 'tokens': 0
             }
     
-    def _call_huggingface(self, user_input: str, system_prompt: str) -> Dict[str, Any]:
+    def _call_huggingface(self, user_input: str, system_prompt: str,
+                          context: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """Call Hugging Face Inference API (free tier available)."""
         try:
-            payload = {
-                "inputs": f"{system_prompt}\n\nUser: {user_input}\n\nAssistant:",
-                "parameters": {"max_new_tokens": 512}
-            }
+            payload = self._huggingface_payload(user_input, system_prompt, context)
             
-            response = requests.post(
+            response = self.session_pool.post(
+                self.api_provider,
                 self.api_url,
                 headers=self.headers,
-                json=payload,
-                timeout=30
+                json=payload
             )
             
             if response.status_code == 200:
@@ -174,24 +401,17 @@ class FreeAPIProcessor:
                 'tokens': 0
             }
     
-    def _call_together(self, user_input: str, system_prompt: str) -> Dict[str, Any]:
+    def _call_together(self, user_input: str, system_prompt: str,
+                       context: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """Call Together AI API (free tier available)."""
         try:
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 1024
-            }
+            payload = self._chat_payload(user_input, system_prompt, context=context)
             
-            response = requests.post(
+            response = self.session_pool.post(
+                self.api_provider,
                 self.api_url,
                 headers=self.headers,
-                json=payload,
-                timeout=30
+                json=payload
             )
             
             if response.status_code == 200:
@@ -214,6 +434,18 @@ class FreeAPIProcessor:
                 'tokens': 0
             }
     
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get processor counters for health reporting.
+        
+        Returns:
+            dict: Request coalescing and circuit breaker stats
+        """
+        return {
+            'coalescing': self.single_flight.get_stats(),
+            'circuit_breaker': get_circuit_breaker(self.api_provider).snapshot()
+        }
+    
     def get_available_models(self) -> list:
         """Get list of available models for the provider."""
         if self.api_provider == "groq":
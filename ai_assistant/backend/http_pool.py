@@ -0,0 +1,426 @@
+"""
+Shared HTTP transport for provider API clients.
+Keeps one keep-alive requests.Session per provider so repeated calls reuse
+pooled TCP/TLS connections instead of handshaking on every request.
+Requests are paced by the provider's rate limiter, retried with backoff and
+short-circuited while the provider's circuit breaker is open.
+"""
+import os
+import time
+import asyncio
+import threading
+import requests
+from contextlib import asynccontextmanager
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any
+
+from rate_limiter import RetryPolicy, RateLimitedError, get_rate_limiter, estimate_request_tokens
+from circuit_breaker import get_circuit_breaker
+
+# httpx is only needed for the asyncio processors and ASGI app
+try:
+    import httpx
+    HTTPX_AVAILABLE = True
+except ImportError:
+    httpx = None
+    HTTPX_AVAILABLE = False
+
+
+class HTTPSessionPool:
+    """Holds a pooled requests.Session for each API provider."""
+
+    def __init__(self, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None):
+        """
+        Initialize the session pool.
+
+        Args:
+            pool_size (int): Max keep-alive connections per host
+            connect_timeout (float): Seconds to wait for the TCP/TLS connect
+            read_timeout (float): Seconds to wait for the response
+        """
+        self.pool_size = pool_size or int(os.getenv('HTTP_POOL_SIZE', '10'))
+        self.connect_timeout = connect_timeout or float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+        self.read_timeout = read_timeout or float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+        self.sessions = {}
+        self.retry_policy = RetryPolicy()
+        self._lock = threading.Lock()
+
+    def get_session(self, provider: str) -> requests.Session:
+        """
+        Get (or lazily create) the keep-alive session for a provider.
+
+        Args:
+            provider (str): Provider name (groq, together, deepgram, ...)
+
+        Returns:
+            requests.Session: Session with a pooled HTTPAdapter mounted
+        """
+        session = self.sessions.get(provider)
+        if session is not None:
+            return session
+
+        with self._lock:
+            session = self.sessions.get(provider)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_size,
+                    pool_maxsize=self.pool_size
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers['Connection'] = 'keep-alive'
+                self.sessions[provider] = session
+            return session
+
+    @property
+    def timeout(self) -> tuple:
+        """(connect, read) timeout tuple passed to requests."""
+        return (self.connect_timeout, self.read_timeout)
+
+    def post(self, provider: str, url: str, **kwargs) -> requests.Response:
+        """
+        POST through the provider's pooled session.
+
+        The request waits for the provider's rate limiter before it is
+        sent. 429/5xx responses and connection failures are retried with
+        backoff; a 429 also holds back other requests to that provider.
+        The final outcome feeds the provider's circuit breaker.
+
+        Args:
+            provider (str): Provider name used to pick the session
+            url (str): Request URL
+            **kwargs: Passed through to requests.Session.post
+
+        Returns:
+            requests.Response: The HTTP response
+
+        Raises:
+            CircuitOpenError: If the provider's breaker is open
+            RateLimitedError: If the rate limiter would queue the request
+                longer than its max_wait
+        """
+        breaker = get_circuit_breaker(provider)
+        breaker.check()
+        try:
+            response = self._post_with_retry(provider, url, **kwargs)
+        except RateLimitedError:
+            # Not sent: the provider's health is unknown
+            breaker.release_probe()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Interrupted: free the probe slot without counting an outcome
+            breaker.release_probe()
+            raise
+
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    def _post_with_retry(self, provider: str, url: str, **kwargs) -> requests.Response:
+        """Rate-limited POST with retries (see post)."""
+        kwargs.setdefault('timeout', self.timeout)
+        session = self.get_session(provider)
+        limiter = get_rate_limiter(provider)
+        tokens = estimate_request_tokens(kwargs.get('json'))
+        # A streamed (generator) body can only be sent once
+        can_retry = isinstance(kwargs.get('data'), (type(None), bytes, str, dict))
+
+        attempt = 0
+        while True:
+            wait = limiter.reserve(tokens)
+            if wait:
+                time.sleep(wait)
+
+            try:
+                response = session.post(url, **kwargs)
+            except requests.ConnectionError:
+                if not can_retry or attempt >= self.retry_policy.max_retries:
+                    raise
+                limiter.retries += 1
+                time.sleep(self.retry_policy.delay(attempt))
+                attempt += 1
+                continue
+
+            limiter.update_from_headers(response.headers)
+            if not can_retry or not self.retry_policy.should_retry(response.status_code, attempt):
+                return response
+
+            delay = self.retry_policy.delay(attempt, response.headers.get('Retry-After'))
+            limiter.retries += 1
+            response.close()
+            if response.status_code == 429:
+                # The limiter makes the next reservation wait out the delay
+                limiter.pause(delay)
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get connection reuse counters per provider.
+
+        A hit is a request served over an already-open connection,
+        a miss is a request that had to open a new one.
+
+        Returns:
+            dict: Pool settings and per-provider hit/miss counts
+        """
+        providers = {}
+        for provider, session in list(self.sessions.items()):
+            requests_made = 0
+            connections = 0
+            adapter = session.get_adapter('https://')
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                requests_made += pool.num_requests
+                connections += pool.num_connections
+            providers[provider] = {
+                'requests': requests_made,
+                'hits': max(0, requests_made - connections),
+                'misses': connections
+            }
+
+        return {
+            'pool_size': self.pool_size,
+            'connect_timeout': self.connect_timeout,
+            'read_timeout': self.read_timeout,
+            'providers': providers
+        }
+
+    def close(self):
+        """Close all sessions and their pooled connections."""
+        with self._lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_session_pool() -> HTTPSessionPool:
+    """Get the process-wide session pool shared by all processors."""
+    global _shared_pool
+    if _shared_pool is None:
+        with _shared_pool_lock:
+            if _shared_pool is None:
+                _shared_pool = HTTPSessionPool()
+    return _shared_pool
+
+
+class AsyncHTTPClientPool:
+    """Holds a pooled httpx.AsyncClient for each API provider."""
+
+    def __init__(self, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None):
+        """
+        Initialize the async client pool.
+
+        Args:
+            pool_size (int): Max concurrent connections per provider
+            connect_timeout (float): Seconds to wait for the TCP/TLS connect
+            read_timeout (float): Seconds to wait for the response
+        """
+        if not HTTPX_AVAILABLE:
+            raise ImportError("httpx is required for async processing. Install it with: pip install httpx")
+
+        self.pool_size = pool_size or int(os.getenv('ASYNC_HTTP_POOL_SIZE', '100'))
+        self.connect_timeout = connect_timeout or float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+        self.read_timeout = read_timeout or float(os.getenv('HTTP_READ_TIMEOUT', '30'))
+        self.clients = {}
+        self.retry_policy = RetryPolicy()
+
+    def get_client(self, provider: str) -> "httpx.AsyncClient":
+        """
+        Get (or lazily create) the keep-alive client for a provider.
+
+        Clients are bound to the event loop they were created in, so a new
+        one is made when called from a different loop.
+
+        Args:
+            provider (str): Provider name (groq, together, deepgram, ...)
+
+        Returns:
+            httpx.AsyncClient: Client with pooled connection limits
+        """
+        loop = asyncio.get_running_loop()
+        client_loop, client = self.clients.get(provider, (None, None))
+        if client is None or client.is_closed or client_loop is not loop:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.pool_size,
+                    max_keepalive_connections=self.pool_size
+                ),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+            )
+            self.clients[provider] = (loop, client)
+        return client
+
+    async def post(self, provider: str, url: str, **kwargs) -> "httpx.Response":
+        """
+        POST through the provider's pooled async client.
+
+        Rate limiting, retries and the circuit breaker work as in
+        HTTPSessionPool.post, but waits are asyncio sleeps so the event
+        loop keeps running.
+
+        Args:
+            provider (str): Provider name used to pick the client
+            url (str): Request URL
+            **kwargs: Passed through to httpx.AsyncClient.post
+
+        Returns:
+            httpx.Response: The HTTP response
+
+        Raises:
+            CircuitOpenError: If the provider's breaker is open
+            RateLimitedError: If the rate limiter would queue the request
+                longer than its max_wait
+        """
+        breaker = get_circuit_breaker(provider)
+        breaker.check()
+        try:
+            response = await self._post_with_retry(provider, url, **kwargs)
+        except RateLimitedError:
+            # Not sent: the provider's health is unknown
+            breaker.release_probe()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (e.g. a losing hedge): free the probe slot without counting an outcome
+            breaker.release_probe()
+            raise
+
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        return response
+
+    async def _post_with_retry(self, provider: str, url: str, **kwargs) -> "httpx.Response":
+        """Rate-limited POST with retries (see post)."""
+        client = self.get_client(provider)
+        limiter = get_rate_limiter(provider)
+        tokens = estimate_request_tokens(kwargs.get('json'))
+        can_retry = isinstance(kwargs.get('content'), (type(None), bytes, str))
+
+        attempt = 0
+        while True:
+            wait = limiter.reserve(tokens)
+            if wait:
+                await asyncio.sleep(wait)
+
+            try:
+                response = await client.post(url, **kwargs)
+            except httpx.ConnectError:
+                if not can_retry or attempt >= self.retry_policy.max_retries:
+                    raise
+                limiter.retries += 1
+                await asyncio.sleep(self.retry_policy.delay(attempt))
+                attempt += 1
+                continue
+
+            limiter.update_from_headers(response.headers)
+            if not can_retry or not self.retry_policy.should_retry(response.status_code, attempt):
+                return response
+
+            delay = self.retry_policy.delay(attempt, response.headers.get('Retry-After'))
+            limiter.retries += 1
+            if response.status_code == 429:
+                limiter.pause(delay)
+            else:
+                await asyncio.sleep(delay)
+            attempt += 1
+
+    @asynccontextmanager
+    async def stream(self, provider: str, method: str, url: str, **kwargs):
+        """
+        Open a streamed request through the provider's client.
+
+        Retryable statuses are retried before the body is handed over.
+
+        Args:
+            provider (str): Provider name used to pick the client
+            method (str): HTTP method
+            url (str): Request URL
+            **kwargs: Passed through to httpx.AsyncClient.stream
+
+        Yields:
+            httpx.Response: Response with an unread body
+
+        Raises:
+            CircuitOpenError: If the provider's breaker is open
+            RateLimitedError: If the rate limiter would queue the request
+                longer than its max_wait
+        """
+        client = self.get_client(provider)
+        limiter = get_rate_limiter(provider)
+        breaker = get_circuit_breaker(provider)
+        tokens = estimate_request_tokens(kwargs.get('json'))
+        breaker.check()
+
+        attempt = 0
+        recorded = False
+        try:
+            while True:
+                wait = limiter.reserve(tokens)
+                if wait:
+                    await asyncio.sleep(wait)
+
+                try:
+                    async with client.stream(method, url, **kwargs) as response:
+                        limiter.update_from_headers(response.headers)
+                        if not self.retry_policy.should_retry(response.status_code, attempt):
+                            if response.status_code >= 500:
+                                breaker.record_failure()
+                            else:
+                                breaker.record_success()
+                            recorded = True
+                            yield response
+                            return
+                        delay = self.retry_policy.delay(attempt, response.headers.get('Retry-After'))
+                except httpx.TransportError:
+                    breaker.record_failure()
+                    recorded = True
+                    raise
+
+                limiter.retries += 1
+                if response.status_code == 429:
+                    limiter.pause(delay)
+                else:
+                    await asyncio.sleep(delay)
+                attempt += 1
+        finally:
+            if not recorded:
+                # Cancelled before a response was handed over: free the probe slot
+                breaker.release_probe()
+
+    async def aclose(self):
+        """Close all clients and their pooled connections."""
+        loop = asyncio.get_running_loop()
+        for client_loop, client in self.clients.values():
+            if client_loop is loop:
+                await client.aclose()
+        self.clients = {}
+
+
+_shared_async_pool = None
+
+
+def get_async_client_pool() -> AsyncHTTPClientPool:
+    """Get the process-wide async client pool shared by async processors."""
+    global _shared_async_pool
+    if _shared_async_pool is None:
+        _shared_async_pool = AsyncHTTPClientPool()
+    return _shared_async_pool
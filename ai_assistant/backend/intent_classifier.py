@@ -0,0 +1,267 @@
+"""
+NumPy intent classifier for NLPProcessor.
+Character n-grams are hashed into a fixed-size TF-IDF space and scored by
+a temperature-calibrated softmax regression trained from an examples file,
+so a whole batch of utterances is classified with one sparse x dense product.
+"""
+import os
+import json
+import zlib
+from collections import Counter
+from typing import Dict, Any, List, Tuple
+
+from keyword_matcher import tokenize
+
+# NumPy is optional; without it NLPProcessor stays in keyword-only mode
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+DEFAULT_EXAMPLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'intent_examples.json')
+
+
+def char_ngrams(text: str, ngram_range: Tuple[int, int] = (2, 4)) -> List[str]:
+    """
+    Get the character n-grams of normalized text.
+
+    Words are padded with spaces so n-grams at word edges are distinct
+    from those inside words.
+
+    Args:
+        text (str): Input text
+        ngram_range (tuple): Smallest and largest n
+
+    Returns:
+        list: N-gram strings
+    """
+    padded = ' ' + ' '.join(tokenize(text)) + ' '
+    low, high = ngram_range
+    return [padded[i:i + n] for n in range(low, high + 1) for i in range(len(padded) - n + 1)]
+
+
+class HashedTfidfVectorizer:
+    """Hashed character n-gram TF-IDF features in CSR form."""
+
+    def __init__(self, n_features: int = 4096, ngram_range: Tuple[int, int] = (2, 4)):
+        """
+        Initialize the vectorizer.
+
+        Args:
+            n_features (int): Hash buckets (feature columns)
+            ngram_range (tuple): Smallest and largest character n-gram
+        """
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.idf = np.ones(n_features, dtype=np.float32)
+
+    def _bucket_counts(self, text: str) -> Counter:
+        # crc32 is stable across processes, unlike hash()
+        return Counter(zlib.crc32(gram.encode('utf-8')) % self.n_features
+                       for gram in char_ngrams(text, self.ngram_range))
+
+    def fit(self, texts: List[str]) -> "HashedTfidfVectorizer":
+        """Learn smoothed inverse document frequencies from training texts."""
+        df = np.zeros(self.n_features, dtype=np.float32)
+        for text in texts:
+            df[list(self._bucket_counts(text))] += 1
+        self.idf = (np.log((1 + len(texts)) / (1 + df)) + 1).astype(np.float32)
+        return self
+
+    def transform(self, texts: List[str]) -> Tuple[Any, Any, Any]:
+        """
+        Vectorize texts into L2-normalized sublinear TF-IDF rows.
+
+        Args:
+            texts (list): Texts to vectorize
+
+        Returns:
+            tuple: CSR arrays (data, indices, indptr)
+        """
+        data, indices, indptr = [], [], [0]
+        for text in texts:
+            counts = self._bucket_counts(text)
+            indices.extend(counts)
+            data.extend(counts.values())
+            indptr.append(len(indices))
+
+        data = np.asarray(data, dtype=np.float32)
+        indices = np.asarray(indices, dtype=np.int64)
+        indptr = np.asarray(indptr, dtype=np.int64)
+
+        if len(data):
+            data = (1 + np.log(data)) * self.idf[indices]
+            row_ids = np.repeat(np.arange(len(texts)), np.diff(indptr))
+            norms = np.sqrt(np.bincount(row_ids, weights=data * data, minlength=len(texts)))
+            data = data / norms[row_ids]
+        return data, indices, indptr
+
+    def transform_dense(self, texts: List[str]):
+        """Vectorize texts into a dense (len(texts), n_features) matrix."""
+        data, indices, indptr = self.transform(texts)
+        dense = np.zeros((len(texts), self.n_features), dtype=np.float32)
+        row_ids = np.repeat(np.arange(len(texts)), np.diff(indptr))
+        dense[row_ids, indices] = data
+        return dense
+
+
+def _sparse_dot(data, indices, indptr, weights):
+    """Multiply CSR rows by a dense (n_features, k) matrix."""
+    rows = len(indptr) - 1
+    out = np.zeros((rows, weights.shape[1]), dtype=np.float32)
+    lengths = np.diff(indptr)
+    nonempty = lengths > 0
+    if nonempty.any():
+        contributions = data[:, None] * weights[indices]
+        out[nonempty] = np.add.reduceat(contributions, indptr[:-1][nonempty], axis=0)
+    return out
+
+
+def _softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class IntentClassifier:
+    """Softmax regression over hashed n-gram TF-IDF features."""
+
+    def __init__(self, n_features: int = 4096, l2: float = 1e-4, epochs: int = 300,
+                 learning_rate: float = 2.0):
+        """
+        Initialize an untrained classifier.
+
+        Args:
+            n_features (int): Hash buckets for the vectorizer
+            l2 (float): Weight decay
+            epochs (int): Full-batch gradient steps
+            learning_rate (float): Gradient step size
+        """
+        if not NUMPY_AVAILABLE:
+            raise ImportError("numpy is required for IntentClassifier")
+        self.vectorizer = HashedTfidfVectorizer(n_features)
+        self.l2 = l2
+        self.epochs = epochs
+        self.learning_rate = learning_rate
+        self.labels = []
+        self.weights = None
+        self.bias = None
+        self.temperature = 1.0
+
+    @classmethod
+    def from_examples_file(cls, path: str = None, **kwargs) -> "IntentClassifier":
+        """
+        Train a classifier from a JSON file of {intent: [example, ...]}.
+
+        Args:
+            path (str): Examples file (defaults to INTENT_EXAMPLES_PATH or
+                the bundled intent_examples.json)
+
+        Returns:
+            IntentClassifier: Trained classifier
+        """
+        path = path or os.getenv('INTENT_EXAMPLES_PATH') or DEFAULT_EXAMPLES_PATH
+        with open(path, 'r', encoding='utf-8') as f:
+            examples = json.load(f)
+        return cls(**kwargs).fit(examples)
+
+    def _train(self, features, targets):
+        n_examples = features.shape[0]
+        weights = np.zeros((features.shape[1], len(self.labels)), dtype=np.float32)
+        bias = np.zeros(len(self.labels), dtype=np.float32)
+        onehot = np.eye(len(self.labels), dtype=np.float32)[targets]
+
+        for _ in range(self.epochs):
+            probs = _softmax(features @ weights + bias)
+            error = (probs - onehot) / n_examples
+            weights -= self.learning_rate * (features.T @ error + self.l2 * weights)
+            bias -= self.learning_rate * error.sum(axis=0)
+        return weights, bias
+
+    def fit(self, examples: Dict[str, List[str]]) -> "IntentClassifier":
+        """
+        Train on labelled examples.
+
+        Every fifth example of each intent is held out to fit a softmax
+        temperature (so probabilities are calibrated rather than
+        overconfident), then the model is retrained on everything.
+
+        Args:
+            examples (dict): Intent -> example utterances
+
+        Returns:
+            IntentClassifier: self
+        """
+        self.labels = list(examples)
+        texts, targets, held_out = [], [], []
+        for label_index, label in enumerate(self.labels):
+            for i, text in enumerate(examples[label]):
+                texts.append(text)
+                targets.append(label_index)
+                held_out.append(i % 5 == 4)
+        if len(self.labels) < 2:
+            raise ValueError("IntentClassifier needs examples for at least two intents")
+
+        targets = np.asarray(targets)
+        held_out = np.asarray(held_out)
+
+        self.vectorizer.fit([t for t, h in zip(texts, held_out) if not h])
+        features = self.vectorizer.transform_dense(texts)
+        weights, bias = self._train(features[~held_out], targets[~held_out])
+
+        if held_out.any():
+            logits = features[held_out] @ weights + bias
+            best_nll = None
+            for temperature in np.geomspace(0.25, 4.0, 25):
+                probs = _softmax(logits / temperature)
+                nll = -np.log(probs[np.arange(len(probs)), targets[held_out]] + 1e-9).mean()
+                if best_nll is None or nll < best_nll:
+                    best_nll, self.temperature = nll, float(temperature)
+
+        self.vectorizer.fit(texts)
+        features = self.vectorizer.transform_dense(texts)
+        self.weights, self.bias = self._train(features, targets)
+        return self
+
+    def predict_proba(self, texts: List[str]):
+        """
+        Score a batch of texts in one sparse x dense product.
+
+        Args:
+            texts (list): Utterances
+
+        Returns:
+            np.ndarray: (len(texts), len(labels)) calibrated probabilities
+        """
+        data, indices, indptr = self.vectorizer.transform(texts)
+        logits = _sparse_dot(data, indices, indptr, self.weights) + self.bias
+        return _softmax(logits / self.temperature)
+
+    def classify_batch(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Classify many utterances at once.
+
+        Args:
+            texts (list): Utterances
+
+        Returns:
+            list: One dict per text with 'intent', 'confidence' and
+                per-intent 'probabilities'
+        """
+        probs = self.predict_proba(texts)
+        best = probs.argmax(axis=1)
+        return [
+            {
+                'intent': self.labels[best[i]],
+                'confidence': round(float(probs[i, best[i]]), 3),
+                'text': text,
+                'probabilities': {label: round(float(p), 3) for label, p in zip(self.labels, probs[i])}
+            }
+            for i, text in enumerate(texts)
+        ]
+
+    def classify(self, text: str) -> Dict[str, Any]:
+        """Classify a single utterance (see classify_batch)."""
+        return self.classify_batch([text])[0]
@@ -0,0 +1,112 @@
+"""
+Multi-pattern keyword matching for intent recognition.
+An Aho-Corasick automaton over word tokens finds every keyword phrase in
+one left-to-right scan, so matching respects word boundaries and costs
+O(words in text + hits) however large the keyword tables grow.
+"""
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens (keeping contractions like what's)."""
+    return _WORD.findall(text.lower())
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton mapping keyword phrases to labels."""
+
+    def __init__(self, keywords: Dict[str, Iterable[str]] = None):
+        """
+        Build the automaton.
+
+        Args:
+            keywords (dict): Label (e.g. intent) -> keyword phrases
+        """
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # state -> [(label, phrase length in words)]
+        self.patterns = 0
+        for label, phrases in (keywords or {}).items():
+            for phrase in phrases:
+                self._insert(label, phrase)
+        self._build_failure_links()
+
+    def _insert(self, label: str, phrase: str):
+        words = tokenize(phrase)
+        if not words:
+            return
+        state = 0
+        for word in words:
+            next_state = self._goto[state].get(word)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][word] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        if (label, len(words)) not in self._out[state]:
+            self._out[state].append((label, len(words)))
+            self.patterns += 1
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and word not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(word, 0)
+                # Inherit matches that end at the fallback state (suffix phrases)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """
+        Find every keyword occurrence in one scan.
+
+        Args:
+            text (str): Text to search
+
+        Returns:
+            list: (start_word, end_word, label) for each hit, in scan order
+        """
+        hits = []
+        state = 0
+        for index, word in enumerate(tokenize(text)):
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+            for label, length in self._out[state]:
+                hits.append((index - length + 1, index + 1, label))
+        return hits
+
+    def score(self, text: str) -> Dict[str, float]:
+        """
+        Score labels by the specificity of their hits.
+
+        A hit counts its length in words, so longer phrases outweigh
+        generic ones; a hit nested inside a longer hit (e.g. 'what is'
+        inside 'what is the time') is discarded.
+
+        Args:
+            text (str): Text to score
+
+        Returns:
+            dict: Label -> score, only for labels with hits
+        """
+        hits = sorted(self.find_all(text), key=lambda hit: (hit[0] - hit[1], hit[0]))
+        kept = []
+        scores = {}
+        for start, end, label in hits:
+            if any(k_start <= start and end <= k_end and (k_start, k_end) != (start, end)
+                   for k_start, k_end in kept):
+                continue
+            kept.append((start, end))
+            scores[label] = scores.get(label, 0) + (end - start)
+        return scores
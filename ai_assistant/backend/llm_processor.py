@@ -3,22 +3,32 @@ Multi-provider LLM processor supporting multiple free APIs.
 Supports: Groq, HuggingFace, Together AI, Deepgram, and more.
 """
 import os
-import requests
-from typing import Dict, Any
+from http_pool import HTTPSessionPool, get_session_pool
+from circuit_breaker import get_circuit_breaker
+from context_builder import format_context_prompt
+from typing import Dict, Any, List
+
+DEFAULT_SYSTEM_PROMPT = (
+    "You are a helpful AI personal assistant. Be concise, friendly, and helpful. "
+    "Answer questions accurately and perform the requested tasks."
+)
 
 class LLMProcessor:
     """Unified processor for multiple LLM providers."""
     
-    def __init__(self, api_key: str = None, provider: str = "groq"):
+    def __init__(self, api_key: str = None, provider: str = "groq",
+                 session_pool: HTTPSessionPool = None):
         """
         Initialize LLM processor with support for multiple providers.
         
         Args:
             api_key (str): API key for the provider
             provider (str): Provider name (groq, huggingface, together, deepgram)
+            session_pool (HTTPSessionPool): Shared keep-alive transport (optional)
         """
         self.api_key = api_key or os.getenv('LLM_API_KEY', '')
         self.provider = provider or os.getenv('LLM_PROVIDER', 'groq')
+        self.session_pool = session_pool or get_session_pool()
         
         if not self.api_key:
             raise ValueError(f"API_KEY not provided for {self.provider}")
@@ -62,28 +72,39 @@ class LLMProcessor:
         else:
             raise ValueError(f"Unknown provider: {self.provider}")
     
-    def process(self, user_input: str, system_prompt: str = None) -> Dict[str, Any]:
+    def process(self, user_input: str, system_prompt: str = None,
+                context: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """
         Process user input and return LLM response.
         
         Args:
             user_input (str): User's input text
             system_prompt (str): System prompt for context
+            context (list): Earlier conversation messages to send (optional)
             
         Returns:
             Dict with response and metadata
         """
         try:
             if not system_prompt:
-                system_prompt = (
-                    "You are a helpful AI personal assistant. Be concise, friendly, and helpful. "
-                    "Answer questions accurately and perform the requested tasks."
-                )
+                system_prompt = DEFAULT_SYSTEM_PROMPT
+            
+            breaker = get_circuit_breaker(self.provider)
+            if breaker.is_open():
+                return {
+                    'response': (
+                        f'The {self.provider} service is temporarily unavailable. '
+                        f'Please try again in {max(1, round(breaker.retry_in()))} seconds.'
+                    ),
+                    'error': True,
+                    'tokens': 0,
+                    'circuit_open': True
+                }
             
             if self.provider in ["groq", "together"]:
-                return self._call_chat_api(user_input, system_prompt)
+                return self._call_chat_api(user_input, system_prompt, context)
             elif self.provider == "huggingface":
-                return self._call_huggingface(user_input, system_prompt)
+                return self._call_huggingface(user_input, system_prompt, context)
             elif self.provider == "deepgram":
                 return self._call_deepgram(user_input, system_prompt)
             else:
@@ -100,24 +121,44 @@ class LLMProcessor:
                 'tokens': 0
             }
     
-    def _call_chat_api(self, user_input: str, system_prompt: str) -> Dict[str, Any]:
+    def _chat_payload(self, user_input: str, system_prompt: str, stream: bool = False,
+                      context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Build an OpenAI-compatible chat payload (Groq, Together)."""
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": system_prompt},
+                *(context or []),
+                {"role": "user", "content": user_input}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 1024
+        }
+        if stream:
+            payload["stream"] = True
+        return payload
+    
+    def _huggingface_payload(self, user_input: str, system_prompt: str,
+                             context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Build a Hugging Face text-generation payload."""
+        if context:
+            system_prompt = f"{system_prompt}\n\n{format_context_prompt(context)}"
+        return {
+            "inputs": f"{system_prompt}\n\nUser: {user_input}\n\nAssistant:",
+            "parameters": {"max_new_tokens": 512}
+        }
+    
+    def _call_chat_api(self, user_input: str, system_prompt: str,
+                       context: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """Call OpenAI-compatible chat API (Groq, Together, etc)."""
         try:
-            payload = {
-                "model": self.model,
-                "messages": [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                "temperature": 0.7,
-                "max_tokens": 1024
-            }
+            payload = self._chat_payload(user_input, system_prompt, context=context)
             
-            response = requests.post(
+            response = self.session_pool.post(
+                self.provider,
                 self.api_url,
                 headers=self.headers,
-                json=payload,
-                timeout=30
+                json=payload
             )
             
             if response.status_code == 200:
@@ -147,20 +188,17 @@ class LLMProcessor:
                 'tokens': 0
             }
     
-    def _call_huggingface(self, user_input: str, system_prompt: str) -> Dict[str, Any]:
+    def _call_huggingface(self, user_input: str, system_prompt: str,
+                          context: List[Dict[str, str]] = None) -> Dict[str, Any]:
         """Call Hugging Face Inference API."""
         try:
-            prompt = f"{system_prompt}\n\nUser: {user_input}\n\nAssistant:"
-            payload = {
-                "inputs": prompt,
-                "parameters": {"max_new_tokens": 512}
-            }
+            payload = self._huggingface_payload(user_input, system_prompt, context)
             
-            response = requests.post(
+            response = self.session_pool.post(
+                self.provider,
                 self.api_url,
                 headers=self.headers,
-                json=payload,
-                timeout=30
+                json=payload
             )
             
             if response.status_code == 200:
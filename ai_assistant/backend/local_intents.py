@@ -0,0 +1,319 @@
+"""
+Local fast-path for simple commands.
+Time, date, greetings, help, goodbyes and plain arithmetic are answered
+in-process from NLPProcessor's parse, skipping the LLM round-trip; anything
+the local handlers are not sure about falls through to the LLM.
+"""
+import os
+import re
+import ast
+import math
+import operator
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional
+
+from nlp_processor import NLPProcessor, WEEKDAYS
+
+# Longest utterance (in words) answered locally for conversational intents;
+# longer requests usually carry more than the intent keyword suggests
+MAX_LOCAL_WORDS = 8
+
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+# Spoken operators -> symbols, applied in order (longer phrases first)
+_OPERATOR_WORDS = [
+    (re.compile(r'(\d+(?:\.\d+)?)\s*(?:%|percent)\s+of\b'), r'(\1/100)*'),
+    (re.compile(r'\bto the power of\b|\braised to\b|\^'), '**'),
+    (re.compile(r'\bmultiplied by\b|\btimes\b|(?<=\d)\s*x\s*(?=\d)'), '*'),
+    (re.compile(r'\bdivided by\b|\bover\b'), '/'),
+    (re.compile(r'\bplus\b'), '+'),
+    (re.compile(r'\bminus\b'), '-'),
+    (re.compile(r'\bmod(?:ulo)?\b'), '%'),
+]
+_EXPRESSION = re.compile(r'[\d.\s+\-*/%()]+')
+_HAS_OPERATOR = re.compile(r'\d[\s)]*(?:\*\*|[+\-*/%])[\s(]*[-+]?[\d.(]')
+_NUMBER = re.compile(r'\d+(?:\.\d+)?')
+_TOKEN = re.compile(r"[^\s?!.,=]+")
+
+# Largest magnitude computed locally; bigger calculations go to the LLM
+_MAX_MAGNITUDE = 1e30
+
+# Words a request may contain besides the intent itself and still be answered
+# locally. Anything else ("in tokyo", "of easter", "1e308") is a qualifier the
+# local handlers do not understand, so the request goes to the LLM.
+_FILLER_WORDS = {
+    '', 'what', 'whats', 'is', 'it', 'the', 'a', 'tell', 'me', 'please',
+    'can', 'could', 'would', 'you', 'do', 'know', 'hey', 'so', 'current', 'currently',
+    'right', 'now', 'exactly',
+}
+_TIME_WORDS = _FILLER_WORDS | {'time', 'clock', 'have', 'got'}
+_DATE_WORDS = _FILLER_WORDS | {
+    'date', 'day', 'today', 'todays', 'tomorrow', 'of', 'week',
+    'which', 'will', 'be', 'on',
+} | set(WEEKDAYS)
+_MATH_WORDS = _FILLER_WORDS | {
+    'calculate', 'compute', 'evaluate', 'solve', 'how', 'much', 'equals', 'equal', 'to',
+    'result', 'answer', 'of', 'and', 'add', 'sum', 'multiply', 'product', 'by',
+    'subtract', 'from', 'divide', 'together', 'with', 'numbers',
+}
+_GREETING_WORDS = _FILLER_WORDS | {
+    'hello', 'hi', 'hey', 'greetings', 'up', 'there', 'good', 'morning',
+    'afternoon', 'evening', 'how', 'are', 'assistant',
+}
+_HELP_WORDS = _FILLER_WORDS | {
+    'help', 'available', 'commands', 'capabilities', 'your', 'are', 'i',
+    'ask', 'how', 'does', 'this', 'work', 'need', 'some',
+}
+_GOODBYE_WORDS = _FILLER_WORDS | {
+    'goodbye', 'bye', 'exit', 'quit', 'see', 'you', 'later', 'soon',
+    'thanks', 'thank', 'ok', 'okay', 'good', 'night', 'for', 'now', 'that', 'all',
+}
+
+_HELP_TEXT = (
+    "I can tell you the time or date, do quick calculations, and answer "
+    "questions or help with tasks. Just ask!"
+)
+
+
+def safe_eval_arithmetic(expression: str, max_length: int = 200) -> Optional[float]:
+    """
+    Evaluate a plain arithmetic expression without eval().
+
+    Only numbers, + - * / // % ** and parentheses are allowed; powers are
+    size-checked before they are computed and every intermediate value is
+    capped, so a request cannot make the server compute huge numbers.
+
+    Args:
+        expression (str): Expression such as '3 + 4 * (2 - 1)'
+        max_length (int): Longest expression accepted
+
+    Returns:
+        float: The result, or None if the expression is not plain
+            arithmetic or cannot be evaluated
+    """
+    if not expression or len(expression) > max_length:
+        return None
+    try:
+        tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError:
+        return None
+
+    def evaluate(node):
+        if isinstance(node, ast.Expression):
+            return evaluate(node.body)
+        if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+            return node.value
+        if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+            return _UNARY_OPS[type(node.op)](evaluate(node.operand))
+        if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+            left, right = evaluate(node.left), evaluate(node.right)
+            if isinstance(node.op, ast.Pow):
+                # Check the size of the power before computing it
+                if abs(right) > 100 or (abs(left) > 1 and right * math.log10(abs(left)) > math.log10(_MAX_MAGNITUDE)):
+                    raise ValueError("result too large")
+            value = _BINARY_OPS[type(node.op)](left, right)
+            if abs(value) > _MAX_MAGNITUDE:
+                raise ValueError("result too large")
+            return value
+        raise ValueError(f"unsupported expression: {type(node).__name__}")
+
+    try:
+        result = evaluate(tree)
+        if isinstance(result, complex) or not math.isfinite(result):
+            return None
+    except (ValueError, ArithmeticError, TypeError):
+        return None
+    return result
+
+
+def format_number(value: float) -> str:
+    """Format a result without trailing float noise (12.0 -> '12')."""
+    if float(value).is_integer():
+        return f"{int(value):,}"
+    return f"{round(value, 6):,}"
+
+
+class LocalIntentHandler:
+    """Answers high-confidence simple intents without calling the LLM."""
+
+    LOCAL_INTENTS = ('time', 'date', 'greeting', 'help', 'goodbye', 'math')
+
+    def __init__(self, nlp: NLPProcessor = None, min_confidence: float = None):
+        """
+        Initialize the handler.
+
+        Args:
+            nlp (NLPProcessor): Intent parser (optional)
+            min_confidence (float): Minimum intent confidence to answer locally
+        """
+        self.nlp = nlp or NLPProcessor()
+        self.min_confidence = min_confidence or float(os.getenv('LOCAL_INTENT_MIN_CONFIDENCE', '0.85'))
+        self.enabled = os.getenv('LOCAL_INTENTS_ENABLED', 'true').lower() == 'true'
+        self.local_hits = 0
+        self.fallthroughs = 0
+        self.hits_by_intent = {intent: 0 for intent in self.LOCAL_INTENTS}
+        self._lock = threading.Lock()
+
+    def try_answer(self, text: str) -> Optional[Dict[str, Any]]:
+        """
+        Answer text locally if it is a simple, recognized command.
+
+        Args:
+            text (str): User input
+
+        Returns:
+            dict: Response dict tagged served_by='local', or None if the
+                request should go to the LLM
+        """
+        answer = None
+        intent = None
+        if self.enabled:
+            command = self.nlp.parse_command(text)
+            intent = command['intent']
+            if intent in self.LOCAL_INTENTS and command['confidence'] >= self.min_confidence:
+                answer = getattr(self, f'_answer_{intent}')(text, command)
+
+        with self._lock:
+            if answer is None:
+                self.fallthroughs += 1
+                return None
+            self.local_hits += 1
+            self.hits_by_intent[intent] += 1
+
+        return {
+            'response': answer,
+            'error': False,
+            'tokens': 0,
+            'intent': intent,
+            'provider': 'local',
+            'served_by': 'local'
+        }
+
+    def _is_short(self, text: str) -> bool:
+        return len(text.split()) <= MAX_LOCAL_WORDS
+
+    def _only_words(self, text: str, allowed: set, remove=()) -> bool:
+        """True if text, minus the `remove` substrings, holds only allowed words."""
+        text = text.lower().replace('\u2019', "'")
+        for part in remove:
+            text = text.replace(part.lower(), ' ')
+        # "what's", "today's": the possessive/contraction adds nothing
+        return all(token.split("'")[0] in allowed for token in _TOKEN.findall(text))
+
+    def _answer_time(self, text: str, command: Dict[str, Any]) -> Optional[str]:
+        entities = command['entities']
+        if (not self._is_short(text) or entities['numbers'] or entities['time_expressions']
+                or entities['dates'] or not self._only_words(text, _TIME_WORDS)):
+            return None
+        return f"It's {datetime.now().strftime('%I:%M %p').lstrip('0')}."
+
+    def _answer_date(self, text: str, command: Dict[str, Any]) -> Optional[str]:
+        entities = command['entities']
+        if (not self._is_short(text) or entities['time_expressions']
+                or len(entities['date_values']) != len(entities['dates'])
+                or len(entities['date_values']) > 1
+                or not self._only_words(text, _DATE_WORDS, remove=entities['dates'])):
+            return None
+        today = datetime.now().date()
+        day = entities['date_values'][0] if entities['date_values'] else today
+        if day == today:
+            return f"Today is {day.strftime('%A, %B %d, %Y')}."
+        if day == today + timedelta(days=1):
+            return f"Tomorrow is {day.strftime('%A, %B %d, %Y')}."
+        return f"{day.strftime('%B %d, %Y')} is a {day.strftime('%A')}."
+
+    def _answer_greeting(self, text: str, command: Dict[str, Any]) -> Optional[str]:
+        if len(text.split()) > 4 or not self._only_words(text, _GREETING_WORDS):
+            return None
+        return "Hello! How can I help you today?"
+
+    def _answer_help(self, text: str, command: Dict[str, Any]) -> Optional[str]:
+        if not self._is_short(text) or not self._only_words(text, _HELP_WORDS):
+            return None
+        return _HELP_TEXT
+
+    def _answer_goodbye(self, text: str, command: Dict[str, Any]) -> Optional[str]:
+        if len(text.split()) > 4 or not self._only_words(text, _GOODBYE_WORDS):
+            return None
+        return "Goodbye! Talk to you soon."
+
+    def _answer_math(self, text: str, command: Dict[str, Any]) -> Optional[str]:
+        expression = self._math_expression(text.lower(), command['entities']['numbers'])
+        if expression is None:
+            return None
+        result = safe_eval_arithmetic(expression)
+        if result is None:
+            return None
+        return f"The answer is {format_number(result)}."
+
+    def _math_expression(self, text: str, numbers) -> Optional[str]:
+        """
+        Turn a spoken or typed calculation into an arithmetic expression.
+
+        The whole request must be accounted for: one expression plus
+        filler words. Anything left over (a second expression, '1e308'
+        split by the scan, a unit) means the request is not plain
+        arithmetic, and None is returned.
+        """
+        if re.search(r'\d+/\d+/\d+', text):
+            return None  # a date, not a division
+        text = text.replace(',', '')
+        for pattern, replacement in _OPERATOR_WORDS:
+            text = pattern.sub(replacement, text)
+
+        candidates = [m for m in _EXPRESSION.finditer(text) if _HAS_OPERATOR.search(m.group())]
+        if len(candidates) > 1:
+            return None
+        if candidates:
+            match = candidates[0]
+            rest = text[:match.start()] + ' ' + text[match.end():]
+            if not self._only_words(rest, _MATH_WORDS):
+                return None
+            return match.group().strip()
+
+        # Verb forms over the extracted numbers: "add 3 and 5", "divide 10 by 4"
+        if not self._only_words(_NUMBER.sub(' ', text), _MATH_WORDS):
+            return None
+        if len(numbers) != 2 and not (len(numbers) > 2 and re.search(r'\b(?:add|sum|multiply|product)\b', text)):
+            return None
+        terms = [format_number(n).replace(',', '') for n in numbers]
+        if re.search(r'\b(?:add|sum)\b', text):
+            return ' + '.join(terms)
+        if re.search(r'\b(?:multiply|product)\b', text):
+            return ' * '.join(terms)
+        if re.search(r'\bsubtract\b', text):
+            # "subtract 3 from 10" means 10 - 3
+            return f"{terms[1]} - {terms[0]}" if ' from ' in text else f"{terms[0]} - {terms[1]}"
+        if re.search(r'\bdivide\b', text):
+            return f"{terms[0]} / {terms[1]}"
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get fast-path counters.
+
+        Returns:
+            dict: Local hits, LLM fall-throughs, hit rate and hits per intent
+        """
+        with self._lock:
+            total = self.local_hits + self.fallthroughs
+            return {
+                'enabled': self.enabled,
+                'local_hits': self.local_hits,
+                'llm_fallthroughs': self.fallthroughs,
+                'hit_rate': round(self.local_hits / total, 3) if total else 0.0,
+                'hits_by_intent': dict(self.hits_by_intent)
+            }
@@ -0,0 +1,202 @@
+"""
+Ambient-noise calibration for microphone capture.
+The recognizer's energy threshold is measured once, persisted across
+restarts and refreshed in the background (on a schedule, or after repeated
+recognition failures) so listening never starts with a calibration stall.
+"""
+import os
+import json
+import time
+import tempfile
+import threading
+from typing import Dict, Any, Callable
+
+DEFAULT_CALIBRATION_PATH = os.path.join(tempfile.gettempdir(), 'ai_assistant_mic_calibration.json')
+
+
+class CalibrationManager:
+    """Keeps a recognizer's energy threshold calibrated without blocking requests."""
+
+    def __init__(self, recognizer, warm_source: Callable, mic_lock: threading.Lock,
+                 state_path: str = None, refresh_interval: float = None, duration: float = None,
+                 failures_before_refresh: int = None, paused: Callable[[], bool] = None):
+        """
+        Initialize the calibration manager and load any persisted threshold.
+
+        Args:
+            recognizer (sr.Recognizer): Recognizer whose energy_threshold is managed
+            warm_source (callable): Context manager yielding the open microphone
+                source (called with mic_lock held)
+            mic_lock (threading.Lock): Serializes microphone use with listening
+            state_path (str): JSON file for the threshold (MIC_CALIBRATION_PATH)
+            refresh_interval (float): Seconds between background refreshes
+                (MIC_CALIBRATION_INTERVAL, default 600; 0 disables them)
+            duration (float): Seconds of ambient audio sampled (MIC_CALIBRATION_DURATION, default 1)
+            failures_before_refresh (int): Consecutive unrecognized phrases
+                that trigger a refresh (MIC_RECALIBRATE_AFTER_FAILURES, default 2)
+            paused (callable): Returns True while something else holds the
+                microphone for a long session (continuous capture); calibration
+                is deferred until resume() is called
+        """
+        self.recognizer = recognizer
+        self.warm_source = warm_source
+        self.mic_lock = mic_lock
+        self.state_path = state_path or os.getenv('MIC_CALIBRATION_PATH') or DEFAULT_CALIBRATION_PATH
+        self.refresh_interval = (refresh_interval if refresh_interval is not None
+                                 else float(os.getenv('MIC_CALIBRATION_INTERVAL', '600')))
+        self.duration = duration or float(os.getenv('MIC_CALIBRATION_DURATION', '1'))
+        self.failures_before_refresh = (failures_before_refresh
+                                        or int(os.getenv('MIC_RECALIBRATE_AFTER_FAILURES', '2')))
+
+        self.calibrated_at = None
+        self.calibrations = 0
+        self.last_calibration_ms = None
+        self.consecutive_failures = 0
+        self._saved_threshold = None
+        self.is_paused = paused or (lambda: False)
+        self._refresh_requested = threading.Event()
+        self._resumed = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self.load()
+
+    def load(self) -> bool:
+        """
+        Apply the persisted threshold.
+
+        Returns:
+            bool: True if a saved threshold was found
+        """
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            self.recognizer.energy_threshold = float(state['energy_threshold'])
+            self.calibrated_at = float(state.get('calibrated_at', 0))
+            self._saved_threshold = self.recognizer.energy_threshold
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def save(self):
+        """Persist the current threshold (skipped unless it moved by more than 10%)."""
+        threshold = float(self.recognizer.energy_threshold)
+        if self._saved_threshold and abs(threshold - self._saved_threshold) <= 0.1 * self._saved_threshold:
+            return
+        try:
+            tmp_path = self.state_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'energy_threshold': threshold, 'calibrated_at': self.calibrated_at or time.time()}, f)
+            os.replace(tmp_path, self.state_path)
+            self._saved_threshold = threshold
+        except OSError as e:
+            print(f"Warning: Could not save mic calibration: {e}")
+
+    def calibrate(self, blocking: bool = True) -> bool:
+        """
+        Measure ambient noise and update the threshold.
+
+        Args:
+            blocking (bool): Wait for the microphone if it is in use; a
+                background refresh passes False so it never delays listening
+
+        Returns:
+            bool: True if a calibration ran (False at once while paused)
+        """
+        if self.is_paused() or not self.mic_lock.acquire(blocking=blocking):
+            return False
+        try:
+            with self.warm_source() as source:
+                start = time.perf_counter()
+                self.recognizer.adjust_for_ambient_noise(source, duration=self.duration)
+            self.last_calibration_ms = round((time.perf_counter() - start) * 1000, 1)
+        except Exception as e:
+            print(f"Error calibrating microphone: {e}")
+            return False
+        finally:
+            self.mic_lock.release()
+
+        self.calibrated_at = time.time()
+        self.calibrations += 1
+        self.consecutive_failures = 0
+        self._saved_threshold = None  # Always persist a fresh calibration
+        self.save()
+        print(f"Microphone calibrated: energy threshold {self.recognizer.energy_threshold:.0f}")
+        return True
+
+    def needs_refresh(self) -> bool:
+        """True when never calibrated or the calibration is older than the refresh interval."""
+        if self.calibrated_at is None:
+            return True
+        return bool(self.refresh_interval) and time.time() - self.calibrated_at >= self.refresh_interval
+
+    def report_success(self):
+        """Record a recognized phrase (and persist any dynamic threshold drift)."""
+        self.consecutive_failures = 0
+        self.save()
+
+    def report_failure(self):
+        """Record an unrecognized phrase; repeated failures schedule a refresh."""
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failures_before_refresh:
+            self.request_refresh()
+
+    def request_refresh(self):
+        """Ask the background thread to recalibrate at the next idle moment."""
+        self._refresh_requested.set()
+
+    def start(self):
+        """Start background calibration (an initial one runs now unless a recent one was loaded)."""
+        if self._thread is not None:
+            return
+        if self.needs_refresh():
+            self._refresh_requested.set()
+        self._thread = threading.Thread(target=self._run, name='mic-calibration', daemon=True)
+        self._thread.start()
+
+    def resume(self):
+        """Tell the background thread the microphone is free again (run any deferred refresh)."""
+        self._resumed.set()
+
+    def stop(self):
+        """Stop the background thread."""
+        self._stopped.set()
+        self._refresh_requested.set()
+        self._resumed.set()
+
+    def _run(self):
+        poll = min(self.refresh_interval, 30) if self.refresh_interval else None
+        retries = 0
+        while not self._stopped.is_set():
+            self._refresh_requested.wait(timeout=poll)
+            if self._stopped.is_set():
+                break
+            if self._refresh_requested.is_set() or self.needs_refresh():
+                self._resumed.clear()
+                if self.is_paused():
+                    # The microphone is held until continuous capture stops; keep the request pending
+                    self._resumed.wait(timeout=poll or 30)
+                    continue
+                if self.calibrate(blocking=False):
+                    self._refresh_requested.clear()
+                    retries = 0
+                else:
+                    # Microphone busy or unavailable: back off before retrying
+                    self._stopped.wait(min(60, 2 ** retries))
+                    retries += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get calibration state.
+
+        Returns:
+            dict: Threshold, age of the calibration and counters
+        """
+        return {
+            'energy_threshold': round(float(self.recognizer.energy_threshold), 1),
+            'calibrated_age_s': round(time.time() - self.calibrated_at, 1) if self.calibrated_at else None,
+            'calibrations': self.calibrations,
+            'last_calibration_ms': self.last_calibration_ms,
+            'consecutive_failures': self.consecutive_failures,
+            'refresh_pending': self._refresh_requested.is_set()
+        }
@@ -1,24 +1,94 @@
 """
 NLP module for processing user commands and intent recognition.
 """
+import os
 import re
-from datetime import datetime
+from datetime import datetime, date, time, timedelta
+
+from keyword_matcher import KeywordMatcher
+from intent_classifier import IntentClassifier, NUMPY_AVAILABLE
+
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+
+# Representative clock times for parts of the day
+DAY_PERIODS = {
+    'morning': time(9, 0),
+    'afternoon': time(15, 0),
+    'evening': time(19, 0),
+    'night': time(21, 0)
+}
+
+# One scanner for every entity type. Every entity starts at a word boundary,
+# and a one-character lookahead picks the digit or word branch, so most
+# positions are rejected without trying each alternative; within the digit
+# branch, dates and clock times claim their digits before bare numbers
+ENTITY_PATTERN = re.compile(r"""
+    \b(?:
+        (?=\d)(?:
+            (?P<date>(?P<month>\d{1,2})/(?P<day>\d{1,2})/(?P<year>\d{2,4})\b)
+          | (?P<clock>(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s?(?P<meridiem>am|pm)\b
+                    | (?P<hour24>\d{1,2}):(?P<minute24>\d{2})\b)
+          | (?P<number>\d+(?:\.\d+)?\b)
+        )
+      | (?=[a-z])(?:
+            (?P<weekday>(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b)
+          | (?P<relative_day>(?:today|tomorrow)\b)
+          | (?P<period>(?:morning|afternoon|evening|night)\b)
+        )
+    )
+""", re.IGNORECASE | re.VERBOSE)
+
 
 class NLPProcessor:
     """Processes natural language input and recognizes user intents."""
     
-    def __init__(self):
-        """Initialize the NLP processor."""
+    def __init__(self, mode=None):
+        """
+        Initialize the NLP processor.
+        
+        Args:
+            mode (str): 'keyword' (rules only), 'classifier' (n-gram model
+                only) or 'hybrid' (model blended with keyword hits, default).
+                Falls back to 'keyword' when NumPy or the examples file
+                is unavailable.
+        """
         self.intents = {
-            'time': ['what time', 'current time', 'tell me time', 'what\'s the time'],
-            'date': ['what date', 'current date', 'today\'s date', 'what\'s today'],
+            'time': ['what time', 'current time', 'tell me time', 'what\'s the time',
+                     'what is the time', 'time is it', 'the time now'],
+            'date': ['what date', 'current date', 'today\'s date', 'what\'s today',
+                     'what is the date', 'what\'s the date', 'what day is it', 'date today'],
             'reminder': ['remind me', 'set reminder', 'set a reminder', 'create reminder'],
             'search': ['search for', 'find information', 'web search', 'look up', 'google'],
-            'math': ['calculate', 'solve', 'what is', 'how much', 'multiply', 'add', 'subtract', 'divide'],
+            'math': ['calculate', 'solve', 'what is', 'how much', 'multiply', 'add', 'subtract', 'divide',
+                     'plus', 'minus', 'times', 'divided by', 'multiplied by'],
             'greeting': ['hello', 'hi', 'hey', 'greetings', 'what\'s up'],
             'help': ['help', 'what can you do', 'available commands', 'capabilities'],
             'goodbye': ['goodbye', 'bye', 'exit', 'quit', 'see you']
         }
+        self.matcher = KeywordMatcher(self.intents)
+        
+        self.mode = (mode or os.getenv('NLP_INTENT_MODE', 'hybrid')).lower()
+        self.keyword_weight = float(os.getenv('NLP_KEYWORD_WEIGHT', '0.3'))
+        self.classifier = None
+        if self.mode != 'keyword':
+            if NUMPY_AVAILABLE:
+                try:
+                    self.classifier = IntentClassifier.from_examples_file()
+                except (OSError, ValueError) as e:
+                    print(f"Warning: intent classifier not available: {e}")
+            if self.classifier is None:
+                self.mode = 'keyword'
+    
+    def add_keywords(self, intent, keywords):
+        """
+        Add keyword phrases to an intent and rebuild the matcher.
+        
+        Args:
+            intent (str): Intent name (created if new)
+            keywords (list): Keyword phrases
+        """
+        self.intents.setdefault(intent, []).extend(keywords)
+        self.matcher = KeywordMatcher(self.intents)
     
     def recognize_intent(self, text):
         """
@@ -28,58 +98,163 @@ class NLPProcessor:
             text (str): User input text
             
         Returns:
-            dict: Contains 'intent' and 'confidence'
+            dict: Contains 'intent', 'confidence', keyword 'scores' and,
+                outside keyword mode, per-intent 'probabilities'
         """
-        text_lower = text.lower().strip()
+        if self.classifier is None:
+            return self._keyword_intent(text)
+        return self._combine(self._keyword_intent(text), self.classifier.classify(text))
+    
+    def classify_batch(self, texts):
+        """
+        Recognize the intents of many utterances at once.
+        
+        The classifier scores the whole batch in one matrix product.
         
-        # Check each intent
-        for intent, keywords in self.intents.items():
-            for keyword in keywords:
-                if keyword in text_lower:
-                    return {
-                        'intent': intent,
-                        'confidence': 0.9,
-                        'text': text
-                    }
+        Args:
+            texts (list): User input texts
+            
+        Returns:
+            list: One recognize_intent-style dict per text
+        """
+        if self.classifier is None:
+            return [self._keyword_intent(text) for text in texts]
+        return [
+            self._combine(self._keyword_intent(text), predicted)
+            for text, predicted in zip(texts, self.classifier.classify_batch(texts))
+        ]
+    
+    def _combine(self, keyword_result, predicted):
+        """Merge keyword hits with classifier probabilities according to the mode."""
+        probabilities = dict(predicted['probabilities'])
+        if self.mode == 'hybrid':
+            scores = keyword_result['scores']
+            total = sum(scores.values())
+            for label in set(probabilities) | set(scores):
+                if total:
+                    keyword_share = scores.get(label, 0) / total
+                else:
+                    keyword_share = 1.0 if label == 'unknown' else 0.0
+                probabilities[label] = round(
+                    (1 - self.keyword_weight) * probabilities.get(label, 0.0)
+                    + self.keyword_weight * keyword_share, 3
+                )
         
-        # Default to unknown
+        intent = max(probabilities, key=probabilities.get)
         return {
-            'intent': 'unknown',
-            'confidence': 0.0,
-            'text': text
+            'intent': intent,
+            'confidence': probabilities[intent],
+            'text': keyword_result['text'],
+            'scores': keyword_result['scores'],
+            'probabilities': probabilities
         }
     
-    def extract_entities(self, text):
+    def _keyword_intent(self, text):
         """
-        Extract entities (numbers, dates, names) from text.
+        Recognize intent from keyword rules alone.
+        
+        All keyword hits are found in one scan; the intent with the most
+        specific (longest, non-nested) hits wins, and confidence drops
+        when other intents also matched.
+        """
+        scores = self.matcher.score(text)
+        
+        if not scores:
+            # Default to unknown
+            return {
+                'intent': 'unknown',
+                'confidence': 0.0,
+                'text': text,
+                'scores': {}
+            }
+        
+        # Ties go to the intent listed first in the keyword table
+        intent = max(self.intents, key=lambda name: scores.get(name, 0))
+        return {
+            'intent': intent,
+            'confidence': round(0.9 * scores[intent] / sum(scores.values()), 3),
+            'text': text,
+            'scores': scores
+        }
+    
+    def extract_entities(self, text, now=None):
+        """
+        Extract entities (numbers, dates, times) from text in one scan.
+        
+        Besides the matched strings, dates and times are normalized into
+        datetime.date / datetime.time values: 'today' and 'tomorrow' are
+        resolved, weekday names map to their next occurrence (today
+        included) and parts of the day map to a representative time.
         
         Args:
             text (str): User input text
+            now (datetime): Reference time for relative dates (optional)
             
         Returns:
-            dict: Extracted entities
+            dict: 'numbers', 'time_expressions' and 'dates' as found in the
+                text, plus typed 'time_values' and 'date_values'
         """
         entities = {
-            'numbers': self._extract_numbers(text),
-            'time_expressions': self._extract_time_expressions(text),
-            'dates': self._extract_dates(text)
+            'numbers': [],
+            'time_expressions': [],
+            'dates': [],
+            'time_values': [],
+            'date_values': []
         }
+        
+        for match in ENTITY_PATTERN.finditer(text):
+            kind = match.lastgroup
+            value = match.group()
+            
+            if kind == 'number':
+                entities['numbers'].append(float(value) if '.' in value else int(value))
+            elif kind == 'clock':
+                entities['time_expressions'].append(value)
+                parsed = self._parse_clock(match)
+                if parsed is not None:
+                    entities['time_values'].append(parsed)
+            elif kind == 'period':
+                entities['time_expressions'].append(value)
+                entities['time_values'].append(DAY_PERIODS[value.lower()])
+            else:
+                entities['dates'].append(value)
+                if kind != 'date' and now is None:
+                    now = datetime.now()
+                parsed = self._parse_date(match, kind, now)
+                if parsed is not None:
+                    entities['date_values'].append(parsed)
+        
         return entities
     
-    def _extract_numbers(self, text):
-        """Extract numeric values from text."""
-        numbers = re.findall(r'\b\d+(?:\.\d+)?\b', text)
-        return [float(n) if '.' in n else int(n) for n in numbers]
-    
-    def _extract_time_expressions(self, text):
-        """Extract time-related expressions."""
-        time_patterns = r'\b(\d{1,2}:\d{2}(?:am|pm)?|\b(?:morning|afternoon|evening|night)\b)'
-        return re.findall(time_patterns, text, re.IGNORECASE)
+    def _parse_clock(self, match):
+        """Convert a clock match (5pm, 10:30 am, 17:45) into a datetime.time."""
+        if match.group('hour24') is not None:
+            hour, minute = int(match.group('hour24')), int(match.group('minute24'))
+        else:
+            hour, minute = int(match.group('hour')), int(match.group('minute') or 0)
+            if not 1 <= hour <= 12:
+                return None
+            hour = hour % 12 + (12 if match.group('meridiem').lower() == 'pm' else 0)
+        if hour > 23 or minute > 59:
+            return None
+        return time(hour, minute)
     
-    def _extract_dates(self, text):
-        """Extract date-related expressions."""
-        date_patterns = r'\b(\d{1,2}/\d{1,2}/\d{2,4}|(?:Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday)|tomorrow|today)\b'
-        return re.findall(date_patterns, text, re.IGNORECASE)
+    def _parse_date(self, match, kind, now):
+        """Convert a date match into a datetime.date (month/day/year order)."""
+        if kind != 'date':
+            today = now.date()
+        if kind == 'relative_day':
+            return today + timedelta(days=1 if match.group().lower() == 'tomorrow' else 0)
+        if kind == 'weekday':
+            weekday = WEEKDAYS.index(match.group().lower())
+            return today + timedelta(days=(weekday - today.weekday()) % 7)
+        year = int(match.group('year'))
+        if year < 100:
+            year += 2000
+        try:
+            return date(year, int(match.group('month')), int(match.group('day')))
+        except ValueError:
+            return None
     
     def parse_command(self, text):
         """
@@ -100,3 +275,28 @@ class NLPProcessor:
             'text': text,
             'entities': entities
         }
+    
+    def parse_commands(self, texts, now=None):
+        """
+        Parse many inputs at once.
+        
+        Intents are classified as one batch (a single matrix product when
+        the classifier is active); entities share the precompiled scanner.
+        
+        Args:
+            texts (list): User input texts
+            now (datetime): Reference time for relative dates (optional)
+            
+        Returns:
+            list: One parse_command-style dict per text
+        """
+        now = now or datetime.now()
+        return [
+            {
+                'intent': intent_result['intent'],
+                'confidence': intent_result['confidence'],
+                'text': text,
+                'entities': self.extract_entities(text, now)
+            }
+            for text, intent_result in zip(texts, self.classify_batch(texts))
+        ]
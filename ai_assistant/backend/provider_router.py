@@ -0,0 +1,443 @@
+"""
+Latency-aware router across several LLM providers.
+Tracks rolling latency and error rate per provider, sends each request to
+the fastest healthy one, fails over on errors and can hedge slow requests
+with a duplicate to a second provider.
+"""
+import os
+import time
+import asyncio
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Iterable, List, Iterator, AsyncIterator
+
+from free_api_processor import FreeAPIProcessor
+from batch_processing import iter_ordered
+from circuit_breaker import get_circuit_breaker
+
+
+class ProviderStats:
+    """Rolling latency and error-rate window for one provider."""
+
+    def __init__(self, window: int = 50, max_age: float = 60.0):
+        """
+        Initialize the rolling window.
+
+        Args:
+            window (int): Number of recent calls to keep
+            max_age (float): Seconds a call counts towards the stats; older
+                calls age out, so a provider demoted by a burst of errors
+                is tried again once they expire
+        """
+        self.samples = deque(maxlen=window)  # (finished_at, latency_seconds, ok)
+        self.max_age = max_age
+        self.in_flight = 0
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Mark a call as started."""
+        with self._lock:
+            self.in_flight += 1
+
+    def record(self, latency: float, ok: bool):
+        """Record one finished call."""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+            self.samples.append((time.monotonic(), latency, ok))
+
+    def abandon(self):
+        """Mark a started call as finished without recording it (cached or cancelled)."""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def _percentile(self, latencies: List[float], pct: float) -> float:
+        index = min(len(latencies) - 1, int(round(pct * (len(latencies) - 1))))
+        return latencies[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get current latency percentiles and error rate.
+
+        Returns:
+            dict: p50/p95 latency in ms (None until a call succeeds),
+                error rate and sample count
+        """
+        with self._lock:
+            cutoff = time.monotonic() - self.max_age
+            while self.samples and self.samples[0][0] < cutoff:
+                self.samples.popleft()
+            samples = list(self.samples)
+
+        latencies = sorted(latency for _, latency, ok in samples if ok)
+        errors = sum(1 for _, _, ok in samples if not ok)
+        return {
+            'p50_ms': round(self._percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+            'p95_ms': round(self._percentile(latencies, 0.95) * 1000, 1) if latencies else None,
+            'error_rate': round(errors / len(samples), 3) if samples else 0.0,
+            'samples': len(samples),
+            'in_flight': self.in_flight
+        }
+
+
+class ProviderRouter:
+    """Routes requests to the fastest healthy provider, with optional hedging."""
+
+    def __init__(self, processors: Dict[str, FreeAPIProcessor], hedge_delay: float = None,
+                 window: int = 50, max_error_rate: float = 0.5, stats_max_age: float = None):
+        """
+        Initialize the router.
+
+        Args:
+            processors (dict): Provider name -> configured processor
+            hedge_delay (float): Seconds before sending a hedged duplicate
+                to the next provider (None or 0 disables hedging)
+            window (int): Calls kept per provider for latency/error stats
+            max_error_rate (float): Error rate above which a provider is unhealthy
+            stats_max_age (float): Seconds a call stays in the stats
+                (PROVIDER_STATS_MAX_AGE, default 60)
+        """
+        if not processors:
+            raise ValueError("ProviderRouter needs at least one provider")
+
+        self.processors = dict(processors)
+        self.hedge_delay = hedge_delay or None
+        self.max_error_rate = max_error_rate
+        if stats_max_age is None:
+            stats_max_age = float(os.getenv('PROVIDER_STATS_MAX_AGE', '60'))
+        self.stats = {name: ProviderStats(window, stats_max_age) for name in self.processors}
+        self.hedged_requests = 0
+        self.hedge_wins = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(8, 4 * len(self.processors)),
+            thread_name_prefix='provider-router'
+        )
+
+    @classmethod
+    def from_env(cls, providers: List[str], processor_class=FreeAPIProcessor) -> "ProviderRouter":
+        """
+        Build a router from environment configuration.
+
+        Each provider uses <PROVIDER>_API_KEY (e.g. GROQ_API_KEY), falling
+        back to FREE_API_KEY. Providers without a key are skipped.
+
+        Args:
+            providers (list): Provider names in preference order
+            processor_class (type): Processor class to instantiate per provider
+
+        Returns:
+            ProviderRouter: Router over the configured providers
+        """
+        processors = {}
+        for name in providers:
+            key = os.getenv(f'{name.upper()}_API_KEY') or os.getenv('FREE_API_KEY', '')
+            try:
+                processors[name] = processor_class(api_key=key, api_provider=name)
+            except ValueError as e:
+                print(f"Warning: provider {name} not configured: {e}")
+
+        hedge_ms = float(os.getenv('HEDGE_DELAY_MS', '0'))
+        return cls(processors, hedge_delay=hedge_ms / 1000 if hedge_ms > 0 else None)
+
+    @property
+    def api_provider(self) -> str:
+        """Name of the provider currently ranked first."""
+        return self.ranked_providers()[0]
+
+    def is_healthy(self, name: str) -> bool:
+        """Check whether a provider's breaker is closed and its recent error rate acceptable."""
+        if get_circuit_breaker(name).is_open():
+            return False
+        return self.stats[name].snapshot()['error_rate'] <= self.max_error_rate
+
+    def ranked_providers(self) -> List[str]:
+        """
+        Order providers for the next request.
+
+        Healthy providers come first, fastest p50 first. A provider with
+        no latency data yet ranks ahead so it gets measured, unless its
+        first calls are still outstanding (then it ranks last).
+
+        Returns:
+            list: Provider names in the order they should be tried
+        """
+        def sort_key(name):
+            snapshot = self.stats[name].snapshot()
+            p50 = snapshot['p50_ms']
+            if p50 is None:
+                p50 = float('inf') if snapshot['in_flight'] else -1.0
+            return (not self.is_healthy(name), p50)
+
+        return sorted(self.processors, key=sort_key)
+
+    def _call(self, name: str, user_input: str, system_prompt: str, use_cache: bool,
+              context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Call one provider and record its latency and outcome."""
+        self.stats[name].start()
+        start = time.perf_counter()
+        try:
+            result = self.processors[name].process(user_input, system_prompt, use_cache=use_cache, context=context)
+        except Exception as e:
+            result = {'response': f'Error: {str(e)}', 'error': True, 'tokens': 0}
+
+        if result.get('cached'):
+            self.stats[name].abandon()
+        else:
+            self.stats[name].record(time.perf_counter() - start, not result.get('error'))
+        result['provider'] = name
+        return result
+
+    def process(self, user_input: str, system_prompt: str = None, use_cache: bool = True,
+                context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Process user input on the best provider.
+
+        Falls over to the next provider on error. With hedging enabled, a
+        duplicate goes to the runner-up if the first has not answered
+        within hedge_delay; whichever succeeds first wins.
+
+        Args:
+            user_input (str): User's input text
+            system_prompt (str): System prompt for context (optional)
+            use_cache (bool): Serve and store repeated prompts from the response cache
+            context (list): Earlier conversation messages to send (optional)
+
+        Returns:
+            Dict with response, tokens, metadata and the serving 'provider'
+        """
+        order = self.ranked_providers()
+
+        if self.hedge_delay and len(order) > 1:
+            result = self._process_hedged(order[0], order[1], user_input, system_prompt, use_cache, context)
+            if not result.get('error'):
+                return result
+            order = order[2:]
+        else:
+            result = None
+
+        for name in order:
+            result = self._call(name, user_input, system_prompt, use_cache, context)
+            if not result.get('error'):
+                return result
+
+        return result
+
+    def _process_hedged(self, primary: str, secondary: str, user_input: str,
+                        system_prompt: str, use_cache: bool,
+                        context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """Race the primary against a delayed hedge to the secondary."""
+        futures = {
+            self._executor.submit(self._call, primary, user_input, system_prompt, use_cache, context): primary
+        }
+        done, _ = wait(futures, timeout=self.hedge_delay)
+        hedged = not done
+
+        if hedged:
+            self.hedged_requests += 1
+        elif not next(iter(done)).result().get('error'):
+            return next(iter(done)).result()
+        # Either a hedge, or the primary failed fast and this is a plain failover
+        futures[self._executor.submit(self._call, secondary, user_input, system_prompt, use_cache, context)] = secondary
+
+        result = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if not result.get('error'):
+                    # The loser cannot be interrupted mid-request; drop it if not started
+                    for other in pending:
+                        other.cancel()
+                    if hedged and futures[future] == secondary:
+                        self.hedge_wins += 1
+                    return result
+
+        return result
+
+    async def aprocess(self, user_input: str, system_prompt: str = None, use_cache: bool = True,
+                       context: List[Dict[str, str]] = None) -> Dict[str, Any]:
+        """
+        Async process() for routers built over async processors.
+
+        The losing hedged request is cancelled as soon as a winner arrives.
+
+        Args:
+            user_input (str): User's input text
+            system_prompt (str): System prompt for context (optional)
+            use_cache (bool): Serve and store repeated prompts from the response cache
+            context (list): Earlier conversation messages to send (optional)
+
+        Returns:
+            Dict with response, tokens, metadata and the serving 'provider'
+        """
+        async def call(name):
+            self.stats[name].start()
+            start = time.perf_counter()
+            try:
+                result = await self.processors[name].aprocess(
+                    user_input, system_prompt, use_cache=use_cache, context=context
+                )
+            except asyncio.CancelledError:
+                self.stats[name].abandon()
+                raise
+            except Exception as e:
+                result = {'response': f'Error: {str(e)}', 'error': True, 'tokens': 0}
+            if result.get('cached'):
+                self.stats[name].abandon()
+            else:
+                self.stats[name].record(time.perf_counter() - start, not result.get('error'))
+            result['provider'] = name
+            return result
+
+        order = self.ranked_providers()
+        result = None
+
+        if self.hedge_delay and len(order) > 1:
+            primary, secondary = order[0], order[1]
+            tasks = {asyncio.ensure_future(call(primary)): primary}
+            done, _ = await asyncio.wait(tasks, timeout=self.hedge_delay)
+            hedged = not done
+            if hedged:
+                self.hedged_requests += 1
+            if hedged or next(iter(done)).result().get('error'):
+                tasks[asyncio.ensure_future(call(secondary))] = secondary
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if not result.get('error'):
+                        for other in pending:
+                            other.cancel()
+                        if hedged and tasks[task] == secondary:
+                            self.hedge_wins += 1
+                        return result
+            order = order[2:]
+
+        for name in order:
+            result = await call(name)
+            if not result.get('error'):
+                return result
+
+        return result
+
+    def process_stream(self, user_input: str, system_prompt: str = None, use_cache: bool = True,
+                       context: List[Dict[str, str]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Stream from the best provider (no hedging once tokens are flowing).
+
+        Falls over to the next provider only if the stream fails before
+        any text has been sent.
+
+        Yields:
+            Dict with a text 'delta', then a final dict with 'done': True
+        """
+        final = None
+        for name in self.ranked_providers():
+            self.stats[name].start()
+            start = time.perf_counter()
+            sent_text = False
+            chunks = self.processors[name].process_stream(
+                user_input, system_prompt, use_cache=use_cache, context=context
+            )
+            for chunk in chunks:
+                if not chunk.get('done'):
+                    sent_text = True
+                    yield chunk
+                    continue
+
+                if chunk.get('cached'):
+                    self.stats[name].abandon()
+                else:
+                    self.stats[name].record(time.perf_counter() - start, not chunk.get('error'))
+                chunk['provider'] = name
+                if not chunk.get('error') or sent_text:
+                    yield chunk
+                    return
+                final = chunk
+
+        yield final
+
+    async def aprocess_stream(self, user_input: str, system_prompt: str = None, use_cache: bool = True,
+                              context: List[Dict[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Async process_stream() for routers built over async processors."""
+        final = None
+        for name in self.ranked_providers():
+            self.stats[name].start()
+            start = time.perf_counter()
+            sent_text = False
+            chunks = self.processors[name].aprocess_stream(
+                user_input, system_prompt, use_cache=use_cache, context=context
+            )
+            async for chunk in chunks:
+                if not chunk.get('done'):
+                    sent_text = True
+                    yield chunk
+                    continue
+
+                if chunk.get('cached'):
+                    self.stats[name].abandon()
+                else:
+                    self.stats[name].record(time.perf_counter() - start, not chunk.get('error'))
+                chunk['provider'] = name
+                if not chunk.get('error') or sent_text:
+                    yield chunk
+                    return
+                final = chunk
+
+        yield final
+
+    def iter_many(self, inputs: Iterable[str], max_concurrency: int = 4, system_prompt: str = None,
+                  use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+        """
+        Route many inputs concurrently, yielding results in input order.
+
+        Yields:
+            Dict with 'index', 'input' and the usual response fields
+        """
+        def run(user_input):
+            return user_input, self.process(user_input, system_prompt, use_cache=use_cache)
+
+        for index, (user_input, result) in iter_ordered(run, inputs, max_concurrency):
+            yield dict(result, index=index, input=user_input)
+
+    def process_many(self, inputs: Iterable[str], max_concurrency: int = 4, system_prompt: str = None,
+                     use_cache: bool = True) -> List[Dict[str, Any]]:
+        """Route many inputs concurrently and return results in input order."""
+        return list(self.iter_many(inputs, max_concurrency, system_prompt, use_cache))
+
+    def get_available_models(self) -> list:
+        """Get the available models of every routed provider."""
+        models = []
+        for processor in self.processors.values():
+            models.extend(m for m in processor.get_available_models() if m not in models)
+        return models
+
+    def set_model(self, model_name: str) -> bool:
+        """Set the model on every provider that offers it."""
+        results = [processor.set_model(model_name) for processor in self.processors.values()]
+        return any(results)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get per-provider routing stats.
+
+        Returns:
+            dict: Latency/error snapshot per provider, current ranking and hedge counts
+        """
+        providers = {}
+        for name, processor in self.processors.items():
+            snapshot = self.stats[name].snapshot()
+            snapshot['healthy'] = self.is_healthy(name)
+            snapshot.update(processor.get_stats())
+            providers[name] = snapshot
+
+        return {
+            'providers': providers,
+            'ranking': self.ranked_providers(),
+            'hedge_delay_ms': self.hedge_delay * 1000 if self.hedge_delay else None,
+            'hedged_requests': self.hedged_requests,
+            'hedge_wins': self.hedge_wins
+        }
@@ -0,0 +1,375 @@
+"""
+Client-side rate limiting and retry scheduling for provider APIs.
+Per-provider token buckets for requests/min and tokens/min, seeded from
+the x-ratelimit-* response headers, plus exponential backoff with jitter
+that honours Retry-After.
+"""
+import os
+import re
+import json
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
+from typing import Dict, Any, Optional
+
+# Status codes worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+def parse_duration(value: str) -> Optional[float]:
+    """
+    Parse a rate-limit reset duration such as '7.66s', '2m59.56s' or '120ms'.
+
+    Args:
+        value (str): Header value
+
+    Returns:
+        float: Seconds, or None if the value cannot be parsed
+    """
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+
+    seconds = 0.0
+    matched = False
+    for amount, unit in _DURATION_PART.findall(value.strip()):
+        matched = True
+        amount = float(amount)
+        if unit == 'h':
+            seconds += amount * 3600
+        elif unit == 'm':
+            seconds += amount * 60
+        elif unit == 's':
+            seconds += amount
+        else:
+            seconds += amount / 1000
+    return seconds if matched else None
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """
+    Parse a Retry-After header (delta seconds or HTTP date).
+
+    Args:
+        value (str): Header value
+
+    Returns:
+        float: Seconds to wait, or None if absent/invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def estimate_request_tokens(payload: Any) -> int:
+    """
+    Roughly estimate the tokens a request will count against tokens/min.
+
+    Uses ~4 characters per token for the prompt plus the requested
+    completion budget.
+
+    Args:
+        payload (dict): JSON body of the request
+
+    Returns:
+        int: Estimated tokens (0 for non-LLM requests)
+    """
+    if not isinstance(payload, dict):
+        return 0
+    prompt = payload.get('messages') or payload.get('inputs')
+    if prompt is None:
+        return 0
+    prompt_chars = len(prompt) if isinstance(prompt, str) else len(json.dumps(prompt))
+    completion = payload.get('max_tokens') or payload.get('parameters', {}).get('max_new_tokens', 0)
+    return prompt_chars // 4 + int(completion or 0)
+
+
+class RateLimitedError(Exception):
+    """Raised when a request would have to queue longer than the limiter's max_wait."""
+
+    def __init__(self, wait: float):
+        self.wait = wait
+        super().__init__(f"Rate limit reached, retry in {wait:.0f}s")
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of rejecting callers."""
+
+    def __init__(self, capacity: float, refill_per_second: float):
+        """
+        Initialize a full bucket.
+
+        Args:
+            capacity (float): Max tokens the bucket holds
+            refill_per_second (float): Tokens added per second
+        """
+        self.capacity = float(capacity)
+        self.refill_per_second = float(refill_per_second)
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.refill_per_second)
+        self.updated_at = now
+
+    def reserve(self, amount: float) -> float:
+        """
+        Reserve tokens, going into debt if needed.
+
+        Callers are served in the order they reserve, and each one waits
+        exactly as long as it takes the bucket to cover its debt, so
+        throughput stays at the refill rate instead of bursting and stalling.
+
+        Args:
+            amount (float): Tokens to take
+
+        Returns:
+            float: Seconds the caller must wait before sending
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= min(amount, self.capacity)
+            if self.tokens >= 0 or self.refill_per_second <= 0:
+                return 0.0
+            return -self.tokens / self.refill_per_second
+
+    def refund(self, amount: float):
+        """Give back a reservation that will not be used."""
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + min(amount, self.capacity))
+
+    def sync(self, limit: float = None, remaining: float = None, reset_seconds: float = None):
+        """
+        Re-seed the bucket from server-reported rate-limit state.
+
+        Args:
+            limit (float): Bucket capacity reported by the server
+            remaining (float): Tokens the server says are left
+            reset_seconds (float): Seconds until the server refills to the limit
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if limit:
+                self.capacity = float(limit)
+            if remaining is not None:
+                # Keep any debt from reservations still in flight
+                self.tokens = min(self.tokens, float(remaining))
+                if reset_seconds and reset_seconds > 0 and self.capacity > remaining:
+                    self.refill_per_second = (self.capacity - remaining) / reset_seconds
+
+    def snapshot(self) -> Dict[str, float]:
+        """Get the current bucket level."""
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                'capacity': self.capacity,
+                'available': round(self.tokens, 1),
+                'refill_per_second': round(self.refill_per_second, 3)
+            }
+
+
+class ProviderRateLimiter:
+    """Requests/min and tokens/min buckets for one provider."""
+
+    def __init__(self, requests_per_minute: float = None, tokens_per_minute: float = None,
+                 max_wait: float = None):
+        """
+        Initialize the limiter.
+
+        Buckets are created from the arguments, or lazily from the first
+        x-ratelimit-* headers the provider returns.
+
+        Args:
+            requests_per_minute (float): Request budget (optional)
+            tokens_per_minute (float): Token budget (optional)
+            max_wait (float): Longest a request may be queued, in seconds;
+                requests that would wait longer are rejected
+        """
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60) if tokens_per_minute else None
+        self.max_wait = max_wait or float(os.getenv('RATE_LIMIT_MAX_WAIT', '60'))
+        self.queued = 0
+        self.total_wait = 0.0
+        self.retries = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.paused_until = 0.0  # time.monotonic() deadline set by a 429
+
+    def reserve(self, tokens: int = 0) -> float:
+        """
+        Reserve one request and `tokens` tokens.
+
+        Args:
+            tokens (int): Estimated tokens for the request
+
+        Returns:
+            float: Seconds to wait before sending (at most max_wait)
+
+        Raises:
+            RateLimitedError: If the wait would exceed max_wait; nothing is
+                reserved, so later callers are not pushed back
+        """
+        wait = max(0.0, self.paused_until - time.monotonic())
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None and tokens:
+            wait = max(wait, self.tokens.reserve(tokens))
+        if wait > self.max_wait:
+            if self.requests is not None:
+                self.requests.refund(1)
+            if self.tokens is not None and tokens:
+                self.tokens.refund(tokens)
+            self.rejected += 1
+            raise RateLimitedError(wait)
+        if wait > 0:
+            self.queued += 1
+            self.total_wait += wait
+        return wait
+
+    def update_from_headers(self, headers):
+        """
+        Seed or correct the buckets from x-ratelimit-* response headers.
+
+        Args:
+            headers (Mapping): Response headers
+        """
+        for kind in ('requests', 'tokens'):
+            limit = headers.get(f'x-ratelimit-limit-{kind}')
+            remaining = headers.get(f'x-ratelimit-remaining-{kind}')
+            if limit is None or remaining is None:
+                continue
+            try:
+                limit = float(limit)
+                remaining = float(remaining)
+            except ValueError:
+                continue
+            reset = parse_duration(headers.get(f'x-ratelimit-reset-{kind}', ''))
+
+            bucket = getattr(self, kind)
+            if bucket is None:
+                bucket = TokenBucket(limit, limit / 60)
+                setattr(self, kind, bucket)
+            bucket.sync(limit, remaining, reset)
+
+    def pause(self, seconds: float):
+        """
+        Hold back all requests for `seconds` (after a 429).
+
+        Works whether or not a request bucket exists yet: every
+        reservation, including the retry of the throttled request,
+        waits until the pause has passed.
+        """
+        self.throttled += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get bucket levels and queueing counters.
+
+        Returns:
+            dict: Request/token buckets, queued and rejected counts, total
+                wait and retries
+        """
+        return {
+            'requests': self.requests.snapshot() if self.requests else None,
+            'tokens': self.tokens.snapshot() if self.tokens else None,
+            'queued': self.queued,
+            'total_wait_seconds': round(self.total_wait, 2),
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'rejected': self.rejected
+        }
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring Retry-After."""
+
+    def __init__(self, max_retries: int = None, base_delay: float = None, max_delay: float = None):
+        """
+        Initialize the retry policy.
+
+        Args:
+            max_retries (int): Retries after the first attempt
+            base_delay (float): Backoff for the first retry, in seconds
+            max_delay (float): Backoff ceiling, in seconds
+        """
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv('HTTP_MAX_RETRIES', '3'))
+        self.base_delay = base_delay or float(os.getenv('HTTP_RETRY_BASE_DELAY', '0.5'))
+        self.max_delay = max_delay or float(os.getenv('HTTP_RETRY_MAX_DELAY', '20'))
+
+    def should_retry(self, status_code: int, attempt: int) -> bool:
+        """Check whether a response status is retryable on this attempt."""
+        return status_code in RETRY_STATUSES and attempt < self.max_retries
+
+    def delay(self, attempt: int, retry_after: str = None) -> float:
+        """
+        Compute how long to wait before the next attempt.
+
+        Args:
+            attempt (int): Zero-based attempt that just failed
+            retry_after (str): Retry-After header value, if any
+
+        Returns:
+            float: Seconds to wait
+        """
+        server_delay = parse_retry_after(retry_after)
+        if server_delay is not None:
+            return min(server_delay, self.max_delay)
+        backoff = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, backoff)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider: str) -> ProviderRateLimiter:
+    """
+    Get the process-wide limiter for a provider.
+
+    Initial budgets come from RATE_LIMIT_RPM_<PROVIDER>/RATE_LIMIT_TPM_<PROVIDER>
+    (or RATE_LIMIT_RPM/RATE_LIMIT_TPM); otherwise they are learned from
+    response headers.
+
+    Args:
+        provider (str): Provider name
+
+    Returns:
+        ProviderRateLimiter: Shared limiter
+    """
+    limiter = _limiters.get(provider)
+    if limiter is not None:
+        return limiter
+
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            suffix = provider.upper()
+            rpm = os.getenv(f'RATE_LIMIT_RPM_{suffix}') or os.getenv('RATE_LIMIT_RPM')
+            tpm = os.getenv(f'RATE_LIMIT_TPM_{suffix}') or os.getenv('RATE_LIMIT_TPM')
+            limiter = ProviderRateLimiter(
+                requests_per_minute=float(rpm) if rpm else None,
+                tokens_per_minute=float(tpm) if tpm else None
+            )
+            _limiters[provider] = limiter
+        return limiter
+
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    """Get limiter stats for every provider seen so far."""
+    return {provider: limiter.get_stats() for provider, limiter in list(_limiters.items())}
@@ -0,0 +1,406 @@
+"""
+Pluggable speech recognizer backends.
+Google Speech Recognition needs a network round trip per phrase; the local
+engines (PocketSphinx, Vosk) decode on this machine. Local models are
+loaded once and stay resident, and a fixed pool of decoders serves
+concurrent requests. RecognitionRouter chooses between the engines:
+remote only, local only, local-first, remote-first, or racing both.
+"""
+import os
+import json
+import time
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Optional, Tuple
+
+import speech_recognition as sr
+
+# Local engines are optional
+try:
+    import pocketsphinx
+    POCKETSPHINX_AVAILABLE = True
+except ImportError:
+    pocketsphinx = None
+    POCKETSPHINX_AVAILABLE = False
+
+try:
+    import vosk
+    VOSK_AVAILABLE = True
+except ImportError:
+    vosk = None
+    VOSK_AVAILABLE = False
+
+LOCAL_SAMPLE_RATE = 16000
+STT_MODES = ('remote', 'local', 'local-first', 'remote-first', 'race')
+
+
+class RecognizerBackend:
+    """
+    One speech recognition engine.
+
+    recognize() follows speech_recognition's conventions: it returns the
+    transcript, raises sr.UnknownValueError when no speech was understood
+    and sr.RequestError when the engine itself failed.
+    """
+
+    name = 'base'
+    local = False
+
+    def __init__(self):
+        self.calls = 0
+        self.no_speech = 0
+        self.failures = 0
+        self.total_ms = 0.0
+        self.load_error = None
+        self._stats_lock = threading.Lock()
+
+    def load(self):
+        """Load models (called once, before the first recognition)."""
+
+    def _recognize(self, audio: sr.AudioData, upload: dict = None) -> str:
+        raise NotImplementedError
+
+    def recognize(self, audio: sr.AudioData, upload: dict = None) -> str:
+        """
+        Recognize an utterance.
+
+        Args:
+            audio (sr.AudioData): Captured audio
+            upload (dict): Filled by network engines with the 'bytes_sent'
+                and 'upload_ms' of the request (left empty by local ones)
+
+        Returns:
+            str: Transcript
+        """
+        start = time.perf_counter()
+        outcome = 'failures'
+        try:
+            text = self._recognize(audio, upload)
+            outcome = None
+            return text
+        except sr.UnknownValueError:
+            outcome = 'no_speech'
+            raise
+        finally:
+            with self._stats_lock:
+                self.calls += 1
+                if outcome:
+                    setattr(self, outcome, getattr(self, outcome) + 1)
+                self.total_ms += (time.perf_counter() - start) * 1000
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Calls, utterances with no speech recognized, engine failures, average latency and any load error."""
+        with self._stats_lock:
+            return {
+                'local': self.local,
+                'calls': self.calls,
+                'no_speech': self.no_speech,
+                'failures': self.failures,
+                'avg_ms': round(self.total_ms / self.calls, 1) if self.calls else None,
+                'load_error': self.load_error
+            }
+
+
+class GoogleBackend(RecognizerBackend):
+    """Google Speech Recognition over the network (speech_recognition's default)."""
+
+    name = 'google'
+
+    def __init__(self, recognizer: sr.Recognizer):
+        super().__init__()
+        self.recognizer = recognizer
+
+    def _recognize(self, audio, upload=None):
+        # Encode first so only the HTTP exchange is timed
+        flac = audio.get_flac_data(convert_rate=None if audio.sample_rate >= 8000 else 8000, convert_width=2)
+        start = time.perf_counter()
+        try:
+            text = self.recognizer.recognize_google(_EncodedAudio(audio, flac))
+        except sr.UnknownValueError:
+            # The exchange completed, it just heard nothing
+            self._note_upload(upload, len(flac), start)
+            raise
+        self._note_upload(upload, len(flac), start)
+        return text
+
+    def _note_upload(self, upload, bytes_sent, start):
+        if upload is not None:
+            upload['bytes_sent'] = bytes_sent
+            upload['upload_ms'] = (time.perf_counter() - start) * 1000
+
+
+class _EncodedAudio(sr.AudioData):
+    """AudioData whose FLAC encoding was done ahead of the request."""
+
+    def __init__(self, audio, flac):
+        super().__init__(audio.frame_data, audio.sample_rate, audio.sample_width)
+        self.flac = flac
+
+    def get_flac_data(self, convert_rate=None, convert_width=None):
+        return self.flac
+
+
+class _DecoderPoolBackend(RecognizerBackend):
+    """A local engine with a fixed set of resident decoders, one per concurrent request."""
+
+    local = True
+
+    def __init__(self, decoders: int = 2):
+        super().__init__()
+        self.size = max(1, decoders)
+        self._decoders = queue.Queue()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+
+    def _new_decoder(self):
+        raise NotImplementedError
+
+    def _decode(self, decoder, pcm: bytes) -> str:
+        raise NotImplementedError
+
+    def load(self):
+        with self._load_lock:
+            if self._loaded:
+                return
+            try:
+                start = time.perf_counter()
+                for _ in range(self.size):
+                    self._decoders.put(self._new_decoder())
+                print(f"{self.name} model loaded ({self.size} decoders, "
+                      f"{(time.perf_counter() - start) * 1000:.0f} ms)")
+            except Exception as e:
+                self.load_error = f'{type(e).__name__}: {e}'
+                print(f"Warning: {self.name} recognizer not available: {e}")
+            self._loaded = True
+
+    def _recognize(self, audio, upload=None):
+        self.load()
+        if self.load_error:
+            raise sr.RequestError(f'{self.name} not available: {self.load_error}')
+        pcm = audio.get_raw_data(convert_rate=LOCAL_SAMPLE_RATE, convert_width=2)
+        decoder = self._decoders.get()
+        try:
+            text = self._decode(decoder, pcm)
+        except Exception as e:
+            raise sr.RequestError(f'{self.name} decoding failed: {e}')
+        finally:
+            self._decoders.put(decoder)
+        if not text:
+            raise sr.UnknownValueError()
+        return text
+
+
+class SphinxBackend(_DecoderPoolBackend):
+    """CMU PocketSphinx (pocketsphinx>=5, bundled en-US model by default)."""
+
+    name = 'sphinx'
+
+    def __init__(self, decoders: int = 2, model_dir: str = None):
+        """
+        Args:
+            decoders (int): Resident decoders (concurrent recognitions)
+            model_dir (str): Acoustic model directory with its .lm.bin and
+                .dict alongside (SPHINX_MODEL_DIR; default: bundled en-US)
+        """
+        super().__init__(decoders)
+        self.model_dir = model_dir or os.getenv('SPHINX_MODEL_DIR')
+
+    def _new_decoder(self):
+        if not POCKETSPHINX_AVAILABLE:
+            raise ImportError('pocketsphinx is not installed')
+        options = {'loglevel': 'FATAL'}
+        if self.model_dir:
+            options['hmm'] = self.model_dir
+        return pocketsphinx.Decoder(**options)
+
+    def _decode(self, decoder, pcm):
+        decoder.start_utt()
+        decoder.process_raw(pcm, False, True)
+        decoder.end_utt()
+        hyp = decoder.hyp()
+        return hyp.hypstr.strip() if hyp is not None else ''
+
+
+class VoskBackend(_DecoderPoolBackend):
+    """Kaldi models through Vosk; the model is shared, each decoder is a KaldiRecognizer."""
+
+    name = 'vosk'
+
+    def __init__(self, decoders: int = 2, model_path: str = None):
+        """
+        Args:
+            decoders (int): Resident recognizers (concurrent recognitions)
+            model_path (str): Unpacked Vosk model directory (VOSK_MODEL_PATH)
+        """
+        super().__init__(decoders)
+        self.model_path = model_path or os.getenv('VOSK_MODEL_PATH')
+        self.model = None
+
+    def _new_decoder(self):
+        if not VOSK_AVAILABLE:
+            raise ImportError('vosk is not installed')
+        if self.model is None:
+            if not self.model_path:
+                raise ValueError('VOSK_MODEL_PATH not set')
+            vosk.SetLogLevel(-1)
+            self.model = vosk.Model(self.model_path)
+        return vosk.KaldiRecognizer(self.model, LOCAL_SAMPLE_RATE)
+
+    def _decode(self, decoder, pcm):
+        decoder.AcceptWaveform(pcm)
+        # FinalResult also resets the recognizer for the next utterance
+        return json.loads(decoder.FinalResult()).get('text', '').strip()
+
+
+LOCAL_BACKENDS = {'sphinx': SphinxBackend, 'vosk': VoskBackend}
+
+
+def create_local_backend(engine: str = None, decoders: int = None) -> RecognizerBackend:
+    """
+    Create a local backend from configuration.
+
+    Args:
+        engine (str): 'sphinx' or 'vosk' (STT_LOCAL_ENGINE, default vosk
+            when VOSK_MODEL_PATH is set, else sphinx)
+        decoders (int): Resident decoders (STT_DECODER_WORKERS, default 2)
+
+    Returns:
+        RecognizerBackend: Backend (its models are not loaded yet)
+    """
+    engine = (engine or os.getenv('STT_LOCAL_ENGINE')
+              or ('vosk' if os.getenv('VOSK_MODEL_PATH') else 'sphinx')).lower()
+    if engine not in LOCAL_BACKENDS:
+        raise ValueError(f"Unknown local speech engine: {engine}")
+    return LOCAL_BACKENDS[engine](decoders or int(os.getenv('STT_DECODER_WORKERS', '2')))
+
+
+class RecognitionRouter:
+    """Runs recognition on the configured backend(s) according to the STT mode."""
+
+    def __init__(self, remote: RecognizerBackend = None, local: RecognizerBackend = None, mode: str = None):
+        """
+        Initialize the router.
+
+        Args:
+            remote (RecognizerBackend): Network engine (e.g. GoogleBackend)
+            local (RecognizerBackend): Offline engine (see create_local_backend)
+            mode (str): STT_MODE: 'remote' (default), 'local', 'local-first',
+                'remote-first' or 'race'. The *-first modes fall back to the
+                other engine when the first fails or hears nothing; 'race'
+                runs both and takes the first transcript.
+        """
+        mode = (mode or os.getenv('STT_MODE', 'remote')).lower()
+        if mode not in STT_MODES:
+            print(f"Warning: Unknown STT_MODE {mode}, using remote")
+            mode = 'remote'
+        self.mode = mode
+        self.remote = remote
+        self.local = local
+        if mode != 'remote' and local is None:
+            try:
+                self.local = create_local_backend()
+            except ValueError as e:
+                print(f"Warning: {e}, using remote recognition only")
+                self.mode = 'remote'
+        self.wins = {}
+        self._race_pool = None
+        if self.mode == 'race':
+            workers = 2 * getattr(self.local, 'size', 2)
+            self._race_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='stt-race')
+
+    @classmethod
+    def from_env(cls, recognizer: sr.Recognizer) -> "RecognitionRouter":
+        """Create a router with Google as the remote engine and the configured local one."""
+        return cls(remote=GoogleBackend(recognizer))
+
+    def warm_up(self):
+        """Load the local model in the background so the first request does not pay for it."""
+        if self.local is not None:
+            threading.Thread(target=self.local.load, name='stt-model-load', daemon=True).start()
+
+    def _order(self) -> Tuple[Optional[RecognizerBackend], ...]:
+        return {
+            'remote': (self.remote,),
+            'local': (self.local,),
+            'local-first': (self.local, self.remote),
+            'remote-first': (self.remote, self.local)
+        }[self.mode]
+
+    def _won(self, backend: RecognizerBackend):
+        self.wins[backend.name] = self.wins.get(backend.name, 0) + 1
+
+    def recognize(self, audio: sr.AudioData, upload: dict = None) -> str:
+        """
+        Recognize an utterance.
+
+        Args:
+            audio (sr.AudioData): Captured audio
+            upload (dict): Filled with the remote engine's 'bytes_sent' and
+                'upload_ms' when the audio was sent over the network and
+                the caller waited on it (left empty otherwise)
+
+        Returns:
+            str: Transcript
+
+        Raises:
+            sr.UnknownValueError: No engine understood the audio
+            sr.RequestError: Every engine failed
+        """
+        if self.mode == 'race':
+            return self._race(audio, upload)
+
+        error = None
+        for backend in self._order():
+            if backend is None:
+                continue
+            try:
+                text = backend.recognize(audio, upload)
+                self._won(backend)
+                return text
+            except (sr.UnknownValueError, sr.RequestError) as e:
+                # "Nothing heard" wins over an engine failure when reporting
+                if error is None or isinstance(e, sr.UnknownValueError):
+                    error = e
+        raise error or sr.RequestError('No speech recognizer configured')
+
+    def _race(self, audio: sr.AudioData, upload: dict = None) -> str:
+        # The remote engine reports into its own dict: it only counts if it wins
+        remote_upload = {}
+        pending = {self._race_pool.submit(backend.recognize, audio, remote_upload if backend is self.remote else None): backend
+                   for backend in (self.local, self.remote) if backend is not None}
+        error = None
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    text = future.result()
+                except (sr.UnknownValueError, sr.RequestError) as e:
+                    if error is None or isinstance(e, sr.UnknownValueError):
+                        error = e
+                    continue
+                # The slower engine finishes in the background and is ignored
+                self._won(backend)
+                if upload is not None and backend is self.remote:
+                    upload.update(remote_upload)
+                return text
+        raise error or sr.RequestError('No speech recognizer configured')
+
+    def close(self):
+        """Stop the race pool."""
+        if self._race_pool is not None:
+            self._race_pool.shutdown(wait=False)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get routing state.
+
+        Returns:
+            dict: Mode, per-engine stats and which engine produced each transcript
+        """
+        return {
+            'mode': self.mode,
+            'backends': {b.name: b.get_stats() for b in (self.remote, self.local) if b is not None},
+            'wins': dict(self.wins)
+        }
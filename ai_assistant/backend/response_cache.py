@@ -0,0 +1,222 @@
+"""
+Response cache for LLM processors.
+In-memory LRU tier with TTL eviction, plus an optional SQLite tier so
+cached answers survive restarts.
+"""
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+
+class ResponseCache:
+    """LRU + TTL cache of processor responses, optionally backed by SQLite."""
+
+    def __init__(self, max_entries: int = None, ttl: float = None, db_path: str = None):
+        """
+        Initialize the response cache.
+
+        Args:
+            max_entries (int): Max responses kept in memory
+            ttl (float): Seconds before a cached response expires
+            db_path (str): SQLite file for the persistent tier (optional)
+        """
+        self.max_entries = max_entries or int(os.getenv('RESPONSE_CACHE_SIZE', '256'))
+        self.ttl = ttl or float(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+        self.db_path = db_path if db_path is not None else os.getenv('RESPONSE_CACHE_DB', '')
+
+        self._entries = OrderedDict()  # key -> (expires_at, response)
+        self._lock = threading.Lock()  # Memory tier and counters
+        self._db_lock = threading.Lock()  # SQLite tier (held only around disk I/O)
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self._db = None
+        if self.db_path:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+            self._db.commit()
+
+    @staticmethod
+    def make_key(provider: str, model: str, system_prompt: str, user_input: str,
+                 temperature: float, max_tokens: int, context: list = None) -> str:
+        """
+        Build a cache key for a request.
+
+        User input is normalized (case and whitespace) so trivially
+        different phrasings of the same prompt share an entry. Conversation
+        context, when present, is part of the key since it changes the answer.
+
+        Returns:
+            str: Hex digest identifying the request
+        """
+        normalized = ' '.join(user_input.lower().split())
+        parts = [provider, model, system_prompt, normalized, temperature, max_tokens]
+        if context:
+            parts.append(context)
+        raw = json.dumps(parts)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached response.
+
+        Args:
+            key (str): Key from make_key
+
+        Returns:
+            dict: Cached response, or None on a miss
+        """
+        now = time.time()
+        response = self._memory_get(key, now)
+        if response is None and self._db is not None:
+            response = self._disk_get(key, now)
+        if response is None:
+            with self._lock:
+                self.misses += 1
+        return response
+
+    async def aget(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        get() for async callers.
+
+        Memory hits are answered inline; a lookup that has to go to SQLite
+        runs in the default executor so the event loop is not blocked on disk.
+        """
+        if self._db is None:
+            return self.get(key)
+        response = self._memory_get(key, time.time())
+        if response is not None:
+            return response
+        return await asyncio.get_running_loop().run_in_executor(None, self.get, key)
+
+    def _memory_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, response = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return dict(response)
+            del self._entries[key]
+            self.expirations += 1
+            return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[Dict[str, Any]]:
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and row[1] <= now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+                row = None
+        if row is None:
+            return None
+        value, expires_at = row
+        response = json.loads(value)
+        with self._lock:
+            self._store(key, expires_at, response)
+            self.hits += 1
+            self.disk_hits += 1
+        return dict(response)
+
+    def set(self, key: str, response: Dict[str, Any]):
+        """
+        Cache a response.
+
+        Args:
+            key (str): Key from make_key
+            response (dict): Processor response to cache
+        """
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._store(key, expires_at, response)
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(response), expires_at)
+                )
+                self._db.commit()
+
+    async def aset(self, key: str, response: Dict[str, Any]):
+        """set() for async callers; the SQLite write runs in the default executor."""
+        if self._db is None:
+            self.set(key, response)
+            return
+        await asyncio.get_running_loop().run_in_executor(None, self.set, key, response)
+
+    def _store(self, key: str, expires_at: float, response: Dict[str, Any]):
+        """Insert into the memory tier and evict the least recently used entries."""
+        self._entries[key] = (expires_at, dict(response))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Remove every cached response from both tiers."""
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Size, hit/miss/eviction counts and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'persistent': self._db is not None,
+                'hits': self.hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the process-wide response cache.
+
+    Returns:
+        ResponseCache: Shared cache, or None if RESPONSE_CACHE_ENABLED is false
+    """
+    global _shared_cache
+    if os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() not in ('true', '1', 'yes'):
+        return None
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = ResponseCache()
+    return _shared_cache
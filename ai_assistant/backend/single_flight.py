@@ -0,0 +1,161 @@
+"""
+Request coalescing ("single flight") for upstream API calls.
+Concurrent callers asking for the same key wait on one in-flight call and
+share its result instead of each hitting the provider.
+"""
+import asyncio
+import threading
+from typing import Any, Callable, Awaitable, Dict, Tuple
+
+
+class _Call:
+    """An in-flight call that followers can wait on."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesces identical concurrent calls across threads."""
+
+    def __init__(self):
+        """Initialize the in-flight call table."""
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.upstream_calls = 0
+        self.collapsed = 0
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run fn once per key among concurrent callers.
+
+        Args:
+            key (str): Identity of the request (e.g. a response-cache key)
+            fn (callable): Function making the upstream call
+
+        Returns:
+            tuple: (result, shared) where shared is True if this caller
+                reused another caller's in-flight result
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.collapsed += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self.upstream_calls += 1
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+        return call.result, False
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get coalescing counters.
+
+        Returns:
+            dict: Upstream calls made, calls collapsed and calls in flight
+        """
+        with self._lock:
+            return {
+                'upstream_calls': self.upstream_calls,
+                'collapsed': self.collapsed,
+                'in_flight': len(self._calls)
+            }
+
+
+class _AsyncCall:
+    """An in-flight call running as its own task, with the callers awaiting it."""
+
+    def __init__(self, task: "asyncio.Task"):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """Coalesces identical concurrent calls within one event loop."""
+
+    def __init__(self):
+        """Initialize the in-flight call table."""
+        self._calls = {}
+        self.upstream_calls = 0
+        self.collapsed = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await fn once per key among concurrent callers.
+
+        The call runs as a task of its own that every caller (the first
+        one included) awaits through a shield, so a caller that is
+        cancelled, e.g. because its client disconnected, leaves the call
+        running for the others. Only when the last caller gives up is the
+        upstream call cancelled.
+
+        Args:
+            key (str): Identity of the request (e.g. a response-cache key)
+            fn (callable): Coroutine function making the upstream call
+
+        Returns:
+            tuple: (result, shared) where shared is True if this caller
+                reused another caller's in-flight result
+        """
+        call = self._calls.get(key)
+        if call is not None:
+            self.collapsed += 1
+            shared = True
+        else:
+            call = _AsyncCall(asyncio.ensure_future(fn()))
+            self._calls[key] = call
+            self.upstream_calls += 1
+            shared = False
+
+            def finished(task, call=call):
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                # Mark retrieved so a failure nobody awaited does not log a warning
+                if not task.cancelled():
+                    task.exception()
+
+            call.task.add_done_callback(finished)
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        except asyncio.CancelledError:
+            if call.waiters == 1 and not call.task.done():
+                call.task.cancel()
+            raise
+        finally:
+            call.waiters -= 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """
+        Get coalescing counters.
+
+        Returns:
+            dict: Upstream calls made, calls collapsed and calls in flight
+        """
+        return {
+            'upstream_calls': self.upstream_calls,
+            'collapsed': self.collapsed,
+            'in_flight': len(self._calls)
+        }
@@ -0,0 +1,134 @@
+"""
+Sentence chunking for pipelined speech.
+Streamed LLM text is cut into sentences (or clauses, for the first chunk and
+for run-on text) as it arrives, so speech can start on the first sentence
+while the rest of the answer is still being generated.
+"""
+import re
+from typing import Iterable, Iterator, List, Optional
+
+# Sentence ends must be followed by whitespace, so "3.14" and "e.g.," are not
+# cut mid-token and a trailing "." waits for the next delta to confirm it
+_SENTENCE_END = re.compile(r'[.!?…]+[)"\'\]]*(?=\s)|\n+')
+_CLAUSE_END = re.compile(r'[,;:–—](?=\s)')
+
+# Words whose trailing period does not end a sentence
+ABBREVIATIONS = {
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'sr', 'jr', 'st', 'vs', 'etc',
+    'e.g', 'i.e', 'approx', 'no', 'fig', 'inc', 'ltd', 'co'
+}
+
+
+class SentenceChunker:
+    """Incrementally splits streamed text into speakable chunks."""
+
+    def __init__(self, min_chars: int = 12, first_chunk_chars: int = 40, max_chars: int = 200):
+        """
+        Initialize the chunker.
+
+        Args:
+            min_chars (int): Shortest sentence emitted on its own; shorter
+                ones ("Sure.") are joined with the next
+            first_chunk_chars (int): Once this much text is buffered before
+                the first chunk, cut at a clause boundary to start audio early
+            max_chars (int): Longest chunk; run-on text is cut at the last
+                clause boundary or space
+        """
+        self.min_chars = min_chars
+        self.first_chunk_chars = first_chunk_chars
+        self.max_chars = max_chars
+        self.chunks_emitted = 0
+        self._buffer = ''
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Add streamed text.
+
+        Args:
+            text (str): Next delta
+
+        Returns:
+            list: Chunks completed by this delta (often empty)
+        """
+        self._buffer += text
+        chunks = []
+        while True:
+            cut = self._find_cut()
+            if cut is None:
+                break
+            chunk = self._buffer[:cut].strip()
+            self._buffer = self._buffer[cut:].lstrip()
+            if chunk:
+                chunks.append(chunk)
+                self.chunks_emitted += 1
+        return chunks
+
+    def flush(self) -> List[str]:
+        """
+        End of stream: return whatever text is still buffered.
+
+        Returns:
+            list: The final chunk, if any
+        """
+        chunk = self._buffer.strip()
+        self._buffer = ''
+        if not chunk:
+            return []
+        self.chunks_emitted += 1
+        return [chunk]
+
+    def _find_cut(self) -> Optional[int]:
+        """Index to cut the buffer at, or None to wait for more text."""
+        buffer = self._buffer
+        for match in _SENTENCE_END.finditer(buffer):
+            if len(buffer[:match.end()].strip()) < self.min_chars:
+                continue
+            if buffer[match.start()] == '.' and self._is_abbreviation(buffer, match.start()):
+                continue
+            return match.end()
+
+        if self.chunks_emitted == 0 and len(buffer) >= self.first_chunk_chars:
+            cut = self._last_clause_end(buffer)
+            if cut is not None:
+                return cut
+
+        if len(buffer) >= self.max_chars:
+            cut = self._last_clause_end(buffer[:self.max_chars])
+            if cut is None:
+                space = buffer.rfind(' ', 0, self.max_chars)
+                cut = space if space > 0 else self.max_chars
+            return cut
+        return None
+
+    def _last_clause_end(self, text: str) -> Optional[int]:
+        cut = None
+        for match in _CLAUSE_END.finditer(text):
+            if match.end() >= self.min_chars:
+                cut = match.end()
+        return cut
+
+    @staticmethod
+    def _is_abbreviation(text: str, period_index: int) -> bool:
+        words = text[:period_index].split()
+        if not words:
+            return False
+        word = words[-1].lstrip('("\'').lower()
+        # Single letters are initials ("J. R. R. Tolkien")
+        return word in ABBREVIATIONS or (len(word) == 1 and word.isalpha())
+
+
+def iter_sentences(deltas: Iterable[str], **kwargs) -> Iterator[str]:
+    """
+    Turn a stream of text deltas into a stream of speakable chunks.
+
+    Args:
+        deltas (Iterable): Text deltas (e.g. from process_stream)
+        **kwargs: SentenceChunker options
+
+    Yields:
+        str: Each chunk as soon as it is complete
+    """
+    chunker = SentenceChunker(**kwargs)
+    for delta in deltas:
+        yield from chunker.feed(delta)
+    yield from chunker.flush()
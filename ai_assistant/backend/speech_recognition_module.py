@@ -1,29 +1,189 @@
 """
 Speech-to-Text module using speech_recognition.
+The microphone stays open between requests and ambient-noise calibration
+runs in the background, so listening starts as soon as it is asked to.
+Continuous mode keeps capturing in the background and publishes transcripts
+as utterances finish.
 """
+import os
+import math
+import contextlib
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import speech_recognition as sr
 
+from audio_preprocess import get_audio_preprocessor
+from recognizer_backends import RecognitionRouter
+from mic_calibration import CalibrationManager
+from continuous_listening import AudioRingBuffer, TranscriptQueue, voiced_ms
+
+
+class _TapStream:
+    """Input stream wrapper that copies every frame it reads into a ring buffer."""
+
+    def __init__(self, stream, ring_buffer):
+        self.stream = stream
+        self.ring_buffer = ring_buffer
+
+    def read(self, size):
+        frame = self.stream.read(size)
+        self.ring_buffer.append(frame)
+        return frame
+
+
+class _ContinuousSource(sr.AudioSource):
+    """The warm microphone, held by listen_in_background while continuous mode runs."""
+
+    def __init__(self, module, generation):
+        self.module = module
+        self.generation = generation
+        self.SAMPLE_RATE = module.microphone.SAMPLE_RATE
+        self.SAMPLE_WIDTH = module.microphone.SAMPLE_WIDTH
+        self.CHUNK = module.microphone.CHUNK
+        self.stream = None
+        self._use = None
+
+    def __enter__(self):
+        module = self.module
+        module._mic_lock.acquire()
+        try:
+            self._use = module._warm_source()
+            source = self._use.__enter__()
+        except Exception:
+            module._mic_lock.release()
+            module._capture_ended(self.generation)
+            raise
+        self.stream = _TapStream(source.stream, module.ring_buffer)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream = None
+        try:
+            self._use.__exit__(exc_type, exc_value, traceback)
+        finally:
+            self.module._mic_lock.release()
+            self.module._capture_ended(self.generation)
+
 
 class SpeechRecognitionModule:
     """Handles speech-to-text conversion."""
-    
-    def __init__(self):
-        """Initialize the speech recognizer."""
+
+    def __init__(self, keep_open=None):
+        """
+        Initialize the speech recognizer.
+
+        Args:
+            keep_open (bool): Keep the input stream open between requests
+                (MIC_KEEP_OPEN, default true)
+        """
         self.recognizer = sr.Recognizer()
+        if keep_open is None:
+            keep_open = os.getenv('MIC_KEEP_OPEN', 'true').lower() in ('true', '1', 'yes')
+        self.keep_open = keep_open
+        self._source = None
+        self._mic_lock = threading.Lock()
+        self.listens = 0
+        self.last_listen_start_ms = None
+        self.last_preprocess = None
+
+        # Continuous mode
+        self.continuous_active = False
+        self.ring_buffer = None
+        self.transcripts = TranscriptQueue(int(os.getenv('CONTINUOUS_MAX_EVENTS', '100')))
+        self.min_speech_ms = float(os.getenv('CONTINUOUS_MIN_SPEECH_MS', '250'))
+        self.suppress = None
+        self.utterances = 0
+        self.dropped_noise = 0
+        self.suppressed = 0
+        self.recognition_times = []
+        self._state_lock = threading.Lock()
+        self._stop_listening = None
+        self._continuous_stopped = threading.Event()
+        self._continuous_generation = 0
+        self._recognition_pool = None
+        self._utterance_ids = itertools.count(1)
+
         try:
             self.microphone = sr.Microphone()
         except Exception as e:
             print(f"Warning: Microphone not available: {e}")
             self.microphone = None
-    
+
+        # Downmix/trim/resample before upload (None without NumPy or with STT_PREPROCESS=false)
+        self.preprocessor = get_audio_preprocessor()
+
+        # Google and/or a resident local model, chosen by STT_MODE
+        self.router = RecognitionRouter.from_env(self.recognizer)
+        self.router.warm_up()
+
+        self.calibration = CalibrationManager(self.recognizer, self._warm_source, self._mic_lock,
+                                              paused=lambda: self.continuous_active)
+        if self.microphone is not None:
+            self.calibration.start()
+
+    def _open_source(self):
+        """Return the open microphone source, opening it if needed (mic lock held)."""
+        if self._source is None:
+            source = self.microphone.__enter__()
+            if source.stream is None:
+                # Microphone.__enter__ swallows open errors
+                raise OSError("Could not open the microphone input stream")
+            self._source = source
+        self._set_streaming(True)
+        return self._source
+
+    @contextlib.contextmanager
+    def _warm_source(self):
+        """Use the open microphone for one capture (mic lock held)."""
+        broken = False
+        try:
+            yield self._open_source()
+        except (OSError, IOError):
+            broken = True  # Device vanished; reopen on the next use
+            raise
+        finally:
+            self._release_source(broken)
+
+    def _set_streaming(self, active):
+        """
+        Start or pause the open input stream.
+
+        A paused stream keeps the device open (the slow part) without
+        buffering stale audio between requests.
+        """
+        try:
+            stream = self._source.stream.pyaudio_stream
+            if active and stream.is_stopped():
+                stream.start_stream()
+            elif not active and not stream.is_stopped():
+                stream.stop_stream()
+        except Exception:
+            pass
+
+    def _release_source(self, broken=False):
+        """Pause the warm stream, or close it when not keeping it open (mic lock held)."""
+        if self._source is None:
+            return
+        if self.keep_open and not broken:
+            self._set_streaming(False)
+            return
+        try:
+            self.microphone.__exit__(None, None, None)
+        except Exception:
+            pass
+        self._source = None
+
     def listen(self, timeout=10, phrase_time_limit=5):
         """
         Listen for speech from microphone.
-        
+
         Args:
             timeout (int): Timeout for listening in seconds
             phrase_time_limit (int): Time limit for the phrase in seconds
-            
+
         Returns:
             str: Recognized text or None if not recognized
         """
@@ -31,20 +191,30 @@ class SpeechRecognitionModule:
             if not self.microphone:
                 print("Microphone not available")
                 return None
-            
-            with self.microphone as source:
-                # Adjust for ambient noise
-                self.recognizer.adjust_for_ambient_noise(source, duration=1)
+
+            if self.continuous_active:
+                # The background capture owns the microphone: wait for its next transcript
+                return self._next_transcript(timeout)
+
+            requested = time.perf_counter()
+            with self._mic_lock, self._warm_source() as source:
+                self.last_listen_start_ms = round((time.perf_counter() - requested) * 1000, 1)
                 print("Listening...")
                 audio = self.recognizer.listen(source, timeout=timeout, phrase_time_limit=phrase_time_limit)
-            
+            self.listens += 1
+
             # Recognize speech using Google Speech Recognition
-            text = self.recognizer.recognize_google(audio)
+            text = self._recognize(audio)
             print(f"You said: {text}")
+            self.calibration.report_success()
             return text
-        
-        except sr.UnknownValueValue:
+
+        except sr.WaitTimeoutError:
+            print("No speech detected")
+            return None
+        except sr.UnknownValueError:
             print("Could not understand audio")
+            self.calibration.report_failure()
             return None
         except sr.RequestError as e:
             print(f"Error with speech recognition service: {e}")
@@ -52,22 +222,264 @@ class SpeechRecognitionModule:
         except Exception as e:
             print(f"Error: {e}")
             return None
-    
+
+    def _recognize(self, audio, report=None):
+        """
+        Preprocess captured audio and recognize it with the configured backend(s).
+
+        Only a remote recognition the caller waited on feeds the upload
+        rate; local decoding uploads nothing. Its per-request savings are
+        kept in self.last_preprocess and, when given, report['preprocess'].
+
+        Args:
+            audio (sr.AudioData): Captured audio
+            report (dict): Result dict to add the savings to (optional)
+
+        Returns:
+            str: Transcript
+        """
+        if self.preprocessor is None:
+            return self.router.recognize(audio)
+        prepared = self.preprocessor.prepare_audio_data(audio)
+        upload = {}
+        try:
+            return self.router.recognize(prepared['audio'], upload)
+        finally:
+            if upload:
+                self.preprocessor.record_upload(upload['bytes_sent'], upload['upload_ms'])
+                if prepared['success']:
+                    self.last_preprocess = {k: v for k, v in prepared.items()
+                                            if k not in ('audio', 'success', 'error')}
+                    if report is not None:
+                        report['preprocess'] = self.last_preprocess
+
+    def _next_transcript(self, timeout):
+        """Wait for the next recognized utterance from continuous mode."""
+        seq = self.transcripts.last_seq
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.continuous_active:
+                return None
+            # Wake up every second to notice a capture thread that has died
+            for event in self.transcripts.after(seq, min(remaining, 1)):
+                seq = event['seq']
+                if event.get('text'):
+                    return event['text']
+
+    def start_continuous(self, phrase_time_limit=None, suppress=None):
+        """
+        Start capturing in the background.
+
+        listen_in_background segments the stream into utterances by
+        energy; each one passes an energy (VAD) gate and is then
+        recognized on a worker pool, and its transcript is published to
+        self.transcripts. The last CONTINUOUS_BUFFER_SECONDS of audio are
+        kept in self.ring_buffer.
+
+        Args:
+            phrase_time_limit (float): Longest utterance in seconds
+                (CONTINUOUS_PHRASE_LIMIT, default 15)
+            suppress (callable): Returns True while utterances should be
+                ignored, e.g. while the assistant itself is speaking
+
+        Returns:
+            bool: True if continuous mode is running
+
+        Raises:
+            ValueError: If phrase_time_limit is not a positive number
+        """
+        if phrase_time_limit is not None and (
+                isinstance(phrase_time_limit, bool) or not isinstance(phrase_time_limit, (int, float))
+                or not phrase_time_limit > 0 or math.isinf(phrase_time_limit)):
+            raise ValueError('"phrase_time_limit" must be a positive number of seconds.')
+        if not self.microphone:
+            print("Microphone not available")
+            return False
+        with self._state_lock:
+            if self.continuous_active:
+                return True
+            self.suppress = suppress
+            self.ring_buffer = AudioRingBuffer(
+                float(os.getenv('CONTINUOUS_BUFFER_SECONDS', '30')),
+                self.microphone.SAMPLE_RATE,
+                self.microphone.SAMPLE_WIDTH,
+                self.microphone.CHUNK
+            )
+            self._recognition_pool = ThreadPoolExecutor(
+                max_workers=int(os.getenv('CONTINUOUS_WORKERS', '2')),
+                thread_name_prefix='stt'
+            )
+            self._continuous_stopped.clear()
+            self._continuous_generation += 1
+            self._stop_listening = self.recognizer.listen_in_background(
+                _ContinuousSource(self, self._continuous_generation),
+                self._on_utterance,
+                phrase_time_limit=phrase_time_limit or float(os.getenv('CONTINUOUS_PHRASE_LIMIT', '15'))
+            )
+            self.continuous_active = True
+        print("Continuous listening started")
+        return True
+
+    def stop_continuous(self, timeout=5):
+        """
+        Stop background capture and release the microphone.
+
+        Args:
+            timeout (float): Seconds to wait for the capture thread to let go
+
+        Returns:
+            bool: True if continuous mode was running
+        """
+        with self._state_lock:
+            if not self.continuous_active:
+                return False
+            self.continuous_active = False
+            stop_listening, self._stop_listening = self._stop_listening, None
+            pool, self._recognition_pool = self._recognition_pool, None
+        # wait_for_stop=True may only be used from the starting thread
+        stop_listening(wait_for_stop=False)
+        self._continuous_stopped.wait(timeout)
+        pool.shutdown(wait=False)
+        self.calibration.resume()
+        print("Continuous listening stopped")
+        return True
+
+    def _capture_ended(self, generation):
+        """
+        Called by the capture thread as it exits.
+
+        After stop_continuous this only signals that the microphone is
+        free. If the thread died on its own (the microphone failed to
+        open, the device went away, the callback raised), continuous
+        mode is marked inactive so status reports, listen() and
+        start_continuous() see it has ended.
+        """
+        pool = None
+        with self._state_lock:
+            if self.continuous_active and generation == self._continuous_generation:
+                self.continuous_active = False
+                self._stop_listening = None
+                pool, self._recognition_pool = self._recognition_pool, None
+        self._continuous_stopped.set()
+        if pool is not None:
+            pool.shutdown(wait=False)
+            self.calibration.resume()
+            print("Continuous listening ended unexpectedly")
+
+    def _on_utterance(self, recognizer, audio):
+        """listen_in_background callback: gate the utterance and queue it for recognition."""
+        captured_at = time.time()
+        if self.suppress is not None and self.suppress():
+            self.suppressed += 1
+            return
+        speech_ms = voiced_ms(audio.frame_data, audio.sample_rate, audio.sample_width,
+                              self.recognizer.energy_threshold)
+        if speech_ms < self.min_speech_ms:
+            self.dropped_noise += 1
+            return
+        pool = self._recognition_pool
+        if pool is None:
+            return
+        self.utterances += 1
+        pool.submit(self._recognize_utterance, next(self._utterance_ids), audio, captured_at, speech_ms)
+
+    def _recognize_utterance(self, utterance_id, audio, captured_at, speech_ms):
+        """Recognize one utterance on the worker pool and publish the transcript."""
+        start = time.perf_counter()
+        event = {
+            'utterance': utterance_id,
+            'captured_at': captured_at,
+            'duration_s': round(len(audio.frame_data) / (audio.sample_rate * audio.sample_width), 2),
+            'speech_ms': speech_ms
+        }
+        try:
+            event['text'] = self._recognize(audio, event)
+            self.calibration.report_success()
+        except sr.UnknownValueError:
+            self.calibration.report_failure()
+            return
+        except sr.RequestError as e:
+            event['text'] = None
+            event['error'] = f"Error with speech recognition service: {e}"
+        event['recognition_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        self.recognition_times = (self.recognition_times + [event['recognition_ms']])[-100:]
+        self.transcripts.publish(event)
+
+    def recent_audio(self, seconds=None):
+        """
+        Get recently captured audio from the continuous-mode ring buffer.
+
+        Args:
+            seconds (float): How much to return (everything buffered if None)
+
+        Returns:
+            sr.AudioData: Audio, or None if continuous mode never ran
+        """
+        if self.ring_buffer is None:
+            return None
+        return sr.AudioData(self.ring_buffer.recent(seconds), self.ring_buffer.sample_rate,
+                            self.ring_buffer.sample_width)
+
+    def recalibrate(self):
+        """Recalibrate ambient noise now (waits for the microphone; False during continuous mode)."""
+        return self.calibration.calibrate(blocking=True)
+
+    def close(self):
+        """Stop continuous mode and background calibration, and close the microphone."""
+        self.stop_continuous()
+        self.calibration.stop()
+        self.router.close()
+        with self._mic_lock:
+            self.keep_open = False
+            self._release_source()
+
+    def get_stats(self):
+        """
+        Get microphone and calibration state.
+
+        Returns:
+            dict: Whether the stream is warm, listen count, time from
+                request to listening (ms), calibration stats,
+                continuous-mode counters, preprocessing savings (overall
+                and for the last uploaded utterance) and recognizer backend stats
+        """
+        times = self.recognition_times
+        return {
+            'microphone': self.microphone is not None,
+            'warm': self._source is not None,
+            'listens': self.listens,
+            'last_listen_start_ms': self.last_listen_start_ms,
+            'calibration': self.calibration.get_stats(),
+            'continuous': {
+                'active': self.continuous_active,
+                'utterances': self.utterances,
+                'dropped_noise': self.dropped_noise,
+                'suppressed': self.suppressed,
+                'last_seq': self.transcripts.last_seq,
+                'avg_recognition_ms': round(sum(times) / len(times), 1) if times else None,
+                'ring_buffer': self.ring_buffer.get_stats() if self.ring_buffer is not None else None
+            },
+            'preprocess': self.preprocessor.get_stats() if self.preprocessor else None,
+            'last_preprocess': self.last_preprocess,
+            'recognition': self.router.get_stats()
+        }
+
     def listen_from_file(self, filepath):
         """
         Recognize speech from an audio file.
-        
+
         Args:
             filepath (str): Path to audio file
-            
+
         Returns:
             str: Recognized text or None if not recognized
         """
         try:
             with sr.AudioFile(filepath) as source:
                 audio = self.recognizer.record(source)
-            
-            text = self.recognizer.recognize_google(audio)
+
+            text = self._recognize(audio)
             return text
         except sr.UnknownValueError:
             print("Could not understand audio")
@@ -0,0 +1,73 @@
+"""
+Helpers for Server-Sent-Events streams.
+Parses OpenAI-compatible streaming chunks from providers and formats
+events for the browser.
+"""
+import json
+from typing import Iterable, Iterator, Optional, Tuple
+
+
+def parse_sse_line(line) -> Tuple[bool, Optional[str]]:
+    """
+    Parse one line of an OpenAI-compatible chat completion stream.
+
+    Args:
+        line (str | bytes): Raw line from the response body
+
+    Returns:
+        tuple: (done, delta) where done is True on the [DONE] marker and
+            delta is the new text, or None if the line carries no text
+    """
+    if isinstance(line, bytes):
+        line = line.decode('utf-8', errors='replace')
+    line = line.strip()
+
+    if not line.startswith('data:'):
+        return False, None
+
+    data = line[5:].strip()
+    if data == '[DONE]':
+        return True, None
+
+    try:
+        chunk = json.loads(data)
+        delta = chunk['choices'][0].get('delta', {})
+        return False, delta.get('content') or None
+    except (ValueError, KeyError, IndexError, TypeError):
+        return False, None
+
+
+def iter_sse_deltas(lines: Iterable) -> Iterator[str]:
+    """
+    Yield text deltas from an iterable of SSE lines until [DONE].
+
+    Args:
+        lines (Iterable): Lines of the streamed response body
+
+    Yields:
+        str: Each non-empty text delta
+    """
+    for line in lines:
+        done, delta = parse_sse_line(line)
+        if done:
+            return
+        if delta:
+            yield delta
+
+
+def format_sse(data: dict, event: str = None) -> str:
+    """
+    Format a dict as a Server-Sent Event.
+
+    Args:
+        data (dict): JSON-serializable payload
+        event (str): Optional event name
+
+    Returns:
+        str: Encoded event ready to write to the client
+    """
+    message = ''
+    if event:
+        message += f'event: {event}\n'
+    message += f'data: {json.dumps(data)}\n\n'
+    return message
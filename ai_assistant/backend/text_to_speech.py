@@ -1,174 +1,569 @@
 """
 Text-to-Speech module using pyttsx3.
+One long-lived worker thread owns a single engine and speaks items from a
+bounded priority queue, so responses never pay for engine start-up and
+new speech can replace stale items or interrupt the current one.
+Phrases marked cacheable are rendered to WAV once and replayed from the
+audio cache afterwards, and streamed responses are spoken sentence by
+sentence while the rest is still being generated.
 """
-import pyttsx3
+import os
+import heapq
+import itertools
+import tempfile
 import threading
 import time
+from collections import deque
+
+import pyttsx3
+
+from audio_cache import AudioCache, get_audio_cache, play_wav, stop_wav
+from speech_pipeline import SentenceChunker
+
+# Speech priorities (higher is spoken first)
+PRIORITY_LOW = 0
+PRIORITY_NORMAL = 1
+PRIORITY_HIGH = 2
+
+
+class SpeechItem:
+    """One queued utterance."""
+
+    def __init__(self, text, priority=PRIORITY_NORMAL, key=None, cache=False, render_only=False):
+        self.text = text
+        self.priority = priority
+        self.key = key
+        self.cache = cache
+        self.render_only = render_only
+        self.path = None  # Rendered audio file, when cached or rendered
+        self.cached = False
+        self.cancelled = False
+        self.interrupted = False
+        self.created = time.perf_counter()
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Block until the item has been spoken, dropped or interrupted."""
+        return self.done.wait(timeout)
+
+
+class SpeechStream(SpeechItem):
+    """
+    An utterance whose text arrives in pieces (e.g. from a streaming LLM).
+
+    The producer feeds deltas and closes the stream; the speech worker
+    speaks each sentence as soon as the chunker completes it.
+    """
+
+    def __init__(self, priority=PRIORITY_NORMAL, key=None, chunker=None):
+        super().__init__('', priority, key)
+        self.chunker = chunker or SentenceChunker()
+        self.closed = False
+        self._chunks = deque()
+        self._ready = threading.Condition()
+
+    def feed(self, delta):
+        """Add streamed text (ignored once the stream is closed or stopped)."""
+        if not delta:
+            return
+        with self._ready:
+            if self.closed or self.cancelled or self.interrupted:
+                return
+            self.text += delta
+            self._chunks.extend(self.chunker.feed(delta))
+            self._ready.notify()
+
+    def close(self):
+        """Mark the end of the text; the buffered remainder is spoken last."""
+        with self._ready:
+            if self.closed:
+                return
+            self.closed = True
+            self._chunks.extend(self.chunker.flush())
+            self._ready.notify()
+
+    def wake(self):
+        """Release a worker waiting for text (after cancel or interrupt)."""
+        with self._ready:
+            self._ready.notify_all()
+
+    def next_chunk(self, timeout=None):
+        """
+        Wait for the next sentence.
+
+        Returns:
+            str: Next chunk, or None when the stream ended, was stopped or
+                stayed idle for timeout seconds
+        """
+        with self._ready:
+            self._ready.wait_for(
+                lambda: self._chunks or self.closed or self.cancelled or self.interrupted,
+                timeout
+            )
+            if self._chunks and not (self.cancelled or self.interrupted):
+                return self._chunks.popleft()
+            return None
 
 
 class TextToSpeech:
     """Handles text-to-speech conversion."""
-    
-    def __init__(self):
-        """Initialize the text-to-speech engine."""
+
+    def __init__(self, max_queue=None, audio_cache=None):
+        """
+        Initialize the text-to-speech engine and start the speech worker.
+
+        Args:
+            max_queue (int): Max utterances waiting to be spoken (TTS_MAX_QUEUE, default 8)
+            audio_cache (AudioCache): Rendered-audio cache (defaults to the shared one)
+        """
         self.voice_index = 0
         self.rate = 150
         self.volume = 0.9
         self.available_voices = []
-        self._get_available_voices()
-    
-    def _get_available_voices(self):
-        """Get list of available voices."""
+        self.max_queue = max_queue or int(os.getenv('TTS_MAX_QUEUE', '8'))
+        self.stream_idle_timeout = float(os.getenv('TTS_STREAM_IDLE_TIMEOUT', '30'))
+        self.audio_cache = audio_cache if audio_cache is not None else get_audio_cache()
+
+        self._heap = []  # (-priority, seq, item)
+        self._pending = 0
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._engine = None
+        self._current = None
+        self._settings_dirty = True
+        self._applied = ('default', self.rate, self.volume)  # voice id, rate, volume in the engine
+        self._stop_playback = threading.Event()
+        self._running = True
+
+        self.spoken = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.interrupted = 0
+        self.rendered = 0
+        self.played_from_cache = 0
+        self.synthesis_times = deque(maxlen=100)
+        self.first_audio_times = deque(maxlen=100)
+
+        self._voices_ready = threading.Event()
+        self._worker = threading.Thread(target=self._run, name='tts-worker', daemon=True)
+        self._worker.start()
+        # Voices come from the worker's engine; wait briefly so callers can list them
+        self._voices_ready.wait(timeout=5)
+
+    def _init_engine(self):
+        """Create the worker's engine (called on the worker thread only)."""
         try:
-            engine = pyttsx3.init()
-            voices = engine.getProperty('voices')
-            self.available_voices = []
-            for i, voice in enumerate(voices):
-                self.available_voices.append({
-                    'id': voice.id,
-                    'name': voice.name,
-                    'index': i
-                })
-            engine.stop()
-            del engine
+            self._engine = pyttsx3.init()
+            voices = self._engine.getProperty('voices')
+            self.available_voices = [
+                {'id': voice.id, 'name': voice.name, 'index': i}
+                for i, voice in enumerate(voices)
+            ]
+            self._settings_dirty = True
             print(f"Available voices: {[v['name'] for v in self.available_voices]}")
         except Exception as e:
+            self._engine = None
             print(f"Error getting voices: {e}")
-    
-    def speak(self, text):
+        finally:
+            self._voices_ready.set()
+
+    def _apply_settings(self):
+        """Push changed rate/volume/voice to the live engine."""
+        with self._cond:
+            if not self._settings_dirty:
+                return
+            self._settings_dirty = False
+            rate, volume, voice_index = self.rate, self.volume, self.voice_index
+
+        self._engine.setProperty('rate', rate)
+        self._engine.setProperty('volume', volume)
+        voice_id = 'default'
+        if self.available_voices and voice_index < len(self.available_voices):
+            try:
+                self._engine.setProperty('voice', self.available_voices[voice_index]['id'])
+                voice_id = self.available_voices[voice_index]['id']
+            except Exception as e:
+                print(f"Error setting voice: {e}")
+        self._applied = (voice_id, rate, volume)
+
+    def cache_key(self, text):
+        """Audio cache key for text in the engine's current voice settings."""
+        voice_id, rate, volume = self._applied
+        return AudioCache.make_key(text, voice_id, rate, volume, 'pyttsx3')
+
+    def _render(self, text, key=None):
         """
-        Convert text to speech and play it.
-        
-        Args:
-            text (str): Text to convert to speech
+        Render text to a WAV file with save_to_file (worker thread only).
+
+        Returns:
+            str: Rendered file (moved into the audio cache when key is given),
+                or None if the driver wrote nothing
         """
-        if not text or not text.strip():
+        if self.audio_cache is not None:
+            path = self.audio_cache.temp_path()
+        else:
+            fd, path = tempfile.mkstemp(suffix='.wav')
+            os.close(fd)
+        self._engine.save_to_file(text, path)
+        self._engine.runAndWait()
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            if os.path.exists(path):
+                os.remove(path)
+            return None
+        self.rendered += 1
+        if key is not None and self.audio_cache is not None:
+            path = self.audio_cache.put_file(key, path)
+        return path
+
+    def _mark_first_audio(self, item):
+        """Record how long the item waited before its first audio."""
+        self.first_audio_times.append(time.perf_counter() - item.created)
+
+    def _say_stream(self, stream):
+        """Speak a stream sentence by sentence as its text arrives."""
+        first = True
+        while not stream.interrupted:
+            chunk = stream.next_chunk(self.stream_idle_timeout)
+            if chunk is None:
+                break
+            if first:
+                self._mark_first_audio(stream)
+                first = False
+            self._engine.say(chunk)
+            self._engine.runAndWait()
+
+    def _say(self, item):
+        """Speak or render one item, going through the audio cache when asked."""
+        if isinstance(item, SpeechStream):
+            self._say_stream(item)
             return
-        
-        try:
-            # Create a fresh engine for each speech
-            engine = pyttsx3.init()
-            engine.setProperty('rate', self.rate)
-            engine.setProperty('volume', self.volume)
-            
-            # Set the voice
-            if self.available_voices and self.voice_index < len(self.available_voices):
-                try:
-                    voice_id = self.available_voices[self.voice_index]['id']
-                    engine.setProperty('voice', voice_id)
-                except Exception as e:
-                    print(f"Error setting voice: {e}")
-            
-            print(f"Speaking with voice index {self.voice_index}...", flush=True)
-            engine.say(text)
-            engine.runAndWait()
-            
-            # Ensure engine is stopped
-            engine.stop()
-            
-            # Small delay to ensure audio finishes
-            time.sleep(0.5)
-            
-            # Clean up
-            del engine
-            print(f"✓ Speech completed", flush=True)
-            
-        except Exception as e:
-            print(f"❌ Error in text-to-speech: {e}", flush=True)
-    
-    def set_rate(self, rate):
+        if item.cache or item.render_only:
+            key = self.cache_key(item.text) if self.audio_cache is not None else None
+            path = self.audio_cache.get(key) if key is not None else None
+            if path is not None:
+                item.cached = True
+            else:
+                path = self._render(item.text, key)
+            item.path = path
+            if item.render_only or item.interrupted:
+                return
+            self._mark_first_audio(item)
+            if path is not None and play_wav(path, self._stop_playback):
+                if item.cached:
+                    self.played_from_cache += 1
+                return
+        else:
+            self._mark_first_audio(item)
+        self._engine.say(item.text)
+        self._engine.runAndWait()
+
+    def _next_item(self):
+        """Wait for the highest-priority live item (None on shutdown)."""
+        with self._cond:
+            while self._running:
+                while self._heap:
+                    _, _, item = heapq.heappop(self._heap)
+                    if not item.cancelled:
+                        self._pending -= 1
+                        self._current = item
+                        return item
+                self._cond.wait()
+            return None
+
+    def _run(self):
+        """Speech worker loop: one engine, one utterance at a time."""
+        self._init_engine()
+
+        while True:
+            item = self._next_item()
+            if item is None:
+                break
+
+            try:
+                if self._engine is None:
+                    self._init_engine()
+                if self._engine is not None:
+                    self._apply_settings()
+                    self._stop_playback.clear()
+                    start = time.perf_counter()
+                    self._say(item)
+                    if not item.interrupted and not item.render_only:
+                        self.synthesis_times.append(time.perf_counter() - start)
+                        self.spoken += 1
+            except Exception as e:
+                print(f"❌ Error in text-to-speech: {e}", flush=True)
+                # Rebuild the engine on the next utterance
+                self._engine = None
+            finally:
+                with self._cond:
+                    self._current = None
+                    abandoned = item.render_only and item.cancelled
+                    item.done.set()
+                if abandoned and item.path is not None and self.audio_cache is None:
+                    # Nobody will stream this temporary render
+                    try:
+                        os.remove(item.path)
+                    except OSError:
+                        pass
+
+    def speak(self, text, priority=PRIORITY_NORMAL, key=None, interrupt=False, wait=False,
+              cache=False):
         """
-        Set speech rate.
-        
+        Queue text to be spoken.
+
         Args:
-            rate (int): Speech rate (50-300, default 150)
+            text (str): Text to convert to speech
+            priority (int): PRIORITY_LOW, PRIORITY_NORMAL or PRIORITY_HIGH
+            key (str): Coalescing key; a queued item with the same key is
+                stale and gets replaced (e.g. 'response')
+            interrupt (bool): Barge in: drop queued speech of equal or lower
+                priority and stop the current utterance
+            wait (bool): Block until the text has been spoken
+            cache (bool): Play from the audio cache, rendering it there first on
+                a miss; worth it for repeated phrases (greetings, errors,
+                local answers), not for one-off LLM responses
+
+        Returns:
+            SpeechItem: Handle for the queued utterance (None for empty text)
         """
-        try:
-            self.rate = max(50, min(300, rate))
-            print(f"Rate set to: {self.rate}", flush=True)
-        except Exception as e:
-            print(f"Error setting rate: {e}")
-    
-    def set_volume(self, volume):
+        if not text or not text.strip():
+            return None
+        return self._enqueue(SpeechItem(text, priority, key, cache=cache), interrupt, wait)
+
+    def speak_stream(self, priority=PRIORITY_NORMAL, key=None, interrupt=False, chunker=None):
         """
-        Set speech volume.
-        
+        Open an utterance that is spoken while its text is still arriving.
+
+        Feed it LLM deltas and close it when generation ends; speech starts
+        as soon as the first sentence is complete rather than after the
+        whole response.
+
         Args:
-            volume (float): Volume level (0-1)
+            priority (int): PRIORITY_LOW, PRIORITY_NORMAL or PRIORITY_HIGH
+            key (str): Coalescing key (see speak)
+            interrupt (bool): Barge in (see speak)
+            chunker (SentenceChunker): Custom sentence splitting (optional)
+
+        Returns:
+            SpeechStream: Handle to feed() and close()
         """
-        try:
-            self.volume = max(0, min(1, float(volume)))
-            print(f"Volume set to: {self.volume}", flush=True)
-        except Exception as e:
-            print(f"Error setting volume: {e}")
-    
-    def set_voice(self, voice_index=0):
+        return self._enqueue(SpeechStream(priority, key, chunker), interrupt, False)
+
+    def render(self, text, priority=PRIORITY_NORMAL, wait=True):
         """
-        Set the voice for speech.
-        
+        Render text to a WAV file without playing it.
+
+        The file comes from the audio cache when the phrase was rendered
+        before in the same voice settings.
+
         Args:
-            voice_index (int): Voice index from available voices
+            text (str): Text to render
+            priority (int): Queue priority of the render job
+            wait (bool): Block until the file is written
+
+        Returns:
+            SpeechItem: Handle whose path is the WAV file (None for empty
+                text; path stays None if rendering failed or was dropped)
         """
-        try:
-            if 0 <= voice_index < len(self.available_voices):
-                self.voice_index = voice_index
-                print(f"Voice set to: {self.available_voices[voice_index]['name']}", flush=True)
-        except Exception as e:
-            print(f"Error setting voice: {e}")
-    
-    def get_available_voices(self):
+        if not text or not text.strip():
+            return None
+        return self._enqueue(SpeechItem(text, priority, render_only=True), False, wait)
+
+    def _enqueue(self, item, interrupt, wait):
+        """Put an item on the worker's queue, applying barge-in, coalescing and the size bound."""
+        priority, key = item.priority, item.key
+        with self._cond:
+            if interrupt:
+                self._cancel_queued(lambda queued: queued.priority <= priority)
+                self._interrupt_current()
+            elif key is not None:
+                self.coalesced += self._cancel_queued(lambda queued: queued.key == key)
+
+            if self._pending >= self.max_queue and not self._evict_for(item):
+                self.dropped += 1
+                item.cancelled = True
+                item.done.set()
+                return item
+
+            if len(self._heap) > 4 * self.max_queue:
+                # Compact cancelled entries the worker has not popped yet
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+            heapq.heappush(self._heap, (-priority, next(self._seq), item))
+            self._pending += 1
+            self._cond.notify()
+
+        if wait:
+            item.wait()
+        return item
+
+    def _cancel_queued(self, predicate):
+        """Cancel queued items matching predicate (lock held); returns the count."""
+        count = 0
+        for _, _, queued in self._heap:
+            if not queued.cancelled and predicate(queued):
+                queued.cancelled = True
+                queued.done.set()
+                count += 1
+                if isinstance(queued, SpeechStream):
+                    queued.wake()
+        self._pending -= count
+        return count
+
+    def _evict_for(self, item):
+        """Make room for item by dropping the oldest lowest-priority entry (lock held)."""
+        live = [entry for entry in self._heap if not entry[2].cancelled]
+        if not live:
+            return True
+        # Largest -priority is the lowest priority; among those, the oldest
+        victim = max(live, key=lambda entry: (entry[0], -entry[1]))
+        if -victim[0] > item.priority:
+            return False
+        victim[2].cancelled = True
+        victim[2].done.set()
+        if isinstance(victim[2], SpeechStream):
+            victim[2].wake()
+        self._pending -= 1
+        self.dropped += 1
+        return True
+
+    def _interrupt_current(self):
+        """Stop the utterance being spoken (lock held)."""
+        if self._current is not None and self._engine is not None:
+            self._current.interrupted = True
+            self.interrupted += 1
+            self._stop_playback.set()
+            if isinstance(self._current, SpeechStream):
+                self._current.wake()
+            try:
+                self._engine.stop()
+                stop_wav()
+            except Exception as e:
+                print(f"Error interrupting speech: {e}")
+
+    def is_speaking(self):
+        """True while an utterance is being played (renders do not count)."""
+        current = self._current
+        return current is not None and not current.render_only
+
+    def cancel(self, item):
         """
-        Get list of available voices.
-        
+        Give up on an item without touching the rest of the queue.
+
+        A queued item is dropped; a render already in progress finishes
+        and its temporary file is discarded. An item that has already
+        finished is left alone.
+
+        Args:
+            item (SpeechItem): Handle returned by say() or render()
+
         Returns:
-            list: List of available voice dictionaries
+            bool: True if the item was cancelled, False if it had finished
         """
-        return self.available_voices
+        with self._cond:
+            if item.done.is_set():
+                return False
+            if not self._cancel_queued(lambda queued: queued is item):
+                item.cancelled = True
+        return True
+
+    def stop(self):
+        """Barge in: clear all queued speech and stop the current utterance."""
+        with self._cond:
+            self._cancel_queued(lambda queued: True)
+            self._interrupt_current()
+
+    def shutdown(self):
+        """Stop speaking and end the worker thread."""
+        self.stop()
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._worker.join(timeout=2)
 
-    
     def set_rate(self, rate):
         """
         Set speech rate.
-        
+
         Args:
             rate (int): Speech rate (50-300, default 150)
         """
         try:
-            self.rate = max(50, min(300, rate))
+            with self._cond:
+                self.rate = max(50, min(300, rate))
+                self._settings_dirty = True
+            print(f"Rate set to: {self.rate}", flush=True)
         except Exception as e:
             print(f"Error setting rate: {e}")
-    
+
     def set_volume(self, volume):
         """
         Set speech volume.
-        
+
         Args:
             volume (float): Volume level (0-1)
         """
         try:
-            self.volume = max(0, min(1, float(volume)))
+            with self._cond:
+                self.volume = max(0, min(1, float(volume)))
+                self._settings_dirty = True
+            print(f"Volume set to: {self.volume}", flush=True)
         except Exception as e:
             print(f"Error setting volume: {e}")
-    
+
     def set_voice(self, voice_index=0):
         """
         Set the voice for speech.
-        
+
         Args:
             voice_index (int): Voice index from available voices
         """
         try:
             if 0 <= voice_index < len(self.available_voices):
-                self.voice_index = voice_index
-                print(f"Voice set to: {self.available_voices[voice_index]['name']}")
+                with self._cond:
+                    self.voice_index = voice_index
+                    self._settings_dirty = True
+                print(f"Voice set to: {self.available_voices[voice_index]['name']}", flush=True)
         except Exception as e:
             print(f"Error setting voice: {e}")
-    
+
     def get_available_voices(self):
         """
         Get list of available voices.
-        
+
         Returns:
             list: List of available voice dictionaries
         """
         return self.available_voices
+
+    def get_stats(self):
+        """
+        Get speech queue and timing stats.
+
+        Returns:
+            dict: Queue depth, whether speech is playing, counters,
+                per-utterance synthesis time (last/avg/p95 in ms), time to
+                first audio (last/avg in ms) and audio cache stats
+        """
+        with self._cond:
+            times = sorted(self.synthesis_times)
+            last = self.synthesis_times[-1] if self.synthesis_times else None
+            first_audio = list(self.first_audio_times)
+            return {
+                'engine_ready': self._engine is not None,
+                'queue_depth': self._pending,
+                'max_queue': self.max_queue,
+                'speaking': self._current is not None,
+                'spoken': self.spoken,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'interrupted': self.interrupted,
+                'rendered': self.rendered,
+                'played_from_cache': self.played_from_cache,
+                'audio_cache': self.audio_cache.get_stats() if self.audio_cache is not None else None,
+                'last_synthesis_ms': round(last * 1000, 1) if last is not None else None,
+                'avg_synthesis_ms': round(sum(times) / len(times) * 1000, 1) if times else None,
+                'p95_synthesis_ms': round(times[int(0.95 * (len(times) - 1))] * 1000, 1) if times else None,
+                'last_first_audio_ms': round(first_audio[-1] * 1000, 1) if first_audio else None,
+                'avg_first_audio_ms': round(sum(first_audio) / len(first_audio) * 1000, 1) if first_audio else None
+            }
@@ -5,7 +5,6 @@ This file exports a 'handler' function for Vercel's Python runtime.
 import os
 import sys
 import json
-import threading
 
 # ----------------------------------------------------------------------------
 # PATH CORRECTION for dependent modules
@@ -17,13 +16,24 @@ if backend_path not in sys.path:
     sys.path.insert(0, backend_path)
 # ----------------------------------------------------------------------------
 
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 # --- The rest of your application code ---
 
 from free_api_processor import FreeAPIProcessor
+from provider_router import ProviderRouter
+from http_pool import get_session_pool
+from circuit_breaker import get_circuit_breaker_stats
+from rate_limiter import get_rate_limit_stats
+from conversation_store import (ConversationStore, SESSION_COOKIE, SESSION_HEADER,
+                                new_session_id, valid_session_id)
+from local_intents import LocalIntentHandler
+from response_cache import get_response_cache
+from stream_utils import format_sse
+from batch_processing import parse_batch_request
+from audio_delivery import SpeechAudioSource, audio_url, get_tts_delivery
 from text_to_speech import TextToSpeech
 
 # Try to import speech recognition, but don't fail if it's not available
@@ -44,39 +54,109 @@ frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'a
 
 # Initialize Flask app with static folder configuration
 app = Flask(__name__, static_folder=frontend_path, static_url_path='')
-CORS(app)
+CORS(app, expose_headers=[SESSION_HEADER])
 
 # Initialize components
 api_provider = os.getenv('API_PROVIDER', 'groq')
 api_key = os.getenv('FREE_API_KEY', '')
 
+# Comma-separated list (e.g. groq,together) routes across several providers
+api_providers = [p.strip() for p in os.getenv('API_PROVIDERS', '').split(',') if p.strip()]
+
 try:
-    api_processor = FreeAPIProcessor(api_key=api_key, api_provider=api_provider)
+    if len(api_providers) > 1:
+        api_processor = ProviderRouter.from_env(api_providers)
+    else:
+        api_processor = FreeAPIProcessor(api_key=api_key, api_provider=api_provider)
 except ValueError as e:
     print(f"Warning: API not configured: {e}")
     api_processor = None
 
 tts = TextToSpeech()
+audio_source = SpeechAudioSource.from_env(tts)
+# Serverless instances have no speakers: return audio URLs unless TTS_DELIVERY=local
+tts_delivery = get_tts_delivery('url')
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes read per step when relaying /api/transcribe uploads
 speech_recognizer = SpeechRecognitionModule() if SPEECH_RECOGNITION_AVAILABLE else None
 
-# Track conversation state
-conversation_history = []
+# Track conversation state per client session (history ring buffer + LLM context)
+conversations = ConversationStore()
+local_intents = LocalIntentHandler()
 auto_speak_enabled = True
-active_threads = []
 
 
-def speak_response(text):
-    """Speak the response in a separate thread."""
+def current_session():
+    """
+    Get the requesting client's conversation session.
+
+    The id comes from the X-Session-ID header or the session cookie; a
+    client without one gets a new session, and the cookie is set on the
+    response. Sessions live in this instance's memory.
+    """
+    session_id = request.headers.get(SESSION_HEADER) or request.cookies.get(SESSION_COOKIE)
+    if not valid_session_id(session_id):
+        session_id = g.get('new_session_id') or new_session_id()
+        g.new_session_id = session_id
+    return conversations.get(session_id)
+
+
+@app.after_request
+def set_session_cookie(response):
+    """Hand a newly created session id back to the client."""
+    session_id = g.get('new_session_id')
+    if session_id:
+        response.set_cookie(SESSION_COOKIE, session_id, max_age=int(conversations.idle_ttl),
+                            httponly=True, samesite='Lax')
+        response.headers[SESSION_HEADER] = session_id
+    return response
+
+
+def speak_response(text, cache=False):
+    """
+    Queue the response on the speech worker (returns immediately).
+
+    Repeated phrases (local answers, errors) pass cache=True so they are
+    played from the rendered-audio cache after the first time.
+    """
     try:
         if auto_speak_enabled:
             text_preview = text[:50].replace('\n', ' ')
             print(f"🎤 Speaking: {text_preview}...", flush=True)
-            tts.speak(text)
-            print(f"✓ Speech completed", flush=True)
+            tts.speak(text, key='response', cache=cache)
     except Exception as e:
         print(f"❌ Error speaking response: {e}", flush=True)
 
 
+def deliver_response_audio(text, cache=False, delivery=None):
+    """
+    Voice a response: speak it locally, or return an audio URL.
+
+    Returns:
+        str: /api/tts/audio URL for 'url' delivery, else None
+    """
+    if (delivery or tts_delivery) == 'url':
+        return audio_url(text)
+    speak_response(text, cache=cache)
+    return None
+
+
+def start_speech_stream(delivery=None):
+    """
+    Open a sentence-pipelined utterance for a streamed response.
+
+    Speech starts on the first complete sentence while the LLM is still
+    generating the rest. Returns None when auto speak is off or the
+    response is delivered as an audio URL.
+    """
+    if not auto_speak_enabled or (delivery or tts_delivery) == 'url':
+        return None
+    try:
+        return tts.speak_stream(key='response')
+    except Exception as e:
+        print(f"❌ Error starting speech stream: {e}", flush=True)
+        return None
+
+
 @app.route('/', methods=['GET'])
 def serve_index():
     """Serve the main index.html file."""
@@ -104,7 +184,14 @@ def health():
         'message': 'AI Assistant is running',
         'provider': api_provider,
         'auto_speak': auto_speak_enabled,
-        'available_models': models
+        'available_models': models,
+        'http_pool': get_session_pool().get_stats(),
+        'rate_limits': get_rate_limit_stats(),
+        'circuit_breakers': get_circuit_breaker_stats(),
+        'sessions': conversations.get_stats(),
+        'local_intents': local_intents.get_stats(),
+        'tts': tts.get_stats(),
+        'processor': api_processor.get_stats() if api_processor else {}
     })
 
 
@@ -129,20 +216,32 @@ def process_text():
                 'response': 'Please provide some text.'
             }), 400
         
-        result = api_processor.process(user_text)
+        session = current_session()
+        result = local_intents.try_answer(user_text)
+        if result is None:
+            result = api_processor.process(
+                user_text,
+                use_cache=data.get('cache', True),
+                context=session.context.build(user_text)
+            )
+            result['served_by'] = 'llm'
         response_text = result.get('response', 'Error: No response from API.')
+        if not result.get('error'):
+            session.context.add_turn(user_text, response_text)
         
-        conversation_history.append({
-            'user': user_text,
-            'assistant': response_text,
-        })
+        session.append(user_text, response_text)
         
-        speak_thread = threading.Thread(target=speak_response, args=(response_text,))
-        speak_thread.daemon = False
-        speak_thread.start()
+        url = deliver_response_audio(
+            response_text,
+            cache=result['served_by'] == 'local' or bool(result.get('error')),
+            delivery=data.get('audio')
+        )
         
         return jsonify({
             'response': response_text,
+            'cached': result.get('cached', False),
+            'served_by': result['served_by'],
+            'audio_url': url,
         })
     
     except Exception as e:
@@ -151,6 +250,246 @@ def process_text():
             'response': 'An error occurred processing your request.'
         }), 500
 
+
+@app.route('/api/process_text/stream', methods=['POST'])
+def process_text_stream():
+    """
+    Process text command and stream the response as Server-Sent Events.
+    """
+    if not api_processor:
+        return jsonify({
+            'error': 'API not configured',
+            'response': 'Please configure your FREE_API_KEY in .env file'
+        }), 503
+    
+    data = request.json or {}
+    user_text = data.get('text', '').strip()
+    
+    if not user_text:
+        return jsonify({
+            'error': 'No text provided',
+            'response': 'Please provide some text.'
+        }), 400
+    
+    session = current_session()
+    context = session.context.build(user_text)
+    
+    def generate():
+        speech = start_speech_stream(data.get('audio'))
+        chunks = api_processor.process_stream(user_text, use_cache=data.get('cache', True), context=context)
+        try:
+            for chunk in chunks:
+                if not chunk.get('done'):
+                    if speech is not None:
+                        speech.feed(chunk['delta'])
+                    yield format_sse({'delta': chunk['delta']})
+                    continue
+                
+                response_text = chunk['response']
+                if not chunk.get('error'):
+                    session.context.add_turn(user_text, response_text)
+                session.append(user_text, response_text)
+                
+                # Errors arrive without deltas; speak them through the stream too
+                if speech is not None and not speech.text:
+                    speech.feed(response_text)
+                
+                yield format_sse({
+                    'response': response_text,
+                    'error': chunk.get('error', False),
+                    'cached': chunk.get('cached', False),
+                    'audio_url': audio_url(response_text) if (data.get('audio') or tts_delivery) == 'url' else None
+                }, event='done')
+        finally:
+            if speech is not None:
+                speech.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/api/process_batch', methods=['POST'])
+def process_batch():
+    """
+    Process many prompts concurrently over a bounded worker pool.
+    
+    Batch items are not spoken and not added to conversation history.
+    
+    Expected JSON:
+    {
+        "inputs": ["first prompt", "second prompt"],
+        "max_concurrency": 4,  # optional
+        "stream": false,  # optional, true streams NDJSON lines in input order
+        "cache": true  # optional, false bypasses the response cache
+    }
+    """
+    if not api_processor:
+        return jsonify({
+            'error': 'API not configured',
+            'response': 'Please configure your FREE_API_KEY in .env file'
+        }), 503
+    
+    data = request.get_json(silent=True)
+    try:
+        inputs, max_concurrency = parse_batch_request(data)
+    except ValueError as e:
+        return jsonify({
+            'error': 'Invalid batch request',
+            'response': str(e)
+        }), 400
+    
+    results = api_processor.iter_many(
+        inputs,
+        max_concurrency=max_concurrency,
+        use_cache=data.get('cache', True)
+    )
+    
+    if data.get('stream'):
+        def generate():
+            for result in results:
+                yield json.dumps(result) + '\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    results = list(results)
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'errors': sum(1 for r in results if r.get('error'))
+    })
+
+
+@app.route('/api/transcribe', methods=['POST'])
+def transcribe():
+    """
+    Transcribe an uploaded recording and answer it.
+    
+    The raw request body (WAV, FLAC, Opus or WebM; chunked uploads welcome)
+    is streamed straight into Deepgram, so memory stays flat however long
+    the recording is. The format is detected from the audio itself.
+    
+    Query parameters:
+        process=false  # transcript only
+        audio=local    # speak instead of returning an audio_url
+    """
+    try:
+        if audio_source.deepgram is None:
+            return jsonify({
+                'error': 'Transcription not available',
+                'response': 'Set DEEPGRAM_API_KEY to enable audio uploads.'
+            }), 503
+        
+        body = iter(lambda: request.stream.read(UPLOAD_CHUNK_SIZE), b'')
+        stt = audio_source.deepgram.transcribe_stream(body, content_type=request.content_type)
+        if not stt['success']:
+            return jsonify({'error': stt['message'], 'response': 'Could not transcribe the audio.'}), 502
+        
+        transcript = stt['transcript'].strip()
+        payload = {
+            'user_input': transcript,
+            'content_type': stt['content_type'],
+            'bytes_received': stt['bytes_sent']
+        }
+        if not transcript:
+            return jsonify(dict(payload, error='No speech recognized',
+                                response='I did not hear anything. Please try again.')), 400
+        if request.args.get('process', 'true').lower() == 'false':
+            return jsonify(payload)
+        if not api_processor:
+            return jsonify(dict(payload, error='API not configured',
+                                response='Please configure your FREE_API_KEY in .env file')), 503
+        
+        session = current_session()
+        result = local_intents.try_answer(transcript)
+        if result is None:
+            result = api_processor.process(transcript, context=session.context.build(transcript))
+            result['served_by'] = 'llm'
+        response_text = result.get('response', 'Error: No response from API.')
+        if not result.get('error'):
+            session.context.add_turn(transcript, response_text)
+        
+        session.append(transcript, response_text)
+        
+        url = deliver_response_audio(
+            response_text,
+            cache=result['served_by'] == 'local' or bool(result.get('error')),
+            delivery=request.args.get('audio')
+        )
+        
+        return jsonify(dict(payload,
+                            response=response_text,
+                            error=result.get('error', False),
+                            served_by=result['served_by'],
+                            audio_url=url))
+    
+    except Exception as e:
+        return jsonify({
+            'error': str(e),
+            'response': 'An error occurred processing your audio.'
+        }), 500
+
+
+@app.route('/api/tts/audio', methods=['GET', 'POST'])
+def tts_audio():
+    """
+    Stream synthesized speech as a chunked HTTP response.
+    """
+    data = request.args if request.method == 'GET' else (request.json or {})
+    result = audio_source.open_request(data)
+    if not result['success']:
+        return jsonify({'error': result['message']}), result.get('status', 502)
+    
+    return Response(
+        stream_with_context(result['chunks']),
+        mimetype=result['content_type'],
+        headers={'Cache-Control': 'no-cache', 'X-TTS-Engine': result['engine']}
+    )
+
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """
+    Get this session's conversation history, oldest first.
+    
+    Query parameters:
+        limit=50     # entries per page
+        before=<seq> # older page (use next_cursor from the previous one)
+        after=<seq>  # entries newer than seq (use latest from a previous call)
+    """
+    page = current_session().page(
+        limit=request.args.get('limit', 50, type=int),
+        before=request.args.get('before', type=int),
+        after=request.args.get('after', type=int)
+    )
+    return jsonify(page)
+
+
+@app.route('/api/session', methods=['GET'])
+def get_session():
+    """Get this session's size (turns, history bytes, LLM context)."""
+    session = current_session()
+    return jsonify(dict(session.get_stats(), session_id=session.id))
+
+
+@app.route('/api/clear_history', methods=['POST'])
+def clear_history():
+    """Clear this session's conversation history."""
+    current_session().clear()
+    return jsonify({'status': 'ok', 'message': 'History cleared'})
+
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    """Get response cache hit/miss/eviction counters."""
+    cache = get_response_cache()
+    return jsonify({
+        'enabled': cache is not None,
+        'stats': cache.get_stats() if cache else {}
+    })
+
 # Add this line to export the WSGI application for Vercel
 # from vercel_wsgi import VercelWSGI
 